@@ -0,0 +1 @@
+"""Benchmarks for tracking the performance of skivvy between commits, see benchmarks/README.md."""
@@ -0,0 +1,93 @@
+"""A fast local JSON API server for end-to-end benchmarks.
+
+It's the dev server from examples/dev_server/server.py, with the same routing, but
+it keeps connections alive, handles requests on multiple threads and serves every
+response from memory, so that it's skivvy that is being measured, not the server.
+
+Usage:
+  python -m benchmarks.fixture_server [port] [directory]
+"""
+
+import importlib.util
+import sys
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+DEV_SERVER = Path(__file__).parent.parent / "examples" / "dev_server" / "server.py"
+
+
+def _load_dev_server():
+    spec = importlib.util.spec_from_file_location("skivvy_dev_server", DEV_SERVER)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+dev_server = _load_dev_server()
+HOST = dev_server.HOST
+
+
+class FastHandler(dev_server.Handler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, with Nagle's algorithm on every response
+    # on a kept-alive connection would be held up by the client's delayed ACK
+    disable_nagle_algorithm = True
+    responses: dict[str, bytes] = {}
+
+    def do_POST(self):
+        # the body has to be read, or it would be taken for the next request on the connection
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.do_GET()
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].split("#", 1)[0]
+        body = self.responses.get(path.rstrip("/") or "/")
+        if body is None:
+            return super().do_GET()
+        self.respond(200, body)
+
+
+def preload(root: Path) -> dict[str, bytes]:
+    """Reads every .json file under root, keyed by the route(s) the dev server would serve it on."""
+    responses = {}
+    for filename in sorted(root.rglob("*.json")):
+        route = "/" + filename.relative_to(root).with_suffix("").as_posix()
+        body = filename.read_bytes()
+        responses[route] = body
+        if filename.name == "index.json":
+            responses[route.removesuffix("/index") or "/"] = body
+    return responses
+
+
+@contextmanager
+def serve(root, port: int = 0):
+    """Serves root in a background thread for the duration of the block, yields the base url."""
+    root = Path(root).resolve()
+    handler = type("Handler", (FastHandler,), {"root": root, "responses": preload(root)})
+    server = ThreadingHTTPServer((HOST, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="fixture-server", daemon=True)
+    thread.start()
+    try:
+        yield f"http://{HOST}:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else dev_server.DEFAULT_PORT
+    root = Path(sys.argv[2]) if len(sys.argv) > 2 else Path.cwd()
+    with serve(root, port) as base_url:
+        print(f"Serving {root.resolve()} on {base_url} (ctrl-c to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""skivvy benchmarks (run from the root of the repo with: python -m benchmarks.run)
+
+Usage:
+    benchmarks [options] [<scenario>...]
+    benchmarks --list
+
+Options:
+    --list              list the available scenarios.
+    --output=file       write the results as JSON to this file [default: benchmark_results.json]
+    --compare=file      compare the results to those of an earlier run (e.g. of another commit)
+    --threshold=ratio   with --compare, fail if a scenario got slower than this [default: 1.2]
+    --repeat=n          number of timed runs of each scenario [default: 5]
+    --scale=factor      multiplies the amount of work done by each scenario [default: 1.0]
+    <scenario>          only run these scenarios (default: all of them)
+"""
+
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from docopt import docopt
+
+from skivvy import __version__
+
+from .scenarios import SCENARIOS, Scenario
+
+RESULTS_VERSION = 1
+
+
+def time_scenario(scenario: Scenario, repeat: int, scale: float) -> dict:
+    with tempfile.TemporaryDirectory(prefix=f"skivvy-bench-{scenario.name}-") as workdir:
+        with scenario.setup(scale, Path(workdir)) as func:
+            func()  # warm up, the first run pays for imports, caches, connections etc
+            runs = []
+            for _ in range(repeat):
+                gc.collect()
+                started = time.perf_counter()
+                func()
+                runs.append(time.perf_counter() - started)
+    return {
+        "description": scenario.description,
+        "runs": runs,
+        "min": min(runs),
+        "median": statistics.median(runs),
+        "mean": statistics.fmean(runs),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def run_benchmarks(scenarios: list[Scenario], repeat: int = 5, scale: float = 1.0) -> dict:
+    results = {}
+    for scenario in scenarios:
+        results[scenario.name] = time_scenario(scenario, repeat, scale)
+        print(f"{scenario.name:<24} median {results[scenario.name]['median'] * 1000:10.2f} ms")
+    return {
+        "version": RESULTS_VERSION,
+        "skivvy_version": __version__,
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "scale": scale,
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """Prints how the median of each scenario changed.
+    Returns the scenarios that got slower than threshold (a ratio, e.g. 1.2 for 20% slower)."""
+    regressions = []
+    if baseline.get("scale") != current.get("scale"):
+        print("warning: the runs being compared used different scales")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        ratio = result["median"] / before["median"]
+        flag = ""
+        if ratio > threshold:
+            regressions.append(name)
+            flag = "  <-- regression"
+        print(
+            f"{name:<24} {before['median'] * 1000:10.2f} ms -> "
+            f"{result['median'] * 1000:10.2f} ms ({ratio:.2f}x){flag}"
+        )
+    return regressions
+
+
+def select_scenarios(names: list[str]) -> list[Scenario]:
+    if not names:
+        return list(SCENARIOS)
+    by_name = {scenario.name: scenario for scenario in SCENARIOS}
+    unknown = [name for name in names if name not in by_name]
+    if unknown:
+        raise ValueError(
+            f"Unknown scenario(s): {', '.join(unknown)}. Available: {', '.join(by_name)}"
+        )
+    return [by_name[name] for name in names]
+
+
+def main() -> int:
+    arguments = docopt(__doc__)
+    if arguments["--list"]:
+        for scenario in SCENARIOS:
+            print(f"{scenario.name:<24} {scenario.description}")
+        return 0
+
+    scenarios = select_scenarios(arguments["<scenario>"])
+    results = run_benchmarks(scenarios, int(arguments["--repeat"]), float(arguments["--scale"]))
+    Path(arguments["--output"]).write_text(json.dumps(results, indent=2))
+    print(f"Results written to {arguments['--output']}")
+
+    if arguments["--compare"]:
+        baseline = json.loads(Path(arguments["--compare"]).read_text())
+        if compare(baseline, results, float(arguments["--threshold"])):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""The benchmarked scenarios.
+
+Every scenario is a context manager that does its (untimed) setup in a scratch directory,
+then yields the function to be timed. The amount of work is multiplied by scale, so the
+same scenarios can be run as quick smoke tests.
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, ContextManager, NamedTuple
+
+from skivvy.skivvy import run
+from skivvy.test_runner import brace_expand_fields
+from skivvy.util import file_util, scope
+from skivvy.util.manifest import Manifest
+from skivvy.verify import verify
+
+from . import fixture_server
+
+
+class Scenario(NamedTuple):
+    name: str
+    description: str
+    setup: Callable[[float, Path], ContextManager[Callable[[], object]]]
+
+
+SCENARIOS: list[Scenario] = []
+
+
+def scenario(name: str, description: str):
+    def register(func):
+        SCENARIOS.append(Scenario(name, description, contextmanager(func)))
+        return func
+
+    return register
+
+
+def scaled(n: int, scale: float) -> int:
+    return max(1, int(n * scale))
+
+
+def make_users(count: int) -> list[dict]:
+    return [
+        {
+            "id": i,
+            "name": f"user{i}",
+            "email": f"user{i}@example.com",
+            "active": i % 3 != 0,
+            "address": {
+                "street": f"{i} Main Street",
+                "city": "Springfield",
+                "geo": {"lat": 59.33 + i / 1000, "lng": 18.06 - i / 1000},
+            },
+            "tags": ["alpha", "beta", f"tag{i % 10}"],
+            "orders": [
+                {"id": i * 10 + n, "total": n * 9.99, "items": [{"sku": f"SKU{n}", "qty": n}]}
+                for n in range(3)
+            ],
+        }
+        for i in range(count)
+    ]
+
+
+@scenario("verify_nested", "verify an exact match of a large, deeply nested response")
+def verify_nested(scale, _workdir):
+    actual = {"data": {"users": make_users(scaled(2_000, scale))}}
+    expected = json.loads(json.dumps(actual))
+    yield lambda: verify(expected, actual)
+
+
+@scenario("verify_subset", "verify a handful of matchers against a large nested response")
+def verify_subset(scale, _workdir):
+    users = make_users(scaled(2_000, scale))
+    actual = {"data": {"users": users}}
+    expected = {
+        "data": {
+            "users": [
+                {"name": "$contains user", "address": {"city": "Springfield"}},
+                {"email": f"user{len(users) - 1}@example.com"},
+            ]
+        }
+    }
+    yield lambda: verify(expected, actual, match_subsets=True)
+
+
+@scenario("match_every_entry", "match_every_entry over a 100k-element array")
+def match_every_entry(scale, _workdir):
+    actual = [
+        {"id": i, "name": f"user{i}", "email": f"user{i}@example.com"}
+        for i in range(scaled(100_000, scale))
+    ]
+    expected = [{"id": "$gt -1", "name": "$contains user", "email": "$regexp ^user\\d+@"}]
+    yield lambda: verify(expected, actual, match_every_entry=True)
+
+
+@scenario(
+    "brace_expansion", "expand the request fields of a testcase with a large expected response"
+)
+def brace_expansion(scale, _workdir):
+    token = scope.bind_namespace("benchmark_brace_expansion")
+    try:
+        scope.store("user_id", "12345")
+        scope.store("token", "s3cr3t")
+        fields = scaled(1_000, scale)
+        testcase = {
+            "url": "https://api.example.com/users/<user_id>",
+            "brace_expansion": True,
+            "headers": {"Authorization": "Bearer <token>", "Accept": "application/json"},
+            "body": {
+                "query": "query { user(id: <user_id>) { name } }",
+                "variables": {
+                    f"field{i}": "<user_id>" if i % 2 else f"static{i}" for i in range(fields)
+                },
+            },
+            "response": {"data": {"users": make_users(scaled(2_000, scale))}},
+        }
+        keys = ("url", "body", "headers", "read_headers", "write_headers")
+        yield lambda: brace_expand_fields(testcase, *keys)
+    finally:
+        scope.unbind_namespace(token)
+
+
+def make_tree(root: Path, dirs: int, files_per_dir: int) -> Path:
+    for d in range(dirs):
+        directory = root / f"{d:03d}_group"
+        directory.mkdir(parents=True)
+        for f in range(files_per_dir):
+            testcase = {
+                "url": f"/api/{d}/{f}",
+                "status": 200,
+                "response": {"id": f, "name": "$contains item"},
+            }
+            (directory / f"{f:03d}_case.json").write_text(json.dumps(testcase))
+    return root
+
+
+@scenario("discovery", "list and parse every testfile of a large suite")
+def discovery(scale, workdir):
+    tests_dir = make_tree(workdir / "tests", scaled(100, scale), 50)
+
+    def discover():
+        return [file_util.parse_json(f) for f in file_util.list_files(tests_dir, ".json")]
+
+    yield discover
+
+
+@scenario(
+    "discovery_manifest",
+    "list and parse every testfile of a large, unchanged suite using the manifest cache",
+)
+def discovery_manifest(scale, workdir):
+    tests_dir = make_tree(workdir / "tests", scaled(100, scale), 50)
+    age(tests_dir)
+    path = str(workdir / "manifest.json")
+    warmup = Manifest(path)
+    for f in warmup.list_files(tests_dir, ".json"):
+        warmup.parse_testfile(f)
+    warmup.save()
+
+    def discover():
+        cache = Manifest(path)
+        return [cache.parse_testfile(f) for f in cache.list_files(tests_dir, ".json")]
+
+    yield discover
+
+
+def age(root: Path):
+    # the manifest doesn't trust anything modified in the last couple of seconds, skip the wait
+    past = time.time() - 60
+    for path in [root, *root.rglob("*")]:
+        os.utime(path, (past, past))
+
+
+def make_suite(root: Path, api_dir: Path, dirs: int, tests_per_dir: int) -> Path:
+    users = make_users(20)
+    for d in range(dirs):
+        (api_dir / f"group{d}").mkdir(parents=True)
+        for t in range(tests_per_dir):
+            user = users[t % len(users)]
+            (api_dir / f"group{d}" / f"{t}.json").write_text(json.dumps(user))
+            (root / f"group{d}").mkdir(parents=True, exist_ok=True)
+            testcase = {
+                "url": f"/group{d}/{t}",
+                "status": 200,
+                "response": {
+                    "id": user["id"],
+                    "name": "$contains user",
+                    "orders": [{"total": "$gt -1"}],
+                },
+            }
+            (root / f"group{d}" / f"{t:03d}.json").write_text(json.dumps(testcase))
+    return root
+
+
+def end_to_end(scale, workdir, workers: int):
+    tests_dir = make_suite(workdir / "tests", workdir / "api", 4, scaled(100, scale))
+    with fixture_server.serve(workdir / "api") as base_url:
+        cfg_file = workdir / "cfg.json"
+        cfg_file.write_text(
+            json.dumps(
+                {
+                    "tests": str(tests_dir),
+                    "base_url": base_url,
+                    "log_level": "ERROR",
+                    "failed_summary": False,
+                    "workers": workers,
+                }
+            )
+        )
+
+        def run_suite():
+            old_argv = sys.argv
+            sys.argv = ["skivvy", str(cfg_file)]
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    if not run():
+                        raise AssertionError("the end-to-end benchmark suite failed")
+            finally:
+                sys.argv = old_argv
+
+        yield run_suite
+
+
+@scenario("end_to_end", "run a suite of 400 tests against the local fixture server")
+def end_to_end_serial(scale, workdir):
+    yield from end_to_end(scale, workdir, workers=1)
+
+
+@scenario(
+    "end_to_end_workers",
+    "run a suite of 400 tests against the local fixture server, 4 directories at a time",
+)
+def end_to_end_workers(scale, workdir):
+    yield from end_to_end(scale, workdir, workers=4)
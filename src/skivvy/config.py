@@ -69,6 +69,12 @@ class Settings:
     MATCH_EVERY_ENTRY = Option(
         "match_every_entry", False, "Require every actual array entry to match the expected template"
     )
+    STREAM_RESPONSE = Option(
+        "stream_response",
+        False,
+        "Verify a JSON array response entry by entry while it's downloaded, keeping memory bounded "
+        "(the expected response must be an array, requests transport only)",
+    )
     MATCH_FALSINESS = Option(
         "match_falsiness", True, "Match falsy values in verification"
     )
@@ -102,6 +108,18 @@ class Settings:
         "Log level for request/response header output (set null/OFF to disable)",
     )
     FAIL_FAST = Option("fail_fast", False, "Stop on first failure")
+    WORKERS = Option(
+        "workers",
+        1,
+        "Number of test directories (or tests, see schedule) to run concurrently",
+    )
+    SCHEDULE = Option(
+        "schedule",
+        "directories",
+        'What is run side by side with workers > 1: "directories" (the tests of a directory '
+        'run one after another) or "dependencies" (tests of a directory also run side by side, '
+        "unless one uses a variable stored by another)",
+    )
     FILE_ORDER = Option(
         "file_order",
         "lexical",
@@ -110,9 +128,106 @@ class Settings:
     MATCHERS = Option("matchers", None, "Directory containing custom matcher files")
     MATCHER_OPTIONS = Option("matcher_options", {}, "Per-matcher configuration options")
     EXT = Option("ext", ".json", "File extension for test files")
+    MANIFEST_CACHE = Option(
+        "manifest_cache",
+        None,
+        "File caching the list of testfiles and their parsed contents between runs, "
+        "only what has changed on disk is re-read (disabled by default)",
+    )
+    DURATIONS_FILE = Option(
+        "durations_file",
+        None,
+        "JSONL file where how long each test took is recorded after every run, used by --shard "
+        "to balance the shards and to run long running directories first (disabled by default). "
+        "Every shard has to read the same one or the shards won't add up to the whole suite, so "
+        "runs with --shard record to <durations_file>.shard-k-of-n instead, which --merge-durations "
+        "(or the next unsharded run) adds to it",
+    )
+    FAILURES_FILE = Option(
+        "failures_file",
+        None,
+        "JSON file where the tests that failed are recorded after every run, needed by "
+        "--last-failed and --failed-first (disabled by default)",
+    )
+    DURATION_REGRESSION_RATIO = Option(
+        "duration_regression_ratio",
+        2.0,
+        "Warn about tests that took this many times longer than they usually do "
+        "(according to durations_file)",
+    )
     TIMING = Option("timing", False, "Enable timing output for each test")
     HTTP_TIMING = Option("http_timing", False, "Enable HTTP transport timing breakdown")
+    EVENTS_FILE = Option(
+        "events_file",
+        None,
+        "File to append every event to as a JSON line, or a file descriptor number "
+        "(e.g. 1 for stdout) to write them to (disabled by default)",
+    )
+    EVENTS_MAX_BODY = Option(
+        "events_max_body",
+        None,
+        "Truncate request and response bodies (and what failing tests expected and got) written "
+        "to events_file to this many characters",
+    )
     TIMEOUT = Option("timeout", 30, "HTTP request timeout in seconds")
+    CONNECT_TIMEOUT = Option(
+        "connect_timeout", None, "Timeout in seconds for connecting (defaults to timeout)"
+    )
+    READ_TIMEOUT = Option(
+        "read_timeout",
+        None,
+        "Timeout in seconds for the server to send something (defaults to timeout)",
+    )
+    POOL_CONNECTIONS = Option(
+        "pool_connections", 10, "Number of hosts that connections are kept open to"
+    )
+    POOL_MAXSIZE = Option(
+        "pool_maxsize",
+        None,
+        "Number of connections kept open to each host (defaults to workers, but at least 10)",
+    )
+    POOL_BLOCK = Option(
+        "pool_block",
+        False,
+        "Never have more than pool_maxsize connections to a host, requests wait for one to be "
+        "free instead (by default extra connections are opened, but closed once used)",
+    )
+    KEEP_ALIVE = Option(
+        "keep_alive",
+        True,
+        "Keep connections open between requests, so they don't have to be set up (and TLS "
+        "handshakes made) again for every request",
+    )
+    TCP_NODELAY = Option(
+        "tcp_nodelay", True, "Send requests right away instead of buffering them (TCP_NODELAY)"
+    )
+    CONNECT_RETRIES = Option(
+        "connect_retries",
+        0,
+        "Number of times a request that failed to connect is retried (requests that reached "
+        "the server are never retried)",
+    )
+    TRANSPORT = Option(
+        "transport",
+        "requests",
+        'HTTP transport: "requests" (default), "httpx" (asyncio, requires the httpx package), '
+        '"http2" (httpx also offering HTTP/2 over https, multiplexing concurrent requests to a '
+        'host over one connection when the server picks it, requires skivvy[http2]) or "h2c" '
+        "(like http2, but always speaking HTTP/2, also over plain http, for servers known to "
+        "support it)",
+    )
+    CASSETTE = Option(
+        "cassette",
+        None,
+        "Directory where responses are recorded to or replayed from, see cassette_mode "
+        "(disabled by default)",
+    )
+    CASSETTE_MODE = Option(
+        "cassette_mode",
+        "replay",
+        '"record" to save every response to the cassette, "replay" to serve responses from it '
+        "without making any requests",
+    )
     FIXED_COLUMN_WIDTH = Option(
         "fixed_column_width",
         None,
@@ -23,6 +23,7 @@ class CustomMatcher(object):
         # and the user is that we expect that:
         # * the file contains a function called "match"
         # * the function takes two parameters: expected & actual
+        # * ...or three: expected, actual & options (the matcher_options configured for it)
         # * expected is a string, actual is json (what we get back from the server)
         # * the function CAN return just true if the matcher passed, false otherwise
         # * the function is RECOMMENDED to return a tuple (boolean, string)
@@ -38,25 +39,33 @@ class CustomMatcher(object):
             self.matcher_func = self.matcher_module.__getattribute__(
                 self.matcher_func_name
             )
-            CustomMatcher.validate_matcher(self.matcher_func)
+            self.wants_options = CustomMatcher.validate_matcher(self.matcher_func)
         except Exception as e:
             raise AssertionError("Failed to load matcher %s: %s" % (source_file, e))
 
     @staticmethod
     def validate_matcher(matcher_func):
+        """Validates the signature of a 'match' function, returns True if it takes options."""
         if matcher_func is None:
             raise AssertionError("Expected to find 'match' function")
         arguments = inspect.getfullargspec(matcher_func).args
         expected_signature = ["expected", "actual"]
-        if not arguments == expected_signature:
-            raise AssertionError(
-                "Expected 'match' to take exactly 2 parameters: %s - but was %s"
-                % (expected_signature, arguments)
-            )
+        if arguments == expected_signature:
+            return False
+        if arguments == expected_signature + ["options"]:
+            return True
+        raise AssertionError(
+            "Expected 'match' to take exactly 2 parameters: %s (or a 3rd called 'options') - but was %s"
+            % (expected_signature, arguments)
+        )
 
     def match(self, expected, actual):
         try:
-            result = self.matcher_func(expected.strip(), actual)
+            if self.wants_options:
+                options = matchers.get_matcher_context().matcher_options
+                result = self.matcher_func(expected.strip(), actual, options)
+            else:
+                result = self.matcher_func(expected.strip(), actual)
             if isinstance(result, (bool)):
                 return result, ""
             elif isinstance(result, (tuple)):
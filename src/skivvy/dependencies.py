@@ -0,0 +1,231 @@
+"""How the tests of a directory depend on each other through the variables they share.
+
+A test stores a variable with "$store <name>" somewhere in its expected response, and
+another one later in the same directory uses it, either by "$fetch <name>" or by
+brace expansion ("<name>" in one of the fields of the request that are expanded).
+Tests also depend on each other through files: one writes a file (with "$write_file <file>"
+or write_headers) and a later one reads it (with "$read_file <file>", read_headers or by
+brace expansion of "<file>").
+This is found by looking at the testcases without running them, so it's only known how
+tests depend on each other through variables, not e.g. through what they do on the server.
+"""
+
+import os
+import re
+from typing import Callable, NamedTuple
+
+from . import scheduler
+from .brace_expansion import brace_expansion_regexp, is_env_variable_name
+from .config import Settings
+from .test_runner import BRACE_EXPANDED_FIELDS
+from .util import file_util, manifest, scope
+
+_brace_pattern = re.compile(brace_expansion_regexp)
+
+
+# files are kept apart from variables (whose names can't contain a colon) by this prefix
+_FILE = "file:"
+# the fields that are verified, so the only ones matchers like $store and $fetch are used in (in
+# the request, e.g. a body, a string starting with "$fetch " is just that)
+VERIFIED_FIELDS = tuple(
+    option.key for option in (Settings.STATUS, Settings.RESPONSE, Settings.RESPONSE_HEADERS)
+)
+
+
+class Variables(NamedTuple):
+    stored: frozenset[str]
+    fetched: frozenset[str]
+    expanded: frozenset[str] = frozenset()
+    # the files it writes and reads (a brace expanded name might be either)
+    written: frozenset[str] = frozenset()
+    read: frozenset[str] = frozenset()
+
+    @property
+    def used(self) -> frozenset[str]:
+        return self.fetched | self.expanded
+
+    @property
+    def produced(self) -> frozenset[str]:
+        """What later tests can depend on, the variables it stores and the files it writes."""
+        return self.stored | {_FILE + name for name in self.written}
+
+    @property
+    def consumed(self) -> frozenset[str]:
+        return self.used | {_FILE + name for name in self.read}
+
+
+NO_VARIABLES = Variables(frozenset(), frozenset())
+
+
+def variables_of(testcase, brace_expansion: bool = True) -> Variables:
+    """The variables a testcase stores and uses (names are case-insensitive, so lowercased).
+    brace_expansion is whether it's enabled, unless the testcase itself says otherwise.
+    """
+    stored: set[str] = set()
+    fetched: set[str] = set()
+    expanded: set[str] = set()
+    written: set[str] = set()
+    read: set[str] = set()
+    if isinstance(testcase, dict):
+        for field in VERIFIED_FIELDS:
+            _collect(testcase.get(field), stored, fetched, written, read)
+        write_headers = testcase.get(Settings.WRITE_HEADERS.key)
+        if isinstance(write_headers, dict):
+            written.update(_file_name(filename) for filename in write_headers)
+        read_headers = testcase.get(Settings.READ_HEADERS.key)
+        if isinstance(read_headers, str):
+            read.add(_file_name(read_headers))
+        if testcase.get(Settings.BRACE_EXPANSION.key, brace_expansion):
+            for field in BRACE_EXPANDED_FIELDS:
+                _collect_expanded(testcase.get(field), expanded, read)
+    return Variables(
+        frozenset(stored),
+        frozenset(fetched),
+        frozenset(expanded),
+        frozenset(written),
+        frozenset(read),
+    )
+
+
+def variables_of_file(testfile: str, brace_expansion: bool = True) -> Variables:
+    try:
+        return variables_of(manifest.parse_testfile(testfile), brace_expansion)
+    except (OSError, ValueError):
+        # e.g. saved halfway through an edit, running it will tell what's wrong with it
+        return NO_VARIABLES
+
+
+def _file_name(filename: str) -> str:
+    # files are written to and read from relative to the current directory
+    return os.path.normpath(filename.strip())
+
+
+def _collect(
+    value, stored: set[str], fetched: set[str], written: set[str], read: set[str]
+):
+    if isinstance(value, dict):
+        for item in value.values():
+            _collect(item, stored, fetched, written, read)
+    elif isinstance(value, list):
+        for item in value:
+            _collect(item, stored, fetched, written, read)
+    elif isinstance(value, str):
+        tokens = value.split(maxsplit=1)
+        if len(tokens) != 2:
+            return
+        if tokens[0] == "$store":
+            stored.add(tokens[1].strip().lower())
+        elif tokens[0] == "$fetch":
+            fetched.add(tokens[1].strip().lower())
+        elif tokens[0] == "$write_file":
+            written.add(_file_name(tokens[1]))
+        elif tokens[0] == "$read_file":
+            read.add(_file_name(tokens[1]))
+
+
+def _collect_expanded(value, expanded: set[str], read: set[str]):
+    if isinstance(value, dict):
+        for item in value.values():
+            _collect_expanded(item, expanded, read)
+    elif isinstance(value, list):
+        for item in value:
+            _collect_expanded(item, expanded, read)
+    elif isinstance(value, str) and "<" in value:
+        for name in _brace_pattern.findall(value):
+            if is_env_variable_name(name):
+                continue
+            # it's not known until it's expanded whether it's a variable or a file
+            read.add(_file_name(name))
+            if os.path.isfile(name):
+                continue
+            name = name.strip().lower()
+            # anything else (e.g. some markup) can't be the name of a variable
+            if scope.do_variable_validation(name)[0]:
+                expanded.add(name)
+
+
+def dependency_graph(
+    tests: list[str], variables: Callable[[str], Variables]
+) -> dict[str, list[str]]:
+    """Maps every test to the tests it has to be run after: for every variable (or file) it uses,
+    the last test before it in the same directory that stores (or writes) it. Tests that don't
+    depend on each other this way can be run side by side."""
+    positions = {testfile: position for position, testfile in enumerate(tests)}
+    graph = {}
+    for group in scheduler.group_by_namespace(tests):
+        produced_by: dict[str, str] = {}
+        for _, testfile in group:
+            test_variables = variables(testfile)
+            graph[testfile] = sorted(
+                {
+                    produced_by[name]
+                    for name in test_variables.consumed
+                    if name in produced_by
+                },
+                key=positions.__getitem__,
+            )
+            produced_by.update((name, testfile) for name in test_variables.produced)
+    return graph
+
+
+def undeclared_variables(
+    tests: list[str],
+    variables: Callable[[str], Variables],
+    declared: Callable[[str], set[str]] = lambda namespace: set(),
+) -> dict[str, Variables]:
+    """Returns the variables that the tests use before any earlier test in their directory has
+    stored them (declared gives the variables a directory already has, e.g. from an earlier
+    run), keyed by the test using them. A brace expanded name that's also the name of a file
+    written by any test isn't included, it's the file that will be expanded."""
+    written = {name for testfile in tests for name in variables(testfile).written}
+    undeclared = {}
+    for group in scheduler.group_by_namespace(tests):
+        available = set(declared(file_util.namespace_of(group[0][1])))
+        for _, testfile in group:
+            test_variables = variables(testfile)
+            fetched = test_variables.fetched - available
+            expanded = {
+                name
+                for name in test_variables.expanded - available
+                if _file_name(name) not in written
+            }
+            if fetched or expanded:
+                undeclared[testfile] = Variables(
+                    frozenset(), fetched, frozenset(expanded)
+                )
+            available |= test_variables.stored
+    return undeclared
+
+
+def affected_tests(
+    tests: list[str], changed: set[str], variables: Callable[[str], Variables]
+) -> list[str]:
+    """Returns the tests that have to be rerun when the changed ones have: the changed tests
+    themselves and the ones later in the same directory that use a variable stored (or a file
+    written) by a test that's rerun (which is then stored anew)."""
+    affected = set()
+    for group in scheduler.group_by_namespace(tests):
+        restored: set[str] = set()
+        for _, testfile in group:
+            test_variables = variables(testfile)
+            if testfile in changed or test_variables.consumed & restored:
+                affected.add(testfile)
+                restored |= test_variables.produced
+    return [testfile for testfile in tests if testfile in affected]
+
+
+def prerequisites(
+    tests: list[str], targets: set[str], variables: Callable[[str], Variables]
+) -> list[str]:
+    """Returns the targets together with the tests they need to be run after: the earlier tests
+    in the same directory that store a variable (or write a file) a target uses (and, in turn,
+    the tests those need), in the order they were listed."""
+    selected = set()
+    for group in scheduler.group_by_namespace(tests):
+        needed: set[str] = set()
+        for _, testfile in reversed(group):
+            test_variables = variables(testfile)
+            if testfile in targets or test_variables.produced & needed:
+                selected.add(testfile)
+                needed = (needed - test_variables.produced) | test_variables.consumed
+    return [testfile for testfile in tests if testfile in selected]
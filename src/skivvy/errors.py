@@ -5,3 +5,6 @@ class ExpectedTestFailure(Exception):
 class VerificationFailure(ExpectedTestFailure):
     """Raised when expected and actual verification does not match."""
 
+
+class InvalidExpectation(ExpectedTestFailure):
+    """Raised when the expected part of a testcase is invalid, e.g. a malformed regular expression."""
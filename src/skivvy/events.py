@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import threading
 import time
 import uuid
-from typing import Any
+from contextvars import ContextVar
+from typing import Any, Callable
 import ordered_set
 
 from blinker import Namespace, NamedSignal
@@ -26,26 +28,83 @@ VERIFY_STATUS = "test.verify_status"
 VERIFY_RESPONSE = "test.verify_response"
 VERIFY_RESPONSE_HEADERS = "test.verify_response_headers"
 
+ALL_EVENTS = (
+    RUN_STARTED,
+    RUN_PASSED,
+    RUN_FAILED,
+    RUN_FINISHED,
+    TEST_STARTED,
+    TEST_PASSED,
+    TEST_FAILED,
+    TEST_FINISHED,
+    CREATE_TESTCASE,
+    CREATE_REQUEST,
+    EXECUTE_REQUEST,
+    HTTP_TRANSPORT,
+    HTTP_RESPONSE,
+    VERIFY_STATUS,
+    VERIFY_RESPONSE,
+    VERIFY_RESPONSE_HEADERS,
+)
+
+# events that the test context (run_id, test_id, testfile) is tracked by, so they're
+# always processed, even when nothing is listening to them
+_CONTEXT_EVENTS = frozenset({RUN_STARTED, RUN_FINISHED, TEST_STARTED, TEST_FINISHED})
+
 _ns = Namespace()
 NamedSignal.set_class = ordered_set.OrderedSet
 
+# per event, the receivers that only want it some of the time, and what decides if they do
+_conditional_receivers: dict[str, dict[int, Callable[[], bool]]] = {}
+
 
 class RuntimeEventListener:
+    # The test context (test_id/testfile) is kept in context variables so that tests
+    # running concurrently (in worker threads or asyncio tasks) get their events
+    # attributed correctly.
     def __init__(self):
         self.run_id: str | None = None
-        self.test_id: str | None = None
-        self.testfile: str | None = None
         self.seq = 0
+        self._seq_lock = threading.Lock()
+        self._new_test_context()
+
+    def _new_test_context(self):
+        self._test_id: ContextVar[str | None] = ContextVar(
+            "skivvy_test_id", default=None
+        )
+        self._testfile: ContextVar[str | None] = ContextVar(
+            "skivvy_testfile", default=None
+        )
+
+    @property
+    def test_id(self) -> str | None:
+        return self._test_id.get()
+
+    @test_id.setter
+    def test_id(self, value: str | None):
+        self._test_id.set(value)
+
+    @property
+    def testfile(self) -> str | None:
+        return self._testfile.get()
+
+    @testfile.setter
+    def testfile(self, value: str | None):
+        self._testfile.set(value)
 
     def reset(self):
         self.run_id = None
-        self.test_id = None
-        self.testfile = None
-        self.seq = 0
+        with self._seq_lock:
+            self.seq = 0
+        self._new_test_context()
+
+    def _next_seq(self) -> int:
+        with self._seq_lock:
+            self.seq += 1
+            return self.seq
 
     def before_emit(self, name: str, msg: dict[str, Any]):
-        self.seq += 1
-        msg.setdefault("seq", self.seq)
+        msg.setdefault("seq", self._next_seq())
 
         if name == RUN_STARTED:
             self.test_id = None
@@ -82,6 +141,11 @@ def now_ms() -> int:
     return int(time.time() * 1000)
 
 
+def now_ns() -> int:
+    """A monotonic timestamp in nanoseconds, for measuring how long things take."""
+    return time.perf_counter_ns()
+
+
 def new_run_id() -> str:
     return uuid.uuid4().hex
 
@@ -94,11 +158,53 @@ def reset_runtime_listener():
     _runtime_listener.reset()
 
 
+def connect(
+    name: str, receiver, wants: Callable[[], bool] | None = None
+) -> Callable[[], None]:
+    """Connects receiver to an event and returns a function disconnecting it again. A receiver
+    that only wants the event some of the time (e.g. only logs it at certain log levels) can
+    pass a wants() that says if it currently does, if no receiver does the event isn't sent.
+    """
+    sig = signal(name)
+    sig.connect(receiver)
+    if wants is not None:
+        _conditional_receivers.setdefault(name, {})[id(receiver)] = wants
+
+    def disconnect():
+        sig.disconnect(receiver)
+        _conditional_receivers.get(name, {}).pop(id(receiver), None)
+
+    return disconnect
+
+
+def is_wanted(name: str) -> bool:
+    """Whether any receiver wants the event, if not there's no need to emit it."""
+    num_receivers = len(signal(name).receivers)
+    if num_receivers == 0:
+        return False
+    conditional = _conditional_receivers.get(name)
+    if not conditional or num_receivers > len(conditional):
+        return True
+    return any(wants() for wants in conditional.values())
+
+
 def emit(name: str, **payload):
-    msg = dict(payload)
+    if name not in _CONTEXT_EVENTS and not is_wanted(name):
+        return []
+    msg = payload  # made from the keyword arguments, so it's a dict of its own already
     _runtime_listener.before_emit(name, msg)
     msg.setdefault("ts", now_ms())
+    msg.setdefault("mono_ns", now_ns())
     try:
         return signal(name).send(None, event=name, **msg)
     finally:
         _runtime_listener.after_emit(name)
+
+
+def emit_lazy(name: str, build_payload: Callable[[], dict[str, Any]]):
+    """Like emit, but the payload is only built (by calling build_payload) if the event is
+    wanted, for events whose payload is expensive to put together (like a response body).
+    """
+    if name not in _CONTEXT_EVENTS and not is_wanted(name):
+        return []
+    return emit(name, **build_payload())
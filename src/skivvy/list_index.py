@@ -0,0 +1,70 @@
+"""Narrows down which entries of an actual list an expected entry could match.
+
+Looking for an expected entry in a list means verifying it against one actual entry
+after another until one of them matches, which gets slow for long lists. But an
+expected dict like {"id": 17, "name": "$contains foo"} can only ever match an actual
+dict whose "id" is 17, so the actual entries are indexed by the values of such literal
+(non-matcher) keys and only the few entries found that way need to be fully verified.
+"""
+
+from typing import Any
+
+# for short lists it's faster to just try every entry than to build an index
+LIST_INDEX_MIN_ENTRIES = 32
+
+
+class ListIndex:
+    def __init__(self, actual: list, include_empty: bool = False):
+        """include_empty makes empty dicts candidates for every expected entry, which is needed
+        when they're skipped rather than verified (match_subsets with skip_empty_objects).
+        """
+        self.actual = actual
+        self._by_key: dict[str, dict[Any, list[int]]] = {}
+        self._empty = (
+            [
+                i
+                for i, entry in enumerate(actual)
+                if isinstance(entry, dict) and not entry
+            ]
+            if include_empty
+            else []
+        )
+
+    def candidates(self, literals: list[tuple[str, Any]]) -> list[int] | None:
+        """Returns the positions (in order) of the actual entries that an expected entry with these
+        literal (key, value) pairs could match, or None if it has nothing to narrow them down by
+        (it could match any of them)."""
+        if not literals:
+            return None
+
+        positions = None
+        for key, value in literals:
+            bucket = self._index(key).get(value, [])
+            if positions is None or len(bucket) < len(positions):
+                positions = bucket
+            if not positions:
+                break
+        if self._empty:
+            return sorted({*positions, *self._empty})
+        return positions
+
+    def _index(self, key: str) -> dict[Any, list[int]]:
+        index = self._by_key.get(key)
+        if index is None:
+            index = {}
+            for i, entry in enumerate(self.actual):
+                if not isinstance(entry, dict):
+                    continue
+                try:
+                    index.setdefault(entry.get(key), []).append(i)
+                except TypeError:
+                    pass  # unhashable, so it can't be equal to a literal anyway
+            self._by_key[key] = index
+        return index
+
+
+def is_indexable(value) -> bool:
+    # Only truthy scalars. A falsy one can match a falsy value of another type (match_falsiness),
+    # while a truthy one is only matched by an equal value (the index is a superset of that, since
+    # 1 == 1.0 == True, the candidates are verified properly anyway).
+    return isinstance(value, (str, int, float)) and bool(value)
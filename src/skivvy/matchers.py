@@ -1,14 +1,20 @@
 """Built-in matchers used by skivvy"""
 
 # coding=utf-8
-import inspect
 import re
+import sys
+import threading
 import uuid as uuid_module
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
+from functools import lru_cache
 from math import fabs
+from typing import Callable, NamedTuple
 
 import requests
 
+from skivvy.errors import InvalidExpectation, VerificationFailure
 from skivvy.util.scope import has, fetch, store
 from skivvy.util import file_util
 from skivvy.util import log
@@ -18,6 +24,12 @@ DEFAULT_APPROXIMATE_THRESHOLD = (
     0.05  # default margin of error for a ~value to still be considered equal to another
 )
 SUCCESS_MSG = "OK"
+# how many $valid_url checks are made at once (and how many connections are kept per host)
+DEFAULT_URL_CHECK_CONCURRENCY = 16
+# how many distinct expected strings to remember whether (and which) matcher they invoke
+MATCHER_DISPATCH_CACHE_SIZE = 8192
+# how many distinct $regexp patterns to keep compiled (re's own cache is shared and much smaller)
+REGEXP_CACHE_SIZE = 2048
 
 _matcher_options = {}
 
@@ -27,10 +39,63 @@ _matcher_options = {}
 _matcher_state = {}
 
 
+class MatcherContext:
+    """The part of a verification a matcher gets to see, bound once per verification.
+    While a matcher is being applied, name is the name it was invoked by (e.g. "$valid_url")."""
+
+    __slots__ = ("options", "name", "deferred")
+
+    def __init__(self, options: dict | None = None):
+        self.options = options or {}
+        self.name: str | None = None
+        # when not None, checks that can be made later are collected here as (check, path)
+        self.deferred: list | None = None
+
+    @contextmanager
+    def immediate(self):
+        """Within this block, no checks are deferred."""
+        deferred, self.deferred = self.deferred, None
+        try:
+            yield
+        finally:
+            self.deferred = deferred
+
+    @property
+    def matcher_options(self) -> dict:
+        """Options for the matcher currently being applied, a negated matcher shares the options
+        of the matcher it negates."""
+        if self.name is None:
+            return {}
+        opts = self.options.get(self.name)
+        if opts is None and self.name.startswith("$!"):
+            opts = self.options.get("$" + self.name[2:])
+        return opts or {}
+
+
+_context = MatcherContext()
+
+
 def initialize_matchers(opts: dict):
-    global _matcher_options, _matcher_state
+    global _matcher_options, _matcher_state, _context
     _matcher_options = opts or {}
     _matcher_state = {}
+    _context = MatcherContext(_matcher_options)
+    _path.forget_structure()
+
+
+def get_matcher_context() -> MatcherContext:
+    return _context
+
+
+def current_verification() -> tuple:
+    """The options, state and context of the verification being made, to pick it up again with
+    resume_verification after others have been made in between (the path is empty by then)."""
+    return _matcher_options, _matcher_state, _context
+
+
+def resume_verification(verification: tuple):
+    global _matcher_options, _matcher_state, _context
+    _matcher_options, _matcher_state, _context = verification
 
 
 _path = PathTracker()
@@ -48,18 +113,22 @@ def get_path():
     return _path.current
 
 
+def format_path(segments):
+    # e.g. ["response", "items", 0, "id"] -> "response.items[0].id"
+    result = ""
+    for segment in segments:
+        if isinstance(segment, int):
+            result += "[%d]" % segment
+        else:
+            result += ("." if result else "") + str(segment)
+    return result
+
+
 def _structural_path():
     # Collapses list indices into the preceding key with [], giving a stable
     # grouping key across all items in a list.
     # e.g. ["response", "items", 0, "id"] -> "response.items[].id"
-    result = []
-    for segment in get_path():
-        if isinstance(segment, int):
-            if result:
-                result[-1] = result[-1] + "[]"
-        else:
-            result.append(segment)
-    return ".".join(result)
+    return _path.structural_key
 
 
 def _is_greater(a, b):
@@ -112,9 +181,12 @@ def match_desc(expected, actual):
 
 
 def get_matcher_options_self() -> dict:
-    caller = inspect.stack()[1].function
+    if _context.name is not None:
+        return _context.matcher_options
+    # called outside of verification (nothing bound), go by the name of the calling function instead
+    caller = sys._getframe(1).f_code.co_name
     for name, func in matcher_dict.items():
-        if func.__name__ == caller:
+        if getattr(func, "__name__", None) == caller:
             return _matcher_options.get(name, {})
     return {}
 
@@ -143,7 +215,7 @@ def match_regexp(expected, actual):
     try:
         expected, actual = expected.strip(), str(actual)
         log.debug("Comparing '%s' to regexp: '%s'" % (actual, expected))
-        if re.match(expected, actual):
+        if compile_regexp(expected).match(actual):
             log.debug("It's a match.")
             return True, SUCCESS_MSG
         else:
@@ -152,15 +224,169 @@ def match_regexp(expected, actual):
                 "Expected '%s' to match regular expression '%s' - but didn't"
                 % (actual, expected),
             )
-    except re.PatternError as e:
-        return False, "Invalid regular expression pattern in testcase: %s - %s" % (
-            expected,
-            str(e),
-        )
+    except re.error as e:
+        return False, _invalid_regexp_msg(expected, e)
     except Exception as e:
         return False, "Error when parsing: %s" % (str(e))
 
 
+@lru_cache(maxsize=REGEXP_CACHE_SIZE)
+def compile_regexp(pattern: str) -> re.Pattern:
+    return re.compile(pattern)
+
+
+def _invalid_regexp_msg(pattern, e: re.error) -> str:
+    return "Invalid regular expression pattern in testcase: %s - %s" % (pattern, str(e))
+
+
+class UrlCheck(NamedTuple):
+    url: str
+    verify_tls: bool = True
+    method: str = "get"
+    # in seconds, None for the timeout of the checker
+    timeout: float | None = None
+
+
+class UrlChecker:
+    """Checks whether URLs are reachable. Every distinct check is only made once (the results
+    are kept for as long as the checker lives) and all requests share one pooled session, which
+    keeps as many connections to a host as the most checks that have been made at once."""
+
+    VALID_STATUS_CODES = [200, 201, 202]
+
+    def __init__(self, session=None, pool_size=DEFAULT_URL_CHECK_CONCURRENCY, timeout=30):
+        # a session that's passed in is used as it is
+        self._pooled = session is None
+        self.pool_size = pool_size
+        self.session = session or _pooled_session(pool_size)
+        self.timeout = timeout
+        self.results: dict[UrlCheck, tuple[bool, str]] = {}
+        self._pool_lock = threading.Lock()
+
+    def check(self, check: UrlCheck) -> tuple[bool, str]:
+        result = self.results.get(check)
+        if result is None:
+            result = self.results[check] = self._request(check)
+        return result
+
+    def check_all(self, checks, concurrency=DEFAULT_URL_CHECK_CONCURRENCY):
+        """Makes all the checks not already made, up to `concurrency` at a time."""
+        todo = [check for check in dict.fromkeys(checks) if check not in self.results]
+        if concurrency <= 1 or len(todo) <= 1:
+            for check in todo:
+                self.check(check)
+            return
+        workers = min(concurrency, len(todo))
+        self._ensure_pool_size(workers)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for check, result in zip(todo, pool.map(self._request, todo)):
+                self.results[check] = result
+
+    def _ensure_pool_size(self, size: int):
+        # otherwise the checks beyond the size of the pool would each open a connection that
+        # isn't kept (the concurrency of $valid_url can differ from test to test)
+        if not self._pooled or size <= self.pool_size:
+            return
+        with self._pool_lock:
+            if size > self.pool_size:
+                _mount_pool(self.session, size)
+                self.pool_size = size
+
+    def _request(self, check: UrlCheck) -> tuple[bool, str]:
+        url = check.url
+        try:
+            log.debug("Making %s request to %s (verify=%s)" % (check.method.upper(), url, check.verify_tls))
+            request_function = getattr(self.session, check.method)
+            timeout = self.timeout if check.timeout is None else check.timeout
+            # a HEAD request doesn't follow redirects unless asked to, GET ones already do
+            response = request_function(url, verify=check.verify_tls, timeout=timeout, allow_redirects=True)
+
+            if response.status_code in self.VALID_STATUS_CODES:
+                log.debug("Success.")
+                return True, SUCCESS_MSG
+            else:
+                log.debug("Failure.")
+                # use status code here, not the URL
+                return False, "Expected %s but got %s" % (self.VALID_STATUS_CODES, response.status_code)
+
+        except Exception as e:
+            log.debug("Failure.")
+            log.debug("http call failed for: %s" % url)
+            return False, _url_failure_message(url, e)
+
+
+def _pooled_session(pool_size):
+    session = requests.Session()
+    _mount_pool(session, pool_size)
+    return session
+
+
+def _mount_pool(session, pool_size):
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+
+def _url_failure_message(url, e):
+    msg = str(e).lower()
+    is_cert_error = (
+        isinstance(e, requests.exceptions.SSLError)
+        or "certificate" in msg
+        or "ssl" in msg
+    )
+
+    if is_cert_error:
+        hint = (
+            " TLS certificate verification failed. "
+            "If this endpoint is known to use an invalid or self-signed certificate, "
+            "add 'unsafe' to disable certificate verification eg $valid_url unsafe "
+            "for this specific check."
+        )
+        return "Failed to make request to %s: %s.%s" % (url, e, hint)
+
+    return "Failed to make request to %s: %s" % (url, e)
+
+
+_url_checker = UrlChecker()
+
+
+def reset_url_checker(checker: UrlChecker | None = None):
+    """Forgets the results of all URL checks made so far, done once per run."""
+    global _url_checker
+    _url_checker = checker or UrlChecker()
+
+
+def take_deferred_url_checks() -> tuple[list, int]:
+    """Takes the $valid_url checks deferred during the current verification, along with how many of
+    them to make at once. Making them (see check_deferred_urls) doesn't need the verification anymore."""
+    deferred = _context.deferred or []
+    _context.deferred = []
+    opts = _context.options.get("$valid_url") or {}
+    return deferred, int(opts.get("concurrency", DEFAULT_URL_CHECK_CONCURRENCY))
+
+
+def check_deferred_urls(deferred: list, concurrency: int = DEFAULT_URL_CHECK_CONCURRENCY):
+    """Makes the deferred $valid_url checks, concurrently, and raises a VerificationFailure
+    listing every one that failed along with its path."""
+    if not deferred:
+        return
+    checker = _url_checker
+    checker.check_all([check for check, _path in deferred], concurrency=concurrency)
+
+    failures = []
+    for check, path in deferred:
+        result, msg = checker.results[check]
+        if not result:
+            failures.append("$valid_url failed at %s: %s" % (format_path(path) or "<root>", msg))
+    if failures:
+        raise VerificationFailure("\n".join(failures))
+
+
+def resolve_deferred_url_checks():
+    """Makes all $valid_url checks deferred during the current verification, see check_deferred_urls."""
+    check_deferred_urls(*take_deferred_url_checks())
+
+
 def match_valid_url(expected, actual):
     """Assert actual is a reachable URL. Options: unsafe, prefix <url>. E.g. $valid_url unsafe"""
     try:
@@ -193,42 +419,26 @@ def match_valid_url(expected, actual):
         if prefix:
             actual = prefix.rstrip("/") + actual
 
-        valid_status_codes = [200, 201, 202]
-        verify_tls = not unsafe
-
-        log.debug("Making request to %s (verify=%s)" % (actual, verify_tls))
-        response = requests.get(actual, verify=verify_tls, timeout=30)
-
-        if response.status_code in valid_status_codes:
-            log.debug("Success.")
-            return True, SUCCESS_MSG
-        else:
-            log.debug("Failure.")
-            # use status code here, not the URL
-            return False, "Expected %s but got %s" % (valid_status_codes, response.status_code)
-
+        timeout = opts.get("timeout")
+        check = UrlCheck(
+            actual,
+            verify_tls=not unsafe,
+            method=opts.get("method", "get").lower(),
+            timeout=None if timeout is None else float(timeout),
+        )
     except Exception as e:
         log.debug("Failure.")
-        log.debug("http call failed for: %s" % actual)
         log.debug("expected: %s" % expected)
+        return False, _url_failure_message(actual, e)
 
-        msg = str(e).lower()
-        is_cert_error = (
-            isinstance(e, requests.exceptions.SSLError)
-            or "certificate" in msg
-            or "ssl" in msg
-        )
-
-        if is_cert_error:
-            hint = (
-                " TLS certificate verification failed. "
-                "If this endpoint is known to use an invalid or self-signed certificate, "
-                "add 'unsafe' to disable certificate verification eg $valid_url unsafe "
-                "for this specific check."
-            )
-            return False, "Failed to make request to %s: %s.%s" % (actual, e, hint)
+    # when verify has asked for it, the check is made later - together with all the others
+    # (a negated $!valid_url needs its result right away though)
+    if _context.deferred is not None and _context.name == "$valid_url":
+        # the path is only formatted if the check fails
+        _context.deferred.append((check, _path.snapshot()))
+        return True, SUCCESS_MSG
 
-        return False, "Failed to make request to %s: %s" % (actual, e)
+    return _url_checker.check(check)
 
 
 def match_text(expected, actual):
@@ -534,6 +744,62 @@ def add_matcher(matcher_name, matcher_func):
     if key in matcher_dict:
         raise AssertionError("Duplicate matcher: %s" % matcher_name)
     matcher_dict[key] = matcher_func
+    invalidate_matcher_dispatch()
+
+
+class ResolvedMatcher(NamedTuple):
+    name: str
+    func: Callable
+    argument: str
+
+
+def resolve_matcher(expected) -> ResolvedMatcher | None:
+    """Returns the matcher expected invokes, e.g. "$len 5" -> ("$len", len_match, " 5"),
+    or None if it doesn't invoke any registered matcher."""
+    if not isinstance(expected, str):
+        return None
+    if _dispatch_registry is not matcher_dict:
+        # the registry has been replaced wholesale, rather than added to
+        invalidate_matcher_dispatch()
+    return _parse_matcher(expected)
+
+
+@lru_cache(maxsize=MATCHER_DISPATCH_CACHE_SIZE)
+def _parse_matcher(expected):
+    tokens = expected.split(maxsplit=1)
+    if not tokens:
+        return None
+    name = tokens[0]
+    matcher_func = matcher_dict.get(name)
+    if matcher_func is None:
+        return None
+    return ResolvedMatcher(name, matcher_func, expected[expected.index(name) + len(name):])
+
+
+def precompile_matcher(resolved: ResolvedMatcher):
+    """Does whatever work a matcher would otherwise do for every value it's applied to up front,
+    once, when a plan is compiled. Raises InvalidExpectation if the matcher can never succeed."""
+    if resolved.name.replace("$!", "$", 1) == "$regexp":
+        pattern = resolved.argument.strip()
+        try:
+            compile_regexp(pattern)
+        except re.error as e:
+            raise InvalidExpectation(_invalid_regexp_msg(pattern, e)) from None
+
+
+def invalidate_matcher_dispatch():
+    global _dispatch_registry, _dispatch_generation
+    _dispatch_registry = matcher_dict
+    _dispatch_generation += 1
+    _parse_matcher.cache_clear()
+
+
+def dispatch_generation() -> int:
+    """Changes whenever what a matcher string resolves to might have, for caching resolved
+    matchers."""
+    if _dispatch_registry is not matcher_dict:
+        invalidate_matcher_dispatch()
+    return _dispatch_generation
 
 
 def negating_matcher(negating_name, matcher_func):
@@ -592,3 +858,14 @@ matcher_dict = {
     "$asc": match_asc,
     "$desc": match_desc,
 }
+_dispatch_registry = matcher_dict
+_dispatch_generation = 0
+_builtin_matchers = dict(matcher_dict)
+
+
+def reset_matchers():
+    """Removes every matcher that has been added (custom and negating ones), leaving the built-in
+    ones, so that they can be loaded again."""
+    matcher_dict.clear()
+    matcher_dict.update(_builtin_matchers)
+    invalidate_matcher_dispatch()
@@ -1,13 +1,83 @@
+class StructuralNode:
+    """A path with its list indices collapsed, e.g. response.items[].id for both response.items[0].id
+    and response.items[1].id, which is what stateful matchers group their values by.
+
+    Nodes are interned, every structural path has exactly one node (linked to the node of its parent),
+    so looking one up when walking into a dict or list doesn't allocate anything once it has been seen
+    and its key is only turned into a string once, the first time it's needed.
+    """
+
+    __slots__ = ("parent", "name", "_children", "_items", "_key")
+
+    def __init__(self, parent=None, name=None):
+        self.parent = parent
+        self.name = name
+        self._children = {}
+        self._items = None
+        self._key = None
+
+    def child(self, name) -> "StructuralNode":
+        node = self._children.get(name)
+        if node is None:
+            node = self._children[name] = StructuralNode(self, name)
+        return node
+
+    def items(self) -> "StructuralNode":
+        # the entries of a list, whatever their index
+        if self._items is None:
+            self._items = StructuralNode(self)
+        return self._items
+
+    @property
+    def key(self) -> str:
+        if self._key is None:
+            if self.parent is None:
+                self._key = ""
+            elif self.name is None:
+                parent_key = self.parent.key
+                # indices that don't follow a key (a top-level list) aren't part of the key
+                self._key = parent_key + "[]" if parent_key else ""
+            else:
+                parent_key = self.parent.key
+                self._key = (
+                    parent_key + "." + str(self.name) if parent_key else str(self.name)
+                )
+        return self._key
+
+
 class PathTracker:
     def __init__(self):
         self._segments = []
+        # the structural node of every depth, the root's at depth 0
+        self._structure = [StructuralNode()]
+
+    def forget_structure(self):
+        """Lets go of the interned structural nodes, which otherwise grow with every distinct key
+        ever seen. Only done between verifications, when the path is empty."""
+        if not self._segments:
+            self._structure = [StructuralNode()]
 
     def push(self, segment):
+        parent = self._structure[-1]
+        if isinstance(segment, int):
+            self._structure.append(parent.items())
+        else:
+            self._structure.append(parent.child(segment))
         self._segments.append(segment)
 
     def pop(self):
         self._segments.pop()
+        self._structure.pop()
 
     @property
     def current(self):
         return list(self._segments)
+
+    def snapshot(self) -> tuple:
+        """The current segments, for keeping around and formatting later (only if needed)."""
+        return tuple(self._segments)
+
+    @property
+    def structural_key(self) -> str:
+        # e.g. ["response", "items", 0, "id"] -> "response.items[].id"
+        return self._structure[-1].key
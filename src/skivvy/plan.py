@@ -0,0 +1,121 @@
+"""Verification plans: the expected JSON of a test, compiled once.
+
+Verifying means walking the expected tree and, for every value, working out whether it
+invokes a matcher (and which), is a dict, a list or a plain value. A plan is a tree of
+nodes where that has already been done, so verifying the same expected JSON again -
+for every entry with match_every_entry, for every candidate when searching a list, or
+when a test is rerun - only has to walk the nodes.
+"""
+
+from collections import OrderedDict
+from typing import Any, Hashable, NamedTuple
+
+from . import matchers
+from .list_index import is_indexable
+
+PLAN_CACHE_SIZE = 256
+
+
+class MatcherNode(NamedTuple):
+    source: str
+    matcher: matchers.ResolvedMatcher
+
+
+class LiteralNode(NamedTuple):
+    source: Any
+
+
+class DictNode:
+    """The children of a dict (and list) node are only compiled when they're first walked, a big
+    expected tree that's mostly found by plain equality never needs to be compiled at all.
+    """
+
+    __slots__ = ("source", "_items")
+
+    def __init__(self, source: dict):
+        self.source = source
+        self._items = None
+
+    @property
+    def items(self) -> tuple[tuple[str, "Node"], ...]:
+        if self._items is None:
+            self._items = tuple(
+                (key, compile_plan(value)) for key, value in self.source.items()
+            )
+        return self._items
+
+
+class ListNode:
+    __slots__ = ("source", "_entries", "_literals")
+
+    def __init__(self, source: list):
+        self.source = source
+        self._entries = None
+        self._literals = None
+
+    @property
+    def entries(self) -> tuple["Node", ...]:
+        if self._entries is None:
+            self._entries = tuple(compile_plan(entry) for entry in self.source)
+        return self._entries
+
+    @property
+    def literals(self) -> tuple[list[tuple[str, Any]], ...]:
+        """For each entry, the (key, value) pairs a matching actual entry must have equal
+        values for."""
+        if self._literals is None:
+            self._literals = tuple(literal_items(entry) for entry in self.entries)
+        return self._literals
+
+
+Node = MatcherNode | LiteralNode | DictNode | ListNode
+
+
+def compile_plan(expected) -> Node:
+    matcher = matchers.resolve_matcher(expected)
+    if matcher is not None:
+        matchers.precompile_matcher(matcher)
+        return MatcherNode(expected, matcher)
+    if isinstance(expected, dict):
+        return DictNode(expected)
+    if isinstance(expected, list):
+        return ListNode(expected)
+    return LiteralNode(expected)
+
+
+def literal_items(node: Node) -> list[tuple[str, Any]]:
+    """The (key, value) pairs of an expected dict that an actual entry has to have equal values
+    for."""
+    if type(node) is not DictNode:
+        return []
+    return [
+        (key, value.source)
+        for key, value in node.items
+        if type(value) is LiteralNode and is_indexable(value.source)
+    ]
+
+
+_cache: OrderedDict[tuple, Node] = OrderedDict()
+
+
+def get_plan(expected, key: Hashable | None = None) -> Node:
+    """Returns the plan of expected, if key is given the plan is cached under it. The key must
+    identify the content of expected, e.g. the content hash of the file it was read from.
+    """
+    if key is None:
+        return compile_plan(expected)
+
+    # what matcher strings resolve to changes when matchers are added, so does the plan
+    cache_key = (key, matchers.dispatch_generation())
+    plan = _cache.get(cache_key)
+    if plan is None:
+        plan = _cache[cache_key] = compile_plan(expected)
+        if len(_cache) > PLAN_CACHE_SIZE:
+            _cache.popitem(last=False)
+    else:
+        _cache.move_to_end(cache_key)
+    return plan
+
+
+def clear_cache():
+    _cache.clear()
@@ -0,0 +1,279 @@
+"""Decides in which order (and how concurrently) testfiles are run.
+
+Variables stored with $store are scoped to the directory of a testfile, so tests
+in the same directory may depend on each other and always run one after another,
+in the order they were listed. Tests in different directories are independent
+and can be run side by side, either by a pool of worker threads or as asyncio tasks.
+When it's known how long tests usually take, the longest running directories are
+started first, so that the run doesn't end waiting for one that was started last.
+Given a graph of which tests depend on which (see dependencies.py), tests of the same
+directory are also run side by side, each one as soon as the ones it depends on have run.
+"""
+
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from statistics import median
+from typing import Awaitable, Callable
+
+from .util import file_util, scope
+
+# Runs a single test given its 1-based position in the list and its path, returns True if it passed
+RunOne = Callable[[int, str], bool]
+RunOneAsync = Callable[[int, str], Awaitable[bool]]
+# Maps every test to the tests that have to be run before it
+Graph = dict[str, list[str]]
+
+SCHEDULE_DIRECTORIES = "directories"
+SCHEDULE_DEPENDENCIES = "dependencies"
+_supported_schedules = (SCHEDULE_DIRECTORIES, SCHEDULE_DEPENDENCIES)
+
+
+def group_by_namespace(tests: list[str]) -> list[list[tuple[int, str]]]:
+    """Groups (index, testfile) pairs by namespace, keeping the order of the tests within each group
+    and ordering the groups by their first test."""
+    groups: dict[str, list[tuple[int, str]]] = {}
+    for index, testfile in enumerate(tests, start=1):
+        groups.setdefault(file_util.namespace_of(testfile), []).append(
+            (index, testfile)
+        )
+    return list(groups.values())
+
+
+def group_weights(
+    groups: list[list[tuple[int, str]]], durations: dict[str, float] | None
+) -> list[float]:
+    """How long each group of tests is expected to take, given how long tests usually take.
+    Tests that haven't been timed yet count as taking as long as the typical test that has been.
+    """
+    durations = durations or {}
+    default_duration = median(durations.values()) if durations else 1
+    return [
+        sum(durations.get(testfile, default_duration) for _, testfile in group)
+        for group in groups
+    ]
+
+
+def longest_first(
+    groups: list[list[tuple[int, str]]], durations: dict[str, float] | None
+) -> list[list[tuple[int, str]]]:
+    if not durations:
+        return groups
+    weights = group_weights(groups, durations)
+    # sorting is stable, so groups that weigh the same stay in the order they were listed
+    return [groups[g] for g in sorted(range(len(groups)), key=lambda g: -weights[g])]
+
+
+def validate_schedule(schedule: str) -> str:
+    if schedule not in _supported_schedules:
+        raise ValueError(
+            f'Unknown schedule "{schedule}". Supported values: {", ".join(_supported_schedules)}'
+        )
+    return schedule
+
+
+def _validate_workers(workers) -> int:
+    workers = 1 if workers is None else int(workers)
+    if workers < 1:
+        raise ValueError(f"workers must be at least 1 (got {workers})")
+    return workers
+
+
+def run_tests(
+    tests: list[str],
+    run_one: RunOne,
+    workers: int = 1,
+    fail_fast: bool = False,
+    durations: dict[str, float] | None = None,
+    graph: Graph | None = None,
+) -> tuple[int, int]:
+    """Runs all tests and returns a tuple of (number of tests run, number of failures).
+    durations (how long each test usually takes) decides which directories are started first
+    when running in parallel, graph lets tests of the same directory run in parallel."""
+    workers = _validate_workers(workers)
+    if workers == 1:
+        return _run_serial(tests, run_one, fail_fast)
+    if graph is not None:
+        return _run_graph(tests, graph, run_one, workers, fail_fast)
+    groups = longest_first(group_by_namespace(tests), durations)
+    return _run_parallel(groups, run_one, workers, fail_fast)
+
+
+def _run_serial(tests: list[str], run_one: RunOne, fail_fast: bool) -> tuple[int, int]:
+    num_tests = failures = 0
+    for index, testfile in enumerate(tests, start=1):
+        num_tests += 1
+        if not run_one(index, testfile):
+            failures += 1
+            if fail_fast:
+                break
+    return num_tests, failures
+
+
+def _run_parallel(
+    groups: list[list[tuple[int, str]]], run_one: RunOne, workers: int, fail_fast: bool
+) -> tuple[int, int]:
+    stop = threading.Event()
+
+    def run_group(group: list[tuple[int, str]]) -> tuple[int, int]:
+        num_tests = failures = 0
+        token = scope.bind_namespace(file_util.namespace_of(group[0][1]))
+        try:
+            for index, testfile in group:
+                if stop.is_set():
+                    break
+                num_tests += 1
+                if not run_one(index, testfile):
+                    failures += 1
+                    if fail_fast:
+                        stop.set()
+        finally:
+            scope.unbind_namespace(token)
+        return num_tests, failures
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="skivvy") as pool:
+        futures = [pool.submit(run_group, group) for group in groups]
+        try:
+            results = [future.result() for future in futures]
+        except BaseException:
+            stop.set()
+            raise
+
+    return sum(n for n, _ in results), sum(f for _, f in results)
+
+
+def _dependents(tests: list[str], graph: Graph) -> dict[str, list[str]]:
+    dependents: dict[str, list[str]] = {testfile: [] for testfile in tests}
+    for testfile in tests:
+        for prerequisite in graph.get(testfile, ()):
+            dependents[prerequisite].append(testfile)
+    return dependents
+
+
+def _run_graph(
+    tests: list[str], graph: Graph, run_one: RunOne, workers: int, fail_fast: bool
+) -> tuple[int, int]:
+    index_of = {testfile: index for index, testfile in enumerate(tests, start=1)}
+    dependents = _dependents(tests, graph)
+    waiting_for = {testfile: len(graph.get(testfile, ())) for testfile in tests}
+    num_tests = failures = 0
+    stop = False
+
+    def run_node(testfile: str) -> bool:
+        token = scope.bind_namespace(file_util.namespace_of(testfile))
+        try:
+            return run_one(index_of[testfile], testfile)
+        finally:
+            scope.unbind_namespace(token)
+
+    # tests are only handed to the pool once a worker is free for them, so that nothing new
+    # gets started after a failure when failing fast
+    ready = deque(t for t in tests if not waiting_for[t])
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="skivvy") as pool:
+        try:
+            while True:
+                while ready and len(running) < workers and not stop:
+                    testfile = ready.popleft()
+                    running[pool.submit(run_node, testfile)] = testfile
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    testfile = running.pop(future)
+                    num_tests += 1
+                    if not future.result():
+                        failures += 1
+                        stop = stop or fail_fast
+                    for dependent in dependents[testfile]:
+                        waiting_for[dependent] -= 1
+                        if not waiting_for[dependent]:
+                            ready.append(dependent)
+        except BaseException:
+            for future in running:
+                future.cancel()
+            raise
+
+    return num_tests, failures
+
+
+async def run_tests_async(
+    tests: list[str],
+    run_one: RunOneAsync,
+    workers: int = 1,
+    fail_fast: bool = False,
+    durations: dict[str, float] | None = None,
+    graph: Graph | None = None,
+) -> tuple[int, int]:
+    """Like run_tests but for coroutines, at most `workers` directories are in flight at once
+    (or, given a graph, at most `workers` tests)."""
+    workers = _validate_workers(workers)
+    if graph is not None and workers > 1:
+        return await _run_graph_async(tests, graph, run_one, workers, fail_fast)
+    stop = asyncio.Event()
+    limit = asyncio.Semaphore(workers)
+
+    async def run_group(group: list[tuple[int, str]]) -> tuple[int, int]:
+        num_tests = failures = 0
+        async with limit:
+            # every task runs in its own copy of the context, so this binding stays local to the group
+            scope.bind_namespace(file_util.namespace_of(group[0][1]))
+            for index, testfile in group:
+                if stop.is_set():
+                    break
+                num_tests += 1
+                if not await run_one(index, testfile):
+                    failures += 1
+                    if fail_fast:
+                        stop.set()
+        return num_tests, failures
+
+    # the semaphore lets waiting groups in in the order they were created, so longest first
+    groups = longest_first(group_by_namespace(tests), durations)
+    tasks = [asyncio.create_task(run_group(group)) for group in groups]
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        stop.set()
+        for task in tasks:
+            task.cancel()
+        raise
+
+    return sum(n for n, _ in results), sum(f for _, f in results)
+
+
+async def _run_graph_async(
+    tests: list[str], graph: Graph, run_one: RunOneAsync, workers: int, fail_fast: bool
+) -> tuple[int, int]:
+    stop = asyncio.Event()
+    limit = asyncio.Semaphore(workers)
+    tasks: dict[str, asyncio.Task] = {}
+
+    async def run_node(index: int, testfile: str) -> tuple[int, int]:
+        prerequisites = [tasks[p] for p in graph.get(testfile, ())]
+        if prerequisites:
+            # a prerequisite failing doesn't stop its dependents, just like in a directory
+            await asyncio.wait(prerequisites)
+        async with limit:
+            if stop.is_set():
+                return 0, 0
+            scope.bind_namespace(file_util.namespace_of(testfile))
+            if await run_one(index, testfile):
+                return 1, 0
+            if fail_fast:
+                stop.set()
+            return 1, 1
+
+    # prerequisites are always listed before their dependents, so their tasks exist by then
+    for index, testfile in enumerate(tests, start=1):
+        tasks[testfile] = asyncio.create_task(run_node(index, testfile))
+    try:
+        results = await asyncio.gather(*tasks.values())
+    except BaseException:
+        stop.set()
+        for task in tasks.values():
+            task.cancel()
+        raise
+
+    return sum(n for n, _ in results), sum(f for _, f in results)
@@ -0,0 +1,46 @@
+"""Splits a suite into shards, so that it can be run by several processes (e.g. CI nodes) at once.
+
+Every process lists the same testfiles and, given the same recorded durations, computes the
+same split, so no coordination between them is needed. Tests in the same directory share
+their $store/$fetch variables, so a directory is never split between shards.
+"""
+
+from . import scheduler
+
+
+def parse_shard(spec: str) -> tuple[int, int]:
+    """Parses e.g. "2/5" into (2, 5), the second of five shards."""
+    try:
+        shard, num_shards = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(
+            f'shard must be given as k/n, e.g. 2/5 (got "{spec}")'
+        ) from None
+    if not 1 <= shard <= num_shards:
+        raise ValueError(f'shard must be between 1/n and n/n (got "{spec}")')
+    return shard, num_shards
+
+
+def shard_tests(
+    tests: list[str],
+    shard: int,
+    num_shards: int,
+    durations: dict[str, float] | None = None,
+) -> list[str]:
+    """Returns the tests of the (1-based) shard, in the order they were listed.
+
+    Directories are spread over the shards by how long their tests usually take, the longest
+    first, each to the shard with the least to do so far."""
+    groups = scheduler.group_by_namespace(tests)
+    weights = scheduler.group_weights(groups, durations)
+
+    loads = [0.0] * num_shards
+    selected: list[int] = []
+    # sorting is stable, so groups that weigh the same stay in the order they were listed
+    for g in sorted(range(len(groups)), key=lambda g: -weights[g]):
+        target = min(range(num_shards), key=lambda s: loads[s])
+        loads[target] += weights[g]
+        if target == shard - 1:
+            selected.extend(index for index, _ in groups[g])
+
+    return [tests[index - 1] for index in sorted(selected)]
@@ -3,7 +3,9 @@ from __future__ import annotations
 from collections import defaultdict
 from dataclasses import dataclass, field
 import json
-from typing import Callable
+import os
+import threading
+from typing import Callable, TextIO
 
 from rich.text import Text
 
@@ -163,10 +165,8 @@ class BaseSink:
     def __init__(self):
         self._disconnects: list[Disconnect] = []
 
-    def _connect(self, signal_name: str, receiver):
-        sig = events.signal(signal_name)
-        sig.connect(receiver)
-        self._disconnects.append(lambda: sig.disconnect(receiver))
+    def _connect(self, signal_name: str, receiver, wants: Callable[[], bool] | None = None):
+        self._disconnects.append(events.connect(signal_name, receiver, wants))
 
     def close(self):
         for disconnect in reversed(self._disconnects):
@@ -199,10 +199,23 @@ class ConsoleOutputSink(BaseSink):
         self._connect(events.TEST_PASSED, self._on_test_passed)
         self._connect(events.TEST_FAILED, self._on_test_failed)
         self._connect(events.RUN_FINISHED, self._on_run_finished)
-        self._connect(events.HTTP_TRANSPORT, self._on_http_transport)
-        self._connect(events.HTTP_RESPONSE, self._on_http_response)
+        # only logged at the configured levels, while they're not, the events needn't be made
+        self._connect(
+            events.HTTP_TRANSPORT,
+            self._on_http_transport,
+            wants=lambda: self._logs_any(self.http_request_level, self.http_headers_level),
+        )
+        self._connect(
+            events.HTTP_RESPONSE,
+            self._on_http_response,
+            wants=lambda: self._logs_any(self.http_response_level, self.http_headers_level),
+        )
         return self
 
+    @staticmethod
+    def _logs_any(*levels) -> bool:
+        return any(log.is_enabled_at(level) for level in levels)
+
     def _on_run_started(self, _sender, **kw):
         log.info(f"[b]skivvy[/b] [u]{kw.get('version')}[/u] | config={kw.get('config_file')}")
         log.info(f"{kw.get('test_count')} tests found.")
@@ -222,10 +235,12 @@ class ConsoleOutputSink(BaseSink):
     def _on_test_failed(self, _sender, **kw):
         testfile = kw.get("testfile", "")
         self._failed.append(testfile)
-        log.render(Text("\n"))
-        log.render(self._result_line(testfile, self.failed_style, "FAILED", "red"))
-        self._log_failure_context(kw.get("error_context") or {})
-        log.error("\n")
+        # it takes many lines, which mustn't be interleaved with what other tests output meanwhile
+        with log.grouped():
+            log.render(Text("\n"))
+            log.render(self._result_line(testfile, self.failed_style, "FAILED", "red"))
+            self._log_failure_context(kw.get("error_context") or {})
+            log.error("\n")
 
     def _on_run_finished(self, _sender, **kw):
         failures = kw.get("failures") or 0
@@ -284,6 +299,10 @@ class ConsoleOutputSink(BaseSink):
                 self._log_table_diff(expected_json, actual_json)
 
     def _on_http_transport(self, _sender, **kw):
+        with log.grouped():
+            self._log_http_transport(**kw)
+
+    def _log_http_transport(self, **kw):
         method = (kw.get("http_method") or "").upper()
         url = kw.get("url")
         log.log_at(self.http_request_level, f"[dim]http request[/dim] {method} {url}")
@@ -308,6 +327,10 @@ class ConsoleOutputSink(BaseSink):
             )
 
     def _on_http_response(self, _sender, **kw):
+        with log.grouped():
+            self._log_http_response(**kw)
+
+    def _log_http_response(self, **kw):
         status = kw.get("http_status")
         url = kw.get("url")
         log.log_at(
@@ -317,7 +340,13 @@ class ConsoleOutputSink(BaseSink):
 
         response_body = kw.get("response_body")
         if response_body:
-            log.log_at(self.http_response_level, self._format_http_body(response_body))
+            if "response_json" in kw:
+                # already parsed by the transport, no need to parse the body again
+                body = kw["response_json"]
+                formatted = response_body if body is None else tojsonstr(body)
+            else:
+                formatted = self._format_http_body(response_body)
+            log.log_at(self.http_response_level, formatted)
 
         response_headers = kw.get("response_headers")
         if response_headers:
@@ -360,16 +389,23 @@ class ConsoleOutputSink(BaseSink):
 
 
 class TimingSink(BaseSink):
-    def __init__(self, http_timing: bool = False):
+    """Times tests and the steps they go through, from the monotonic "mono_ns" of the events (so
+    durations are accurate to well below a millisecond and aren't affected by the wall clock
+    being adjusted). Durations are kept in (fractional) milliseconds."""
+
+    def __init__(self, http_timing: bool = False, report: bool = True):
+        """With report=False, durations are only collected (e.g. to be recorded) but not logged.
+        http_timing adds a breakdown of how long each step of a test took to what's logged."""
         super().__init__()
         self.http_timing = http_timing
-        self.run_started_ts: int = 0
-        self.run_finished_ts: int = 0
-        self.test_started_ts: dict[str, int] = {}
-        self.test_totals_ms: dict[str, int] = {}
+        self.report = report
+        self.run_started_ns: int = 0
+        self.run_finished_ns: int = 0
+        self.test_started_ns: dict[str, int] = {}
+        self.test_totals_ms: dict[str, float] = {}
         self._last_step_event: dict[str, tuple[str, int]] = {}
-        self.phase_durations_ms: dict[str, dict[str, int]] = defaultdict(dict)
-        self.http_phase_durations_ms: dict[str, list[int]] = defaultdict(list)
+        self.phase_durations_ms: dict[str, dict[str, float]] = defaultdict(dict)
+        self.http_phase_durations_ms: dict[str, list[float]] = defaultdict(list)
 
     def install(self):
         self._connect(events.RUN_STARTED, self._on_run_started)
@@ -391,47 +427,53 @@ class TimingSink(BaseSink):
         return kw.get("test_id") or kw.get("testfile")
 
     def _on_run_started(self, _sender, **kw):
-        self.run_started_ts = kw.get("ts", 0)
+        self.run_started_ns = kw.get("mono_ns", 0)
 
     def _on_run_finished(self, _sender, **kw):
-        self.run_finished_ts = kw.get("ts", 0)
-        total_ms = self.run_finished_ts - self.run_started_ts
-        log.info(f"took={total_ms}ms")
+        self.run_finished_ns = kw.get("mono_ns", 0)
+        total_ms = (self.run_finished_ns - self.run_started_ns) / 1_000_000
+        if self.report:
+            log.info(f"took={_format_ms(total_ms)}")
 
     def _on_test_started(self, _sender, **kw):
         test_key = self._test_key(kw)
-        ts = kw.get("ts")
-        if test_key and isinstance(ts, int):
-            self.test_started_ts[test_key] = ts
+        mono_ns = kw.get("mono_ns")
+        if test_key and isinstance(mono_ns, int):
+            self.test_started_ns[test_key] = mono_ns
+
+    def _end_step(self, test_key: str, mono_ns: int):
+        # a step lasts until the next one starts (or the test finishes)
+        previous = self._last_step_event.pop(test_key, None)
+        if previous is None:
+            return
+        previous_event, previous_ns = previous
+        duration_ms = max(0, mono_ns - previous_ns) / 1_000_000
+        self.phase_durations_ms[test_key][previous_event] = duration_ms
+        if previous_event == events.HTTP_TRANSPORT:
+            self.http_phase_durations_ms[test_key].append(duration_ms)
 
     def _on_step_event(self, _sender, **kw):
         test_key = self._test_key(kw)
         event_name = kw.get("event")
-        ts = kw.get("ts")
-        if not (test_key and event_name and isinstance(ts, int)):
+        mono_ns = kw.get("mono_ns")
+        if not (test_key and event_name and isinstance(mono_ns, int)):
             return
-
-        previous = self._last_step_event.get(test_key)
-        if previous is not None:
-            previous_event, previous_ts = previous
-            duration_ms = max(0, ts - previous_ts)
-            self.phase_durations_ms[test_key][previous_event] = duration_ms
-            if previous_event == events.HTTP_TRANSPORT:
-                self.http_phase_durations_ms[test_key].append(duration_ms)
-
-        self._last_step_event[test_key] = (event_name, ts)
+        self._end_step(test_key, mono_ns)
+        self._last_step_event[test_key] = (event_name, mono_ns)
 
     def _on_test_finished(self, _sender, **kw):
         test_key = self._test_key(kw)
-        ts = kw.get("ts")
-        if not (test_key and isinstance(ts, int)):
+        mono_ns = kw.get("mono_ns")
+        if not (test_key and isinstance(mono_ns, int)):
             return
-        self._last_step_event.pop(test_key, None)
-        start_ts = self.test_started_ts.pop(test_key, None)
-        if start_ts is None:
+        self._end_step(test_key, mono_ns)
+        start_ns = self.test_started_ns.pop(test_key, None)
+        if start_ns is None:
             return
-        total_ms = max(0, ts - start_ts)
+        total_ms = max(0, mono_ns - start_ns) / 1_000_000
         self.test_totals_ms[test_key] = total_ms
+        if not self.report:
+            return
 
         prefix = ""
         http_label = "http"
@@ -441,18 +483,153 @@ class TimingSink(BaseSink):
         if self.http_timing and self.http_phase_durations_ms.get(test_key):
             prefix = "•"
             total_label = "total\t"
+            for step, duration_ms in self.phase_durations_ms[test_key].items():
+                if step == events.HTTP_TRANSPORT:
+                    continue
+                step_label = step.removeprefix("test.")
+                timings.append(f"[dim]{prefix}{step_label}\t {_format_ms(duration_ms)}[/dim]")
             http_total = sum(self.http_phase_durations_ms[test_key])
-            timings.append(f"[dim]{prefix}{http_label}\t {http_total}ms[/dim]")
+            timings.append(f"[dim]{prefix}{http_label}\t {_format_ms(http_total)}[/dim]")
 
-        timings.append(f"[dim]{prefix}{total_label} {total_ms}ms[/dim]")
+        timings.append(f"[dim]{prefix}{total_label} {_format_ms(total_ms)}[/dim]")
 
         log.info("\n".join(timings))
 
+
+class OutcomeSink(BaseSink):
+    """Collects which tests passed and which failed (e.g. to be recorded in the failures file)."""
+
+    def __init__(self):
+        super().__init__()
+        self.passed: list[str] = []
+        self.failed: list[str] = []
+
+    def install(self):
+        self._connect(events.TEST_PASSED, self._on_test_passed)
+        self._connect(events.TEST_FAILED, self._on_test_failed)
+        return self
+
+    def _on_test_passed(self, _sender, **kw):
+        self.passed.append(kw.get("testfile", ""))
+
+    def _on_test_failed(self, _sender, **kw):
+        self.failed.append(kw.get("testfile", ""))
+
+
+def _format_ms(ms: float) -> str:
+    # fast steps are shown with enough decimals to tell them apart, slow ones don't need any
+    if ms < 10:
+        return f"{ms:.3f}ms"
+    if ms < 100:
+        return f"{ms:.1f}ms"
+    return f"{ms:.0f}ms"
+
+
+class JsonlEventSink(BaseSink):
+    """Writes every event as a line of compact JSON, for other programs to consume.
+
+    Lines are buffered and written in chunks (and whenever a run finishes). Besides the wall clock
+    "ts" in milliseconds, every event has a monotonic "mono_ns", here the nanoseconds since the
+    sink was installed, which can be used to order and time events precisely. Request and response
+    bodies, and what a failing test expected and actually got, can be truncated to max_body
+    characters (of their JSON), the original length is kept in "<key>_truncated"."""
+
+    BODY_KEYS = ("request_json", "request_data", "response_body")
+    # of a failing test, top-level and in its error_context, these may hold whole response bodies
+    FAILURE_KEYS = ("expected", "actual")
+    # the parsed response body is the same as response_body, so it isn't written twice
+    SKIPPED_KEYS = ("response_json",)
+
+    def __init__(
+        self,
+        target: str | int,
+        max_body: int | None = None,
+        buffer_size: int = 64 * 1024,
+    ):
+        """target is either the path of a file to append to, or a file descriptor to write to
+        (which is left open)."""
+        super().__init__()
+        self.max_body = max_body
+        self._buffer_size = buffer_size
+        self._target = target
+        self._fp: TextIO | None = None
+        self._lock = threading.Lock()
+        self._origin_ns = 0
+
+    def install(self):
+        if isinstance(self._target, int):
+            self._fp = os.fdopen(
+                self._target, "w", encoding="utf8", buffering=self._buffer_size, closefd=False
+            )
+        else:
+            self._fp = open(self._target, "a", encoding="utf8", buffering=self._buffer_size)
+        self._origin_ns = events.now_ns()
+        for name in events.ALL_EVENTS:
+            self._connect(name, self._on_event)
+        return self
+
+    def _on_event(self, _sender, **kw):
+        mono_ns = kw.pop("mono_ns", None) or events.now_ns()
+        record = {"event": kw.pop("event", None), "mono_ns": mono_ns - self._origin_ns}
+        for key, value in kw.items():
+            if key in self.SKIPPED_KEYS:
+                continue
+            if self.max_body is not None and value is not None:
+                if key in self.BODY_KEYS:
+                    value = self._truncated(record, key, value, keep_short=False)
+                elif key in self.FAILURE_KEYS:
+                    value = self._truncated(record, key, value)
+                elif key == "error_context" and isinstance(value, dict):
+                    context = {}
+                    for context_key, context_value in value.items():
+                        if context_key in self.FAILURE_KEYS and context_value is not None:
+                            context_value = self._truncated(context, context_key, context_value)
+                        context[context_key] = context_value
+                    value = context
+            record[key] = value
+        line = json.dumps(record, default=_jsonable, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._fp is None:
+                return
+            self._fp.write(line)
+            if record["event"] == events.RUN_FINISHED:
+                self._fp.flush()
+
+    def _truncated(self, record: dict, key: str, value, keep_short=True):
+        """Returns value, or its JSON cut short to max_body characters when that's longer (noting
+        the full length in record). Short values are kept as they are with keep_short, otherwise
+        they're written as their JSON too."""
+        serialized = value
+        if not isinstance(value, str):
+            serialized = json.dumps(value, default=_jsonable, separators=(",", ":"))
+        if len(serialized) > self.max_body:
+            record[f"{key}_truncated"] = len(serialized)
+            return serialized[: self.max_body]
+        return value if keep_short else serialized
+
+    def close(self):
+        super().close()
+        with self._lock:
+            if self._fp is not None:
+                self._fp.close()
+                self._fp = None
+
+
+def _jsonable(value: object) -> object:
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    if isinstance(value, BaseException):
+        return f"{type(value).__name__}: {value}"
+    return str(value)
+
+
 @dataclass
 class SinkInstallation:
     sinks: list[BaseSink] = field(default_factory=list)
     console_sink: ConsoleOutputSink | None = None
     timing_sink: TimingSink | None = None
+    outcome_sink: OutcomeSink | None = None
+    events_sink: JsonlEventSink | None = None
 
     def close(self):
         for sink in reversed(self.sinks):
@@ -467,9 +644,25 @@ def install_runtime_sinks(conf: dict) -> SinkInstallation:
     installation.console_sink = console_sink
     installation.sinks.append(console_sink)
 
-    if conf_get(conf, Settings.TIMING):
-        timing_sink = TimingSink(http_timing=bool(conf_get(conf, Settings.HTTP_TIMING))).install()
+    timing = bool(conf_get(conf, Settings.TIMING))
+    if timing or conf_get(conf, Settings.DURATIONS_FILE):
+        timing_sink = TimingSink(
+            http_timing=bool(conf_get(conf, Settings.HTTP_TIMING)), report=timing
+        ).install()
         installation.timing_sink = timing_sink
         installation.sinks.append(timing_sink)
 
+    if conf_get(conf, Settings.FAILURES_FILE):
+        outcome_sink = OutcomeSink().install()
+        installation.outcome_sink = outcome_sink
+        installation.sinks.append(outcome_sink)
+
+    events_file = conf_get(conf, Settings.EVENTS_FILE)
+    if events_file is not None:
+        events_sink = JsonlEventSink(
+            events_file, max_body=conf_get(conf, Settings.EVENTS_MAX_BODY)
+        ).install()
+        installation.events_sink = events_sink
+        installation.sinks.append(events_sink)
+
     return installation
@@ -1,7 +1,9 @@
 """skivvy
 
 Usage:
-    skivvy <target> [-t] [-i=regexp]... [-e=regexp]... [--set=kv]...
+    skivvy <target> [-t] [-i=regexp]... [-e=regexp]... [--set=kv]... [--shard=k/n]
+           [--last-failed | --failed-first] [--watch]
+    skivvy <target> --merge-durations [--set=kv]...
     skivvy --help
     skivvy --help-settings
     skivvy --help-matchers
@@ -17,6 +19,17 @@ Options:
     --set=kv            override a setting using key=value syntax (repeatable);
                         environment overrides use SKIVVY_<SETTING>
     -t                  keep temporary files (if any)
+    --shard=k/n         only run the k:th of n roughly equally long parts of the suite,
+                        balanced by the durations recorded in durations_file, which every
+                        shard must read the same copy of (so sharded runs record to a file
+                        of their own next to it, see --merge-durations)
+    --merge-durations   add the durations recorded by sharded runs to durations_file,
+                        e.g. after collecting the files of all shards next to it
+    --last-failed       only run the tests that failed last time (recorded in failures_file),
+                        together with the earlier tests of their directories they depend on
+    --failed-first      run the directories of the tests that failed last time first
+    --watch             keep running, rerunning the tests affected by every change to
+                        a testfile (or the whole suite when the config or a matcher changes)
 
 Examples:
     skivvy examples/dev_server/cfg.json
@@ -25,9 +38,13 @@ Examples:
     specify either a single config file, or a directory of tests
 """
 
+import asyncio
 import json
 import os
 import traceback
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from typing import NamedTuple
 
 from docopt import docopt
 
@@ -40,35 +57,145 @@ from skivvy.config import (
     parse_cli_overrides,
     read_config,
 )
-from . import custom_matchers, test_runner
+from . import custom_matchers, dependencies, test_runner
 from . import matchers
 from . import events
+from . import scheduler
+from . import sharding
+from . import watch
 from . import sinks
 from .errors import ExpectedTestFailure
-from .util import file_util, http_util, dict_util, str_util
+from .util import file_util, http_util, dict_util, str_util, manifest, durations, cassette, scope
+from .util import failures as failures_ledger
 from .util import log
-from .verify import verify
+from .verify import verify, verify_stream
 
 version = __version__
 STATUS_OK = "OK"
 STATUS_FAILED = "FAILED"
+STREAMED_RESPONSE = "<streamed response, not retained>"
 log.set_default_level("INFO")
 
 
 def configure_logging(testcase):
-    log_level = testcase.get("log_level", "INFO")
-    log.set_default_level(log_level)
+    # only for the rest of the test (see testfile_context), not the ones running alongside it
+    log.bind_level(testcase.get("log_level", "INFO"))
+
+
+@contextmanager
+def testfile_context(testfile):
+    """Binds the test being run (its file, the namespace of its variables and its log level) to
+    the worker thread or asyncio task running it rather than to the whole process, so that tests
+    running side by side don't see each other's."""
+    if file_util.current_file() == testfile:
+        yield  # already bound, e.g. around both running the test and reporting its result
+        return
+    file_token = file_util.bind_current_file(testfile)
+    namespace_token = scope.bind_namespace(file_util.namespace_of(testfile))
+    level_token = log.bind_level(None)
+    try:
+        yield
+    finally:
+        log.unbind_level(level_token)
+        scope.unbind_namespace(namespace_token)
+        file_util.unbind_current_file(file_token)
 
 
 def run_test(filename, env_conf, cli_overrides=None):
-    file_util.set_current_file(filename)
+    with testfile_context(filename):
+        steps = _test_steps(filename, env_conf, cli_overrides)
+        try:
+            request, testcase_config = next(steps)
+            try:
+                http_envelope = http_util.execute(
+                    request,
+                    timeout=request_timeout(testcase_config),
+                    stream=should_stream_response(testcase_config),
+                )
+            except Exception as e:
+                url_checks = steps.throw(e)
+            else:
+                url_checks = steps.send(http_envelope)
+            while True:
+                try:
+                    matchers.check_deferred_urls(*url_checks)
+                except Exception as e:
+                    url_checks = steps.throw(e)
+                else:
+                    url_checks = steps.send(None)
+        except StopIteration as result:
+            return result.value
+
+
+def request_timeout(testcase_config: dict) -> http_util.Timeout:
+    return http_util.split_timeout(
+        conf_get(testcase_config, Settings.TIMEOUT),
+        connect_timeout=conf_get(testcase_config, Settings.CONNECT_TIMEOUT),
+        read_timeout=conf_get(testcase_config, Settings.READ_TIMEOUT),
+    )
+
+
+def connection_settings(suite_conf: dict) -> http_util.ConnectionSettings:
+    pool_maxsize = conf_get(suite_conf, Settings.POOL_MAXSIZE)
+    if pool_maxsize is None:
+        # so that running with more workers isn't held up by connections having to be made
+        workers = conf_get(suite_conf, Settings.WORKERS) or 1
+        pool_maxsize = max(http_util.ConnectionSettings.pool_maxsize, int(workers))
+    return http_util.ConnectionSettings(
+        pool_connections=conf_get(suite_conf, Settings.POOL_CONNECTIONS),
+        pool_maxsize=pool_maxsize,
+        pool_block=bool(conf_get(suite_conf, Settings.POOL_BLOCK)),
+        keep_alive=bool(conf_get(suite_conf, Settings.KEEP_ALIVE)),
+        tcp_nodelay=bool(conf_get(suite_conf, Settings.TCP_NODELAY)),
+        connect_retries=conf_get(suite_conf, Settings.CONNECT_RETRIES),
+    )
+
+
+async def run_test_async(filename, env_conf, cli_overrides=None):
+    with testfile_context(filename):
+        steps = _test_steps(filename, env_conf, cli_overrides)
+        try:
+            request, testcase_config = next(steps)
+            try:
+                http_envelope = await http_util.execute_async(
+                    request,
+                    timeout=request_timeout(testcase_config),
+                    transport=conf_get(testcase_config, Settings.TRANSPORT),
+                )
+            except Exception as e:
+                url_checks = steps.throw(e)
+            else:
+                url_checks = steps.send(http_envelope)
+            while True:
+                try:
+                    # they'd keep every other test waiting if they were made on the event loop
+                    await asyncio.to_thread(matchers.check_deferred_urls, *url_checks)
+                except Exception as e:
+                    url_checks = steps.throw(e)
+                else:
+                    url_checks = steps.send(None)
+        except StopIteration as result:
+            return result.value
+
+
+def _test_steps(filename, env_conf, cli_overrides=None):
+    # Runs a test up until the request is to be executed, yields (request, testcase_config)
+    # and expects the resulting HttpEnvelope to be sent back. Whoever is driving it is free
+    # to execute the request however it likes (blocking, or awaiting it). The same goes for
+    # the $valid_url checks of a verification, after which it yields the arguments of
+    # matchers.check_deferred_urls and expects None to be sent back (or the failure thrown in).
+    # Returns (via StopIteration) the same (status, error_context) as run_test.
     error_context = {}
     current_step = None
+    http_envelope = None
+    # the $valid_url checks of the current verification, left to whoever is driving the test
+    url_checks = []
 
     try:
         current_step = events.CREATE_TESTCASE
         events.emit(current_step)
-        testcase = create_testcase(cli_overrides or {}, filename, env_conf)
+        testfile = manifest.parse_testfile(filename)
+        testcase = create_testcase(cli_overrides or {}, testfile, env_conf)
         current_step = None
 
         configure_logging(testcase)
@@ -89,14 +216,22 @@ def run_test(filename, env_conf, cli_overrides=None):
         if expected_response_headers is not None:
             expected["response_headers"] = expected_response_headers
         error_context["expected"] = expected
+        response_plan_key = None
+        if expected_response is not None and expected_response is testfile.get("response"):
+            # it's the one in the testfile, so its compiled plan stays valid while the file is unchanged
+            response_plan_key = ("response", manifest.content_hash(filename))
 
         current_step = events.EXECUTE_REQUEST
         events.emit(current_step)
-        http_envelope = http_util.execute(request, timeout=conf_get(testcase_config, Settings.TIMEOUT))
+        http_envelope = yield request, testcase_config
         current_step = None
 
         actual_status = http_envelope.status_code
-        actual_response = http_envelope.json()
+        if http_envelope.is_streamed():
+            # only verified as it's read, it's never held in memory all at once
+            actual_response = STREAMED_RESPONSE
+        else:
+            actual_response = http_envelope.json()
         actual_headers = normalize_headers(http_envelope.headers)
 
         headers_to_write = testcase_config.get("write_headers")
@@ -112,13 +247,35 @@ def run_test(filename, env_conf, cli_overrides=None):
         if "status" in testcase_config:
             current_step = events.VERIFY_STATUS
             events.emit(current_step)
-            verify(testcase_config["status"], actual_status, **testcase_config)
+            verify(
+                testcase_config["status"],
+                actual_status,
+                url_checks=url_checks,
+                **testcase_config,
+            )
+            yield from _url_checks(url_checks)
             current_step = None
 
         if "response" in testcase_config:
             current_step = events.VERIFY_RESPONSE
             events.emit(current_step)
-            verify(testcase_config["response"], actual_response, **testcase_config)
+            if http_envelope.is_streamed():
+                verify_stream(
+                    testcase_config["response"],
+                    http_envelope.iter_json_array(),
+                    plan_key=response_plan_key,
+                    url_checks=url_checks,
+                    **testcase_config,
+                )
+            else:
+                verify(
+                    testcase_config["response"],
+                    actual_response,
+                    plan_key=response_plan_key,
+                    url_checks=url_checks,
+                    **testcase_config,
+                )
+            yield from _url_checks(url_checks)
             current_step = None
 
         if expected_response_headers is not None:
@@ -127,8 +284,10 @@ def run_test(filename, env_conf, cli_overrides=None):
             verify(
                 normalize_headers(expected_response_headers),
                 actual_headers,
+                url_checks=url_checks,
                 **testcase_config,
             )
+            yield from _url_checks(url_checks)
             current_step = None
     except Exception as e:
         if current_step is not None:
@@ -141,10 +300,25 @@ def run_test(filename, env_conf, cli_overrides=None):
         else:
             error_context["traceback"] = traceback.format_exc()
         return STATUS_FAILED, error_context
+    finally:
+        if http_envelope is not None:
+            # a streamed body is left unread when the test fails before getting to it
+            http_envelope.close()
 
     return STATUS_OK, None
 
 
+def _url_checks(url_checks: list):
+    while url_checks:
+        yield url_checks.pop(0)
+
+
+def should_stream_response(testcase_config) -> bool:
+    return bool(conf_get(testcase_config, Settings.STREAM_RESPONSE)) and isinstance(
+        testcase_config.get("response"), list
+    )
+
+
 def dump_response_headers(headers_to_write, r):
     for filename in headers_to_write.keys():
         log.debug("writing header: %s" % filename)
@@ -218,9 +392,118 @@ def matchers_markdown() -> str:
 
 
 def run():
+    arguments = docopt(__doc__, version=f"skivvy {version}")
+    if arguments.get("--help-settings"):
+        print_settings_help()
+        return True
+    if arguments.get("--help-matchers"):
+        print_matchers_help()
+        return True
+    if arguments.get("--merge-durations"):
+        return merge_durations(arguments)
+    suite_run = run_suite(arguments)
+    if arguments.get("--watch"):
+        return watch.watch_suite(arguments, suite_run, run_suite)
+    return suite_run.result
+
+
+def find_undeclared_variables(tests: list[str], variables, suite_conf: dict) -> dict[str, dict]:
+    """Finds the variables that are used before they're stored before any request is made.
+    Like when they're used, an undeclared $fetch is an error and an undeclared brace expanded
+    variable is an error with brace_expansion_strict, otherwise a warning. The errors of all
+    tests are reported together, returns the error context of each test that fails because of
+    them, those fail without making their request."""
+
+    def declared(namespace: str) -> set[str]:
+        # e.g. stored by tests that aren't rerun in watch mode
+        return set(scope.dump(namespace) or ())
+
+    strict = conf_get(suite_conf, Settings.BRACE_EXPANSION_STRICT)
+    warn = conf_get(suite_conf, Settings.BRACE_EXPANSION_WARNINGS)
+    failing = {}
+    report = []
+    undeclared = dependencies.undeclared_variables(tests, variables, declared)
+    for testfile, names in undeclared.items():
+        errors = [f"$fetch {name}" for name in sorted(names.fetched)]
+        for name in sorted(names.expanded):
+            if strict:
+                errors.append(f"<{name}>")
+            elif warn:
+                log.warning(f"{testfile}: <{name}> is used before any earlier test stores it")
+        if errors:
+            failing[testfile] = {
+                "failed_step": events.CREATE_TESTCASE,
+                "exception": "Variables are used before any earlier test in the directory "
+                f"stores them: {', '.join(errors)}",
+                "expected_failure": True,
+            }
+            report.append(f"  {testfile}: {', '.join(errors)}")
+    if report:
+        log.error(
+            f"{len(report)} tests use variables before any earlier test in their directory "
+            "stores them, they fail without making their request:\n" + "\n".join(report)
+        )
+    return failing
+
+
+def select_last_failed(
+    tests: list[str],
+    tests_root: str,
+    failures_file: str | None,
+    variables,
+    failed_first: bool = False,
+) -> list[str]:
+    """Returns the tests that failed last time and the tests they depend on, or with
+    failed_first all tests with the directories of the ones that failed first."""
+    if not failures_file:
+        raise ValueError("--last-failed and --failed-first need failures_file to be set")
+    last_failed = failures_ledger.load(failures_file, tests_root)
+    if failed_first:
+        namespaces = {file_util.namespace_of(t) for t in tests if t in last_failed}
+        first = [t for t in tests if file_util.namespace_of(t) in namespaces]
+        return first + [t for t in tests if file_util.namespace_of(t) not in namespaces]
+    selected = dependencies.prerequisites(tests, last_failed, variables)
+    if not selected:
+        log.info("No failed tests recorded, running all tests.")
+        return tests
+    return selected
+
+
+def read_suite_conf(arguments: dict) -> tuple[dict, dict]:
+    """Returns (the settings of the suite, the ones overridden on the command line)."""
+    target = arguments.get("<target>")
+    if target and os.path.isdir(target):
+        cfg_conf = {"tests": os.path.abspath(target)}
+    else:
+        cfg_conf = read_config(target)
+    env_overrides = parse_env_overrides()
+    cli_overrides = parse_cli_overrides(arguments.get("--set"))
+
+    base_conf = create_testcase(env_overrides, cfg_conf)
+    return create_testcase(cli_overrides, base_conf), cli_overrides
+
+
+def merge_durations(arguments: dict) -> bool:
+    durations_file = conf_get(read_suite_conf(arguments)[0], Settings.DURATIONS_FILE)
+    if not durations_file:
+        raise ValueError("--merge-durations needs durations_file to be set")
+    merged = durations.merge(durations_file)
+    log.info(f"Merged the durations of {merged} sharded runs into {durations_file}.")
+    return True
+
+
+class SuiteRun(NamedTuple):
+    result: bool | None
+    suite_conf: dict
+    # every test of the suite (after filtering), whether or not it was run
+    tests: list[str]
+
+
+def run_suite(arguments: dict, only: set[str] | None = None, load_matchers=True) -> SuiteRun:
+    """Runs the suite given by the command line arguments, or only the tests of it in only.
+    load_matchers=False leaves the custom matchers loaded by an earlier run of the suite."""
     run_id = events.new_run_id()
     events.reset_runtime_listener()
-    arguments = None
     target = None
     failures = 0
     num_tests = 0
@@ -228,51 +511,32 @@ def run():
     sink_installation = None
 
     try:
-        arguments = docopt(__doc__, version=f"skivvy {version}")
-        if arguments.get("--help-settings"):
-            print_settings_help()
-            return True
-        if arguments.get("--help-matchers"):
-            print_matchers_help()
-            return True
         target = arguments.get("<target>")
-        if target and os.path.isdir(target):
-            cfg_conf = {"tests": os.path.abspath(target)}
-        else:
-            cfg_conf = read_config(target)
-        env_overrides = parse_env_overrides()
-        cli_overrides = parse_cli_overrides(arguments.get("--set"))
-
-        base_conf = create_testcase(env_overrides, cfg_conf)
-        suite_conf = create_testcase(cli_overrides, base_conf)
+        suite_conf, cli_overrides = read_suite_conf(arguments)
 
         # TODO: Temporary experimental flags (_timing/_http_timing) are read here
         # until we finalize the real logging/timing/diffs config design.
         sink_installation = sinks.install_runtime_sinks(suite_conf)
 
-        tests = file_util.list_files(
+        suite_manifest = manifest.open_manifest(conf_get(suite_conf, Settings.MANIFEST_CACHE))
+        tests = suite_manifest.list_files(
             suite_conf["tests"],
             conf_get(suite_conf, Settings.EXT),
             file_order=conf_get(suite_conf, Settings.FILE_ORDER),
         )
-        custom_matchers.load(suite_conf)
-        matchers.add_negating_matchers()
+        if load_matchers:
+            custom_matchers.load(suite_conf)
+            matchers.add_negating_matchers()
+        matchers.reset_url_checker(matchers.UrlChecker(timeout=conf_get(suite_conf, Settings.TIMEOUT)))
         fail_fast = conf_get(suite_conf, Settings.FAIL_FAST)
 
-        # TODO: The handling of -i/-e is a bit gnarly and not DRY, at least move the relevant parts out into one of the utils
-        # include files - by inclusive filtering files that match the -i regexps
-        # (default is ['.*'] so all files would be included in the filter)
-        incl_patterns = arguments.get("-i") or []
-        if isinstance(incl_patterns, str):
-            incl_patterns = [incl_patterns]
-        if len(incl_patterns) == 0:
-            incl_patterns = [".*"]
-        incl_patterns = str_util.compile_regexps(incl_patterns)
-        tests = [
-            testfile for testfile in tests if str_util.matches_any(testfile, incl_patterns)
-        ]
+        variables = partial(
+            dependencies.variables_of_file,
+            brace_expansion=bool(conf_get(suite_conf, Settings.BRACE_EXPANSION)),
+        )
 
-        # exclude files - by removing any files that match the -i regexps (default is [] so no files would be excluded)
+        # TODO: The handling of -i/-e is a bit gnarly and not DRY, at least move the relevant parts out into one of the utils
+        # exclude files - by removing any files that match the -e regexps (default is [] so no files would be excluded)
         excl_patterns = arguments.get("-e") or []
         if isinstance(excl_patterns, str):
             excl_patterns = [excl_patterns]
@@ -282,6 +546,47 @@ def run():
             for testfile in tests
             if not str_util.matches_any(testfile, excl_patterns)
         ]
+
+        # include files - by inclusive filtering files that match the -i regexps, together with
+        # the (not excluded) tests they depend on
+        incl_patterns = arguments.get("-i") or []
+        if isinstance(incl_patterns, str):
+            incl_patterns = [incl_patterns]
+        if incl_patterns:
+            incl_patterns = str_util.compile_regexps(incl_patterns)
+            included = {
+                testfile for testfile in tests if str_util.matches_any(testfile, incl_patterns)
+            }
+            tests = dependencies.prerequisites(tests, included, variables)
+            if len(tests) > len(included):
+                log.info(f"Including {len(tests) - len(included)} tests they depend on.")
+        tests_root = suite_conf["tests"]
+        durations_file = conf_get(suite_conf, Settings.DURATIONS_FILE)
+        record_durations_to = durations_file
+        if durations_file and not arguments.get("--shard"):
+            durations.merge(durations_file)
+        usual_durations = (
+            durations.load(durations_file, tests_root, tests) if durations_file else {}
+        )
+        if arguments.get("--shard"):
+            shard, num_shards = sharding.parse_shard(arguments["--shard"])
+            tests = sharding.shard_tests(tests, shard, num_shards, usual_durations)
+            if durations_file:
+                # every shard has to be split using the same durations, so they're recorded apart
+                record_durations_to = durations.shard_path(durations_file, shard, num_shards)
+        # what decides which directories are started first
+        schedule_durations = usual_durations
+        failures_file = conf_get(suite_conf, Settings.FAILURES_FILE)
+        failed_first = arguments.get("--failed-first")
+        if arguments.get("--last-failed") or failed_first:
+            tests = select_last_failed(tests, tests_root, failures_file, variables, failed_first)
+            if failed_first:
+                # the directories are already in the order they should be started in
+                schedule_durations = {}
+        suite_tests = tests
+        if only is not None:
+            tests = [testfile for testfile in tests if testfile in only]
+
         events.emit(
             events.RUN_STARTED,
             run_id=run_id,
@@ -289,43 +594,90 @@ def run():
             config_file=target,
             test_count=len(tests),
         )
+        undeclared = find_undeclared_variables(tests, variables, suite_conf)
+
+        # the output of tests running side by side is held back until each of them is done,
+        # so that it isn't interleaved
+        parallel = int(conf_get(suite_conf, Settings.WORKERS) or 1) > 1
+
+        def run_one(index, testfile):
+            with testfile_context(testfile), log.grouped() if parallel else nullcontext():
+                emit_test_started(index, testfile)
+                if testfile in undeclared:
+                    return emit_test_result(STATUS_FAILED, undeclared[testfile])
+                test_result, err_context = run_test(
+                    testfile,
+                    suite_conf,
+                    cli_overrides=cli_overrides,
+                )
+                return emit_test_result(test_result, err_context)
+
+        async def run_one_async(index, testfile):
+            with testfile_context(testfile), log.grouped() if parallel else nullcontext():
+                emit_test_started(index, testfile)
+                if testfile in undeclared:
+                    return emit_test_result(STATUS_FAILED, undeclared[testfile])
+                test_result, err_context = await run_test_async(
+                    testfile,
+                    suite_conf,
+                    cli_overrides=cli_overrides,
+                )
+                return emit_test_result(test_result, err_context)
+
+        cassette_path = conf_get(suite_conf, Settings.CASSETTE)
+        http_util.use_cassette(
+            cassette.Cassette(cassette_path, conf_get(suite_conf, Settings.CASSETTE_MODE))
+            if cassette_path
+            else None
+        )
 
-        for index, testfile in enumerate(tests, start=1):
-            num_tests += 1
-            events.emit(
-                events.TEST_STARTED,
-                index=index,
-                testfile=testfile,
-                test_id=testfile,
+        http_util.configure_connections(connection_settings(suite_conf))
+
+        workers = conf_get(suite_conf, Settings.WORKERS)
+        schedule = scheduler.validate_schedule(conf_get(suite_conf, Settings.SCHEDULE))
+        graph = None
+        if schedule == scheduler.SCHEDULE_DEPENDENCIES:
+            graph = dependencies.dependency_graph(tests, variables)
+        transport = http_util.validate_transport(conf_get(suite_conf, Settings.TRANSPORT))
+        if transport in http_util.ASYNC_TRANSPORTS:
+            num_tests, failures = asyncio.run(
+                run_tests_async(
+                    tests,
+                    run_one_async,
+                    workers=workers,
+                    fail_fast=fail_fast,
+                    durations=schedule_durations,
+                    graph=graph,
+                    transport=transport,
+                )
             )
-            test_result, err_context = run_test(
-                testfile,
-                suite_conf,
-                cli_overrides=cli_overrides,
+        else:
+            num_tests, failures = scheduler.run_tests(
+                tests,
+                run_one,
+                workers=workers,
+                fail_fast=fail_fast,
+                durations=schedule_durations,
+                graph=graph,
             )
-            if test_result == STATUS_OK:
-                events.emit(events.TEST_PASSED)
-            else:
-                events.emit(
-                    events.TEST_FAILED,
-                    error_context=err_context,
-                    exception=(err_context or {}).get("exception"),
-                    expected=(err_context or {}).get("expected"),
-                    actual=(err_context or {}).get("actual"),
-                )
-                failures += 1
-                if fail_fast and failures > 0:
-                    events.emit(
-                        events.TEST_FINISHED,
-                        success=False,
-                    )
-                    break
-            events.emit(
-                events.TEST_FINISHED,
-                success=(test_result == STATUS_OK),
+
+        suite_manifest.save()
+        timing_sink = sink_installation.timing_sink
+        if durations_file and timing_sink is not None:
+            report_duration_regressions(
+                usual_durations,
+                timing_sink.test_totals_ms,
+                conf_get(suite_conf, Settings.DURATION_REGRESSION_RATIO),
+            )
+            durations.record(record_durations_to, tests_root, timing_sink.test_totals_ms)
+        outcome_sink = sink_installation.outcome_sink
+        if failures_file and outcome_sink is not None:
+            failures_ledger.record(
+                failures_file, tests_root, outcome_sink.passed, outcome_sink.failed
             )
 
-        if not arguments.get("-t"):
+        # in watch mode they're kept for the tests that are rerun, until it stops
+        if not arguments.get("-t") and not arguments.get("--watch"):
             log.debug("Removing temporary files...")
             file_util.cleanup_tmp_files()
 
@@ -337,7 +689,7 @@ def run():
             failures=failures,
             success=result,
         )
-        return result
+        return SuiteRun(result, suite_conf, suite_tests)
     finally:
         try:
             # TODO: Expand run.finished semantics for unexpected top-level exceptions if needed.
@@ -350,10 +702,65 @@ def run():
                 success=result,
             )
         finally:
+            http_util.use_cassette(None)
             if sink_installation is not None:
                 sink_installation.close()
 
 
+def report_duration_regressions(usual: dict, current: dict, ratio):
+    if not ratio:
+        return
+    for testfile, ms, usual_ms in durations.regressions(usual, current, float(ratio)):
+        log.warning(f"{testfile} took {ms:.0f}ms, it usually takes {usual_ms:.0f}ms")
+
+
+def emit_test_started(index, testfile):
+    events.emit(
+        events.TEST_STARTED,
+        index=index,
+        testfile=testfile,
+        test_id=testfile,
+    )
+
+
+def emit_test_result(test_result, err_context) -> bool:
+    if test_result == STATUS_OK:
+        events.emit(events.TEST_PASSED)
+    else:
+        events.emit(
+            events.TEST_FAILED,
+            error_context=err_context,
+            exception=(err_context or {}).get("exception"),
+            expected=(err_context or {}).get("expected"),
+            actual=(err_context or {}).get("actual"),
+        )
+    events.emit(
+        events.TEST_FINISHED,
+        success=(test_result == STATUS_OK),
+    )
+    return test_result == STATUS_OK
+
+
+async def run_tests_async(
+    tests,
+    run_one_async,
+    workers=1,
+    fail_fast=False,
+    durations=None,
+    graph=None,
+    transport=http_util.TRANSPORT_HTTPX,
+):
+    async with http_util.async_session(transport=transport):
+        return await scheduler.run_tests_async(
+            tests,
+            run_one_async,
+            workers=workers,
+            fail_fast=fail_fast,
+            durations=durations,
+            graph=graph,
+        )
+
+
 def summarize_result(failures, num_tests):
     return failures == 0 and num_tests > 0
 
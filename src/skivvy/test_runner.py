@@ -1,4 +1,3 @@
-import json
 from functools import partial
 from typing import Dict, Mapping, Callable, Any
 from urllib.parse import urljoin
@@ -8,6 +7,18 @@ from skivvy.config import Settings, conf_get
 from skivvy.util import dict_util, log, str_util, file_util
 from skivvy.util.dict_util import get_all, subset
 
+# brace expansion is applied to these fields, the ones not present will just be ignored
+BRACE_EXPANDED_FIELDS = tuple(
+    option.key
+    for option in (
+        Settings.URL,
+        Settings.BODY,
+        Settings.READ_HEADERS,
+        Settings.WRITE_HEADERS,
+        Settings.HEADERS,
+    )
+)
+
 
 def create_request(testcase: Mapping[str, object]) -> tuple[dict, dict]:
     """
@@ -22,18 +33,8 @@ def create_request(testcase: Mapping[str, object]) -> tuple[dict, dict]:
     testcase[Settings.METHOD.key] = method
     log.debug(f"Creating request {method}: {url}")
 
-    # apply for these fields, the ones not present will just be ignored
-    options = (
-        Settings.URL,
-        Settings.BODY,
-        Settings.READ_HEADERS,
-        Settings.WRITE_HEADERS,
-        Settings.HEADERS,
-    )
-    fields_to_expand = [opt.key for opt in options]
-
     # in either case, we get back a dict that represents all configuration related to the request
-    request_config = brace_expand_fields(testcase, *fields_to_expand)
+    request_config = brace_expand_fields(testcase, *BRACE_EXPANDED_FIELDS)
     # validate and warn if the request looks odd
     is_valid = validate_request_body(request_config)
     if not is_valid:
@@ -103,19 +104,29 @@ def brace_expand_fields(
     """
     Takes a list of keys and applies brace expansion for each key it finds, others are silently ignored.
     Returns a new dict, all the other entries as well.
-    If is_enabled is False, then it will simply just return a new dict without any expansion applied.
+    Nothing is copied up front, only the parts of the expanded fields that actually change are, the rest
+    (e.g. the expected response) is shared with request_dict, which is left untouched.
+    If brace expansion is not enabled, then it will simply just return a new dict without any expansion applied.
     """
-    expand_func = get_brace_expansion_func(request_dict)
-    result = json.loads(json.dumps(dict(request_dict)))
+    result = dict(request_dict)
+    if not conf_get(request_dict, Settings.BRACE_EXPANSION):
+        return result
 
+    expand_func = partial(expand_if_braced, get_brace_expansion_func(request_dict))
     for k in keys:
         field = result.get(k)
         if field:
-            field = dict_util.map_nested_dicts_py(field, expand_func)
-            result[k] = field
+            result[k] = dict_util.map_nested_dicts_cow(field, expand_func)
     return result
 
 
+def expand_if_braced(expand_func: Callable, value):
+    # a string without a '<' can't contain anything to expand, so don't bother
+    if isinstance(value, str) and "<" in value:
+        return expand_func(value)
+    return value
+
+
 def get_brace_expansion_func(config: Mapping[str, object]) -> Callable:
     if conf_get(config, Settings.AUTO_COERCE):
         auto_coerce_func = auto_coercer
@@ -0,0 +1,123 @@
+"""Records responses to disk and replays them, so tests can be rerun without a server.
+
+A cassette is a directory with a JSON file per recorded response, named after a hash of
+the request: its method, url, query and a hash of its body (headers aren't part of it, so
+e.g. a fresh auth token doesn't stop a recorded response from being found). The same
+request made several times in a run (e.g. fetching something before and after changing it)
+is recorded once per time it was made and replayed in the same order, the last recording
+being repeated if it's made more times than it was recorded.
+
+Requests whose body differs from run to run (e.g. has a generated id in it) will not be
+found when replaying.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import threading
+from typing import Any
+
+from skivvy.errors import ExpectedTestFailure
+
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+_supported_modes = (MODE_RECORD, MODE_REPLAY)
+
+
+class CassetteMiss(ExpectedTestFailure):
+    """Raised when replaying a request that was never recorded."""
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str = MODE_REPLAY):
+        if mode not in _supported_modes:
+            raise ValueError(
+                f'Unknown cassette mode "{mode}". Supported values: {", ".join(_supported_modes)}'
+            )
+        self.path = path
+        self.mode = mode
+        self._seen: dict[str, int] = {}
+        self._lock = threading.Lock()
+        if mode == MODE_RECORD:
+            os.makedirs(path, exist_ok=True)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == MODE_REPLAY
+
+    def _next_occurrence(self, key: str) -> int:
+        with self._lock:
+            occurrence = self._seen.get(key, 0)
+            self._seen[key] = occurrence + 1
+        return occurrence
+
+    def _filename(self, key: str, occurrence: int) -> str:
+        return os.path.join(self.path, f"{key}-{occurrence}.json")
+
+    def record(self, method: str, payload: dict, response: dict):
+        """Saves the response (see the fields of HttpEnvelope) to a request."""
+        key = request_key(method, payload)
+        entry = {
+            "request": {"method": method.upper(), "url": payload.get("url")},
+            "response": _encode_body(response),
+        }
+        filename = self._filename(key, self._next_occurrence(key))
+        tmp_filename = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_filename, "w", encoding="utf8") as fp:
+            json.dump(entry, fp, indent=2)
+        os.replace(tmp_filename, filename)
+
+    def replay(self, method: str, payload: dict) -> dict:
+        """Returns the recorded response to a request, raises CassetteMiss if there is none."""
+        key = request_key(method, payload)
+        occurrence = self._next_occurrence(key)
+        while occurrence >= 0:
+            try:
+                with open(self._filename(key, occurrence), "r", encoding="utf8") as fp:
+                    return _decode_body(json.load(fp)["response"])
+            except FileNotFoundError:
+                occurrence -= 1
+        raise CassetteMiss(
+            f"No recorded response to {method.upper()} {payload.get('url')} in cassette {self.path}"
+        )
+
+
+def request_key(method: str, payload: dict) -> str:
+    """A hash of what identifies a request: its method, url, query and body."""
+    files = payload.get("files") or {}
+    body = {
+        "json": payload.get("json"),
+        "data": payload.get("data"),
+        # prepared uploads are (filename, contents)
+        "files": {
+            field: [name, hashlib.sha1(contents).hexdigest()]
+            for field, (name, contents) in sorted(files.items())
+        },
+    }
+    body_hash = hashlib.sha1(_canonical(body).encode()).hexdigest()
+    identity = [method.upper(), payload.get("url"), payload.get("params"), body_hash]
+    return hashlib.sha1(_canonical(identity).encode()).hexdigest()
+
+
+def _canonical(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def _encode_body(response: dict) -> dict:
+    encoded = dict(response)
+    content: bytes = encoded.pop("content")
+    try:
+        encoded["body"] = content.decode("utf-8")
+    except UnicodeDecodeError:
+        encoded["body_base64"] = base64.b64encode(content).decode("ascii")
+    return encoded
+
+
+def _decode_body(encoded: dict) -> dict:
+    response = dict(encoded)
+    if "body_base64" in response:
+        response["content"] = base64.b64decode(response.pop("body_base64"))
+    else:
+        response["content"] = response.pop("body", "").encode("utf-8")
+    return response
@@ -28,6 +28,22 @@ def map_nested_dicts_py(d, func):
         return func(d)
 
 
+def map_nested_dicts_cow(d, func):
+    """Like map_nested_dicts_py, but copy-on-write: only the dicts on the path to a value that func
+    changed are copied, everything else (d itself, if nothing changed) is shared with the input.
+    """
+    if not isinstance(d, collections.abc.Mapping):
+        return func(d)
+    copied = None
+    for k, v in d.items():
+        mapped = map_nested_dicts_cow(v, func)
+        if mapped is not v:
+            if copied is None:
+                copied = dict(d)
+            copied[k] = mapped
+    return d if copied is None else copied
+
+
 def wrap_in_tuple(fn):
     @wraps(fn)
     def _inner(d, *keys):
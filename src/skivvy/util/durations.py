@@ -0,0 +1,141 @@
+"""A history of how long each test took, used to balance shards, to start long running
+directories first and to notice tests that have become slower.
+
+The history is a JSONL file with a line like {"test": "users/1_create.json", "ms": 153} for
+every test that was run, appended to after each run. Tests are keyed by their normalized path
+relative to the tests directory, so a history recorded on one machine can be used on another and
+a test is the same however its path is spelled. How long a test usually takes is the median of
+its last HISTORY_SIZE runs, older ones are dropped once in a while.
+
+Sharded runs all have to be split using the same durations, so they don't record to the history
+they read: each one records to a file of its own next to it (see shard_path), which are merged
+into the history afterwards (see merge).
+"""
+
+import glob
+import json
+import os
+from collections import defaultdict, deque
+from statistics import median
+
+from skivvy.util import log
+
+# how many runs of a test are kept and its usual duration is based on
+HISTORY_SIZE = 10
+# a test that got slower by fewer milliseconds than this isn't reported, whatever the ratio
+REGRESSION_MIN_MS = 50
+
+
+def _read(path: str) -> tuple[dict[str, deque], int]:
+    """Returns the last HISTORY_SIZE durations of every test, and how many lines there were."""
+    history: dict[str, deque] = defaultdict(lambda: deque(maxlen=HISTORY_SIZE))
+    num_lines = 0
+    try:
+        with open(path, "r", encoding="utf8") as fp:
+            for line in fp:
+                num_lines += 1
+                try:
+                    entry = json.loads(line)
+                    name, ms = entry["test"], entry["ms"]
+                except (ValueError, TypeError, KeyError):
+                    continue  # e.g. a line cut short by a run that was killed while appending
+                if isinstance(name, str) and isinstance(ms, (int, float)):
+                    history[os.path.normpath(name)].append(ms)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        log.warning(f"Ignoring unreadable durations file {path}: {e}")
+    return history, num_lines
+
+
+def _name(testfile: str, tests_root: str) -> str:
+    """What a test is keyed by in the history."""
+    return os.path.normpath(os.path.relpath(testfile, tests_root))
+
+
+def load(path: str, tests_root: str, tests: list[str] | None = None) -> dict[str, float]:
+    """Returns how long each test usually takes, keyed by its path as listed from tests_root. Given
+    the tests that have been listed, keyed by their paths exactly as they were listed instead (e.g.
+    "./tests/x.json" or "tests/x.json", which are the same test)."""
+    history, _ = _read(path)
+    usual = {name: median(runs) for name, runs in history.items()}
+    if tests is None:
+        return {os.path.join(tests_root, name): ms for name, ms in usual.items()}
+    names = {testfile: _name(testfile, tests_root) for testfile in tests}
+    return {testfile: usual[name] for testfile, name in names.items() if name in usual}
+
+
+def record(path: str, tests_root: str, durations_ms: dict[str, float]):
+    """Adds the durations of the tests of a run to the history."""
+    _append(
+        path,
+        [
+            {"test": _name(testfile, tests_root), "ms": round(ms, 3)}
+            for testfile, ms in durations_ms.items()
+        ],
+    )
+
+
+def shard_path(path: str, shard: int, num_shards: int) -> str:
+    """Where the k:th of n shards records its durations, until they're merged into path."""
+    return f"{path}.shard-{shard}-of-{num_shards}"
+
+
+def merge(path: str) -> int:
+    """Adds the durations recorded by sharded runs to the history at path and removes the files
+    they were recorded to. Returns how many were merged."""
+    merged = 0
+    for shard_file in sorted(glob.glob(glob.escape(path) + ".shard-*-of-*")):
+        history, _ = _read(shard_file)
+        entries = [{"test": name, "ms": ms} for name, runs in history.items() for ms in runs]
+        if not _append(path, entries):
+            continue  # kept to be merged next time
+        try:
+            os.remove(shard_file)
+        except OSError as e:
+            log.warning(f"Could not remove merged durations file {shard_file}: {e}")
+        merged += 1
+    return merged
+
+
+def _append(path: str, entries: list[dict]) -> bool:
+    """Adds entries to the history at path, returns whether they could be written."""
+    if not entries:
+        return True
+    history, num_lines = _read(path)
+    try:
+        num_kept = sum(len(runs) for runs in history.values())
+        if num_lines <= 2 * max(num_kept, len(entries)):
+            with open(path, "a", encoding="utf8") as fp:
+                fp.writelines(json.dumps(entry) + "\n" for entry in entries)
+            return True
+
+        # rewrite it with only the runs that are still kept
+        for entry in entries:
+            history[entry["test"]].append(entry["ms"])
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf8") as fp:
+            for name, runs in history.items():
+                fp.writelines(
+                    json.dumps({"test": name, "ms": ms}) + "\n" for ms in runs
+                )
+        os.replace(tmp_path, path)
+        return True
+    except OSError as e:
+        log.warning(f"Could not write durations file {path}: {e}")
+        return False
+
+
+def regressions(
+    usual: dict[str, float], current: dict[str, float], ratio: float
+) -> list[tuple[str, float, float]]:
+    """Returns (test, duration, usual duration) of the tests that took more than ratio times longer
+    than they usually do, the worst first."""
+    slower = [
+        (testfile, ms, usual[testfile])
+        for testfile, ms in current.items()
+        if testfile in usual
+        and ms > usual[testfile] * ratio
+        and ms - usual[testfile] >= REGRESSION_MIN_MS
+    ]
+    return sorted(slower, key=lambda r: r[1] / max(r[2], 1), reverse=True)
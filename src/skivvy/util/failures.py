@@ -0,0 +1,46 @@
+"""A ledger of the tests that failed, so that they can be rerun on their own (--last-failed)
+or before the rest of the suite (--failed-first).
+
+The ledger is a JSON file like {"failed": ["users/2_update.json"]}, updated after each run:
+tests that failed are added to it and tests that passed are removed from it, tests that weren't
+run (e.g. filtered out, or not reached because of fail_fast) are left as they were. Tests are
+keyed by their path relative to the tests directory, like in the durations file.
+"""
+
+import json
+import os
+
+from skivvy.util import log
+
+
+def _read(path: str) -> list[str]:
+    try:
+        with open(path, "r", encoding="utf8") as fp:
+            failed = json.load(fp)["failed"]
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError, TypeError, KeyError) as e:
+        log.warning(f"Ignoring unreadable failures file {path}: {e}")
+        return []
+    return [name for name in failed if isinstance(name, str)]
+
+
+def load(path: str, tests_root: str) -> set[str]:
+    """Returns the tests that failed the last time they were run, as listed from tests_root."""
+    return {os.path.join(tests_root, name) for name in _read(path)}
+
+
+def record(path: str, tests_root: str, passed: list[str], failed: list[str]):
+    """Updates the ledger with the outcome of the tests of a run."""
+    if not passed and not failed:
+        return
+    passed_names = {os.path.relpath(testfile, tests_root) for testfile in passed}
+    failed_names = {os.path.relpath(testfile, tests_root) for testfile in failed}
+    ledger = (set(_read(path)) - passed_names) | failed_names
+    try:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf8") as fp:
+            json.dump({"failed": sorted(ledger)}, fp, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        log.warning(f"Could not write failures file {path}: {e}")
@@ -2,10 +2,14 @@ import json
 import os
 import pathlib
 import re
+from contextvars import ContextVar, Token
 
 from skivvy.util import log
 
 _tmp_files = set()
+# the testfile being run, kept per worker thread (or asyncio task) so tests running side by side
+# each have their own
+_current_file: ContextVar[str | None] = ContextVar("skivvy_current_file", default=None)
 _natural_sort_re = re.compile(r"(\d+)")
 
 
@@ -30,10 +34,17 @@ def _sort_key(file_order: str):
     )
 
 
-def list_files(path, include_ext, file_order="lexical"):
+def filename_sort_key(file_order: str):
+    """The key the files (and subdirectories) of a directory are sorted by when listed."""
+    return _sort_key(file_order) or (lambda name: name)
+
+
+def list_files(path, include_ext, file_order="lexical", visited_dirs=None):
     key = _sort_key(file_order)
     result = []
     for root, subdirs, files in os.walk(path):
+        if visited_dirs is not None:
+            visited_dirs.append(root)
         subdirs.sort(key=key)
         for filename in sorted(files, key=key):
             if filename.endswith(include_ext):
@@ -48,7 +59,7 @@ def parse_json(filename):
 
 
 def write_tmp(filename, content):
-    filename = os.path.join(os.getcwd(), filename)
+    filename = os.path.normpath(os.path.join(os.getcwd(), filename))
     if filename in _tmp_files:
         raise ValueError(f"Temporary file already exists: {filename}")
     with open(filename, "w") as fp:
@@ -57,6 +68,19 @@ def write_tmp(filename, content):
     return filename
 
 
+def remove_tmp_files(filenames) -> None:
+    """Removes the temporary files with these names that have been written, so they can be
+    written again."""
+    for filename in filenames:
+        filename = os.path.normpath(os.path.join(os.getcwd(), filename))
+        if filename in _tmp_files:
+            _tmp_files.discard(filename)
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+
+
 def cleanup_tmp_files(warn: bool = False, throw: bool = True) -> None:
     missing = []
     while len(_tmp_files) > 0:
@@ -82,7 +106,24 @@ def strip_filename(filename: str) -> str:
     return os.path.basename(filename)
 
 
+def namespace_of(filename) -> str:
+    """Returns the variable namespace a testfile belongs to (the name of its directory)."""
+    return pathlib.Path(filename).parent.parts[-1]
+
+
+def current_file() -> str | None:
+    return _current_file.get()
+
+
+def bind_current_file(filename) -> Token:
+    return _current_file.set(filename)
+
+
+def unbind_current_file(token: Token):
+    _current_file.reset(token)
+
+
 # TODO: Move to something like an environment kind of file
 def set_current_file(filename):
     os.environ["SKIVVY_CURRENT_FILE"] = filename
-    os.environ["SKIVVY_CURRENT_DIR"] = pathlib.Path(filename).parent.parts[-1]
+    os.environ["SKIVVY_CURRENT_DIR"] = namespace_of(filename)
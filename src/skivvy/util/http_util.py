@@ -1,10 +1,18 @@
+import asyncio
+import socket
+from contextlib import asynccontextmanager
 from typing import Dict, Callable
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from skivvy.util import dict_util, file_util
 from skivvy import events
-from dataclasses import dataclass
-from typing import Mapping, Any, Optional
+from dataclasses import dataclass, field
+from typing import Mapping, Any, Optional, Iterator
+import codecs
 import json
+from skivvy.util import json_stream
+from skivvy.util.cassette import Cassette
 from skivvy.util.str_util import tojsonstr
 
 _supported_methods = {
@@ -18,22 +26,107 @@ _supported_methods = {
     "connect",
 }
 _session = None
+_async_client = None
+# when set, responses are recorded to it, or replayed from it instead of making any requests
+_cassette: Cassette | None = None
 _NO_BODY_STATUS = {204, 205, 304}
+STREAM_CHUNK_SIZE = 64 * 1024
+
+TRANSPORT_REQUESTS = "requests"
+TRANSPORT_HTTPX = "httpx"
+# httpx offering HTTP/2 as well, when the server picks it (during the TLS handshake) concurrent
+# requests to an origin share a single connection
+TRANSPORT_HTTP2 = "http2"
+# httpx speaking HTTP/2 without TLS, to servers known to support it (by "prior knowledge")
+TRANSPORT_H2C = "h2c"
+_supported_transports = (TRANSPORT_REQUESTS, TRANSPORT_HTTPX, TRANSPORT_HTTP2, TRANSPORT_H2C)
+# the transports whose requests are run as coroutines
+ASYNC_TRANSPORTS = (TRANSPORT_HTTPX, TRANSPORT_HTTP2, TRANSPORT_H2C)
+
+# either one timeout for both connecting and reading, or a (connect, read) tuple like requests takes
+Timeout = int | float | tuple[int | float | None, int | float | None] | None
+
+
+@dataclass(frozen=True)
+class ConnectionSettings:
+    """How connections are pooled and set up, see the settings of the same names."""
+
+    # number of hosts connections are kept open to
+    pool_connections: int = 10
+    # number of connections kept open to each host
+    pool_maxsize: int = 10
+    # wait for a connection to be returned to the pool rather than opening one that isn't kept
+    pool_block: bool = False
+    keep_alive: bool = True
+    tcp_nodelay: bool = True
+    # retries of requests that failed to connect (never of ones that reached the server)
+    connect_retries: int = 0
+
+    def socket_options(self) -> list[tuple[int, int, int]]:
+        return [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)] if self.tcp_nodelay else []
+
+
+_connection_settings = ConnectionSettings()
+
+
+_UNPARSED = object()
+_UTF_CODECS = {"utf-8", "utf-16", "utf-16-le", "utf-16-be", "utf-32", "utf-32-le", "utf-32-be"}
+
+
+def _codec_name(charset: str) -> str | None:
+    try:
+        return codecs.lookup(charset).name
+    except LookupError:
+        return None
 
 
 @dataclass(frozen=True, slots=True)
 class HttpEnvelope:
-    """Immutable container for an HTTP response with lazy/optional JSON parsing."""
+    """Immutable container for an HTTP response with lazy/optional JSON parsing.
+
+    Only the raw bytes of the body are kept, the decoded text, the parsed JSON and the
+    case-insensitive header index are all computed the first time they're asked for.
+    """
 
     status_code: int
     headers: Mapping[str, str]
-    text: str
+    content: bytes
     encoding: str
     url: str
     elapsed: float
+    # set instead of content when the body is to be consumed incrementally, as chunks of text
+    stream: Optional[Iterator[str]] = None
+    # closes the response the stream is read from (see close)
+    _close_stream: Optional[Callable[[], None]] = field(default=None, repr=False, compare=False)
+    _text: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    _json: Any = field(default=_UNPARSED, init=False, repr=False, compare=False)
+    _header_index: Optional[dict[str, str]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            object.__setattr__(
+                self, "_text", self.content.decode(self.encoding or "utf-8", errors="replace")
+            )
+        return self._text
 
     def has_body(self) -> bool:
-        return len(self.text) > 0
+        return len(self.content) > 0
+
+    def is_streamed(self) -> bool:
+        return self.stream is not None
+
+    def close(self):
+        """Closes a streamed response, so its connection goes back to the pool even when its body
+        is never (or only partly) read. Does nothing for a response that has been read already."""
+        if self._close_stream is not None:
+            self._close_stream()
+
+    def iter_json_array(self) -> Iterator[Any]:
+        """Yields the elements of a (streamed) top-level JSON array response as they arrive."""
+        return json_stream.iter_json_array(self.stream if self.is_streamed() else [self.text])
 
     def content_type(self) -> str:
         return self.header("Content-Type", "")
@@ -43,53 +136,325 @@ class HttpEnvelope:
         Returns parsed JSON, or None if:
         - body is empty
         - parsing fails (ValueError)
+        The body is only parsed once, later calls return the same object.
         """
-        if not self.has_body():
-            return None
-        if len(self.text.strip()) == 0:
-            return None
+        if self._json is _UNPARSED:
+            object.__setattr__(self, "_json", self._parse_json())
+        return self._json
 
+    def _parse_json(self) -> Optional[Any]:
+        if not self.content.strip():
+            return None
+        content = self.content
+        charset = self.declared_charset()
+        # json.loads detects the encoding of bytes by itself (as long as it's one of the UTFs),
+        # so they only need decoding first when some other charset is declared
+        if charset and _codec_name(charset) not in _UTF_CODECS:
+            try:
+                content = content.decode(charset)
+            except (LookupError, UnicodeDecodeError):
+                pass
         try:
-            return json.loads(self.text)
+            return json.loads(content)
         except ValueError:
             return None
 
+    def declared_charset(self) -> Optional[str]:
+        """The charset given by the Content-Type header, if any."""
+        for param in self.content_type().split(";")[1:]:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "charset" and value.strip():
+                return value.strip().strip("\"'")
+        return None
+
     def header(self, name: str, default: Optional[str] = None) -> Optional[str]:
         # case-insensitive lookup
-        for k, v in self.headers.items():
-            if k.lower() == name.lower():
-                return v
-        return default
+        if self._header_index is None:
+            index = {k.lower(): v for k, v in reversed(list(self.headers.items()))}
+            object.__setattr__(self, "_header_index", index)
+        return self._header_index.get(name.lower(), default)
 
     @staticmethod
-    def from_requests(resp: requests.Response) -> "HttpEnvelope":
+    def from_requests(resp: requests.Response, stream: bool = False) -> "HttpEnvelope":
         return HttpEnvelope(
             status_code=getattr(resp, "status_code", 0),
             headers=getattr(resp, "headers", {}),
-            text=getattr(resp, "text", ""),
-            encoding=getattr(resp, "encoding", "utf-8"),
+            content=b"" if stream else getattr(resp, "content", b"") or b"",
+            encoding=getattr(resp, "encoding", None) or "utf-8",
             url=getattr(resp, "url", ""),
             elapsed=getattr(resp, "elapsed", -1),
+            stream=_iter_text(resp) if stream else None,
+            _close_stream=resp.close if stream else None,
+        )
+
+    @staticmethod
+    def from_httpx(resp) -> "HttpEnvelope":
+        try:
+            elapsed = resp.elapsed
+        except RuntimeError:
+            # only known once the response has been closed, which custom transports may not do
+            elapsed = -1
+        return HttpEnvelope(
+            status_code=resp.status_code,
+            headers=resp.headers,
+            content=resp.content,
+            encoding=resp.encoding or "utf-8",
+            url=str(resp.url),
+            elapsed=elapsed,
+        )
+
+    @staticmethod
+    def from_recording(recording: dict) -> "HttpEnvelope":
+        return HttpEnvelope(
+            status_code=recording["status_code"],
+            headers=recording["headers"],
+            content=recording["content"],
+            encoding=recording["encoding"],
+            url=recording["url"],
+            elapsed=recording["elapsed"],
+        )
+
+    def to_recording(self) -> dict:
+        return {
+            "status_code": self.status_code,
+            "headers": dict(self.headers),
+            "content": self.content,
+            "encoding": self.encoding,
+            "url": self.url,
+            "elapsed": _seconds(self.elapsed),
+        }
+
+
+def _seconds(elapsed) -> float:
+    # requests and httpx both give a timedelta
+    total_seconds = getattr(elapsed, "total_seconds", None)
+    return total_seconds() if total_seconds is not None else elapsed
+
+
+def _iter_text(resp: requests.Response, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder(resp.encoding or "utf-8")(errors="replace")
+    try:
+        for chunk in resp.iter_content(chunk_size=chunk_size):
+            yield decoder.decode(chunk)
+        yield decoder.decode(b"", final=True)
+    finally:
+        resp.close()
+
+
+def validate_transport(transport: str) -> str:
+    if transport not in _supported_transports:
+        raise ValueError(
+            f'Unknown transport "{transport}". Supported values: {", ".join(_supported_transports)}'
+        )
+    return transport
+
+
+def _import_httpx():
+    try:
+        import httpx
+    except ImportError as e:
+        raise ImportError(
+            'The "httpx" transport requires the httpx package (pip install skivvy[async])'
+        ) from e
+    return httpx
+
+
+class _PoolAdapter(HTTPAdapter):
+    def __init__(self, settings: ConnectionSettings):
+        self._socket_options = settings.socket_options()
+        super().__init__(
+            pool_connections=settings.pool_connections,
+            pool_maxsize=settings.pool_maxsize,
+            # a plain number would also retry reading the response of idempotent requests,
+            # which have then already reached the server. False (rather than 0) lets errors
+            # other than failing to connect through as they are, e.g. as a ReadTimeout.
+            max_retries=Retry(
+                total=None,
+                connect=settings.connect_retries,
+                read=False,
+                status=False,
+                other=False,
+            ),
+            pool_block=settings.pool_block,
         )
 
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["socket_options"] = self._socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+
+def create_session(settings: ConnectionSettings) -> requests.Session:
+    session = requests.Session()
+    adapter = _PoolAdapter(settings)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if not settings.keep_alive:
+        session.headers["Connection"] = "close"
+    return session
+
 
 def initialize_session(session=None):
     global _session
-    _session = session or requests.Session()
+    _session = session or create_session(_connection_settings)
+
+
+def configure_connections(settings: ConnectionSettings):
+    """Makes requests use connection pools with these settings from now on. The current pools
+    (and the connections they have open) are kept if they already have these settings."""
+    global _connection_settings
+    if settings == _connection_settings and _session is not None:
+        return
+    _connection_settings = settings
+    initialize_session()
+
+
+def split_timeout(
+    timeout: int | float | None,
+    connect_timeout: int | float | None = None,
+    read_timeout: int | float | None = None,
+) -> Timeout:
+    """Returns the timeout to pass to execute, where connect_timeout and read_timeout (when
+    given) override timeout for connecting and for reading respectively."""
+    if connect_timeout is None and read_timeout is None:
+        return timeout
+    return (
+        timeout if connect_timeout is None else connect_timeout,
+        timeout if read_timeout is None else read_timeout,
+    )
+
+
+def _httpx_timeout(timeout: Timeout):
+    if not isinstance(timeout, tuple):
+        return timeout
+    connect, read = timeout
+    return _import_httpx().Timeout(read, connect=connect)
+
+
+def _check_h2(transport: str):
+    try:
+        import h2  # noqa: F401
+    except ImportError as e:
+        raise ImportError(
+            f'The "{transport}" transport requires the h2 package (pip install skivvy[http2])'
+        ) from e
+
+
+def create_async_client(
+    settings: ConnectionSettings | None = None, transport: str = TRANSPORT_HTTPX
+):
+    """An httpx.AsyncClient with (roughly) the same pooling as the requests session gets. httpx
+    limits the connections of the whole pool rather than those per host.
+
+    The http2 transport offers HTTP/2 besides HTTP/1.1 when connecting with TLS, and the server
+    picks which one it speaks. The h2c transport only speaks HTTP/2, without TLS as well (where
+    there's nothing to pick the protocol with). Over HTTP/2, requests to the same origin are
+    multiplexed over a single connection."""
+    httpx = _import_httpx()
+    http2 = transport in (TRANSPORT_HTTP2, TRANSPORT_H2C)
+    if http2:
+        _check_h2(transport)
+    settings = settings or _connection_settings
+    max_connections = settings.pool_connections * settings.pool_maxsize
+    limits = httpx.Limits(
+        max_connections=max_connections if settings.pool_block else None,
+        max_keepalive_connections=max_connections if settings.keep_alive else 0,
+    )
+    transport = httpx.AsyncHTTPTransport(
+        limits=limits,
+        retries=settings.connect_retries,
+        socket_options=settings.socket_options(),
+        http1=transport != TRANSPORT_H2C,
+        http2=http2,
+    )
+    headers = None if settings.keep_alive else {"Connection": "close"}
+    return httpx.AsyncClient(follow_redirects=True, transport=transport, headers=headers)
+
+
+def use_cassette(cassette: Cassette | None):
+    """Records responses to (or replays them from) cassette from now on, or stops doing so."""
+    global _cassette
+    _cassette = cassette
+
+
+@asynccontextmanager
+async def async_session(client=None, transport: str = TRANSPORT_HTTPX):
+    """Makes execute_async share one connection pool (an httpx.AsyncClient) for the duration of the block."""
+    global _async_client
+    client = client or create_async_client(transport=transport)
+    _async_client = client
+    try:
+        yield client
+    finally:
+        _async_client = None
+        await client.aclose()
 
 
-def execute(request: dict[str, object], timeout: int | float | None = None) -> HttpEnvelope:
+def execute(
+    request: dict[str, object], timeout: Timeout = None, stream: bool = False
+) -> HttpEnvelope:
+    """Executes a request, when stream is True the body is left to be read incrementally from the envelope."""
     method, payload = prepare_request_data(request)
     payload = prepare_upload_files(payload)
+    if _cassette is not None:
+        if _cassette.replaying:
+            return _replay(method, payload)
+        # the whole body is needed to record it
+        stream = False
+    if stream:
+        payload["stream"] = True
     r = do_request(method, timeout=timeout, **payload)
-    events.emit(
+    envelope = HttpEnvelope.from_requests(r, stream=stream)
+    _record(method, payload, envelope)
+    _emit_response(envelope, getattr(r, "url", payload.get("url")))
+    return envelope
+
+
+async def execute_async(
+    request: dict[str, object],
+    timeout: Timeout = None,
+    transport: str = TRANSPORT_HTTPX,
+) -> HttpEnvelope:
+    if validate_transport(transport) == TRANSPORT_REQUESTS:
+        # a blocking transport still gets to run without holding up the event loop
+        return await asyncio.to_thread(execute, request, timeout)
+
+    method, payload = prepare_request_data(request)
+    payload = prepare_upload_files(payload)
+    if _cassette is not None and _cassette.replaying:
+        return _replay(method, payload)
+    r = await do_request_async(method, timeout=timeout, transport=transport, **payload)
+    envelope = HttpEnvelope.from_httpx(r)
+    _record(method, payload, envelope)
+    _emit_response(envelope, envelope.url)
+    return envelope
+
+
+def _replay(method: str, payload: dict) -> HttpEnvelope:
+    _emit_transport(method, payload)
+    envelope = HttpEnvelope.from_recording(_cassette.replay(method, payload))
+    _emit_response(envelope, envelope.url)
+    return envelope
+
+
+def _record(method: str, payload: dict, envelope: HttpEnvelope):
+    if _cassette is not None and not envelope.is_streamed():
+        _cassette.record(method, payload, envelope.to_recording())
+
+
+def _emit_response(envelope: HttpEnvelope, url):
+    # a streamed body hasn't been read (and won't be kept around), so it can't be part of the event
+    streamed = envelope.is_streamed()
+    events.emit_lazy(
         events.HTTP_RESPONSE,
-        http_status=getattr(r, "status_code", None),
-        url=getattr(r, "url", payload.get("url")),
-        response_headers=dict(getattr(r, "headers", {}) or {}),
-        response_body=getattr(r, "text", ""),
+        lambda: dict(
+            http_status=envelope.status_code,
+            url=url,
+            response_headers=dict(envelope.headers or {}),
+            response_body=None if streamed else envelope.text,
+            # memoized on the envelope, so neither sinks nor the verification parse it again
+            response_json=None if streamed else envelope.json(),
+        ),
     )
-    return HttpEnvelope.from_requests(r)
 
 
 def prepare_request_data(request_data: dict[str, object]) -> tuple[str, dict]:
@@ -114,25 +479,48 @@ def prepare_upload_files(payload: dict[str, object]) -> dict[str, object]:
     return next_payload
 
 
+def _emit_transport(method: str, payload: dict):
+    def build_payload():
+        files = payload.get("files")
+        upload_fields = list(files.keys()) if isinstance(files, dict) else None
+        return dict(
+            http_method=method,
+            url=payload.get("url"),
+            request_headers=dict(payload.get("headers") or {}),
+            request_query=payload.get("params"),
+            request_json=payload.get("json"),
+            request_data=payload.get("data"),
+            request_upload_fields=upload_fields,
+        )
+
+    events.emit_lazy(events.HTTP_TRANSPORT, build_payload)
+
+
 def do_request(method, timeout=None, **payload: Dict[str, Any]) -> requests.Request:
     assert method, "missing method"
     assert method in _supported_methods, f"unsupported method: {method}"
 
     request_function: Callable = getattr(_session, method)
     assert callable(request_function), f"Session function {method} is not callable"
-    files = payload.get("files")
-    upload_fields = list(files.keys()) if isinstance(files, dict) else None
-    events.emit(
-        events.HTTP_TRANSPORT,
-        http_method=method,
-        url=payload.get("url"),
-        request_headers=dict(payload.get("headers") or {}),
-        request_query=payload.get("params"),
-        request_json=payload.get("json"),
-        request_data=payload.get("data"),
-        request_upload_fields=upload_fields,
-    )
+    _emit_transport(method, payload)
     return request_function(timeout=timeout, **payload)
 
 
+async def do_request_async(
+    method, timeout=None, transport: str = TRANSPORT_HTTPX, **payload: Dict[str, Any]
+):
+    assert method, "missing method"
+    assert method in _supported_methods, f"unsupported method: {method}"
+
+    _emit_transport(method, payload)
+    # httpx has no notion of an empty upload, only pass files when there are any
+    if not payload.get("files"):
+        payload.pop("files", None)
+    timeout = _httpx_timeout(timeout)
+    if _async_client is not None:
+        return await _async_client.request(method.upper(), timeout=timeout, **payload)
+    async with create_async_client(transport=transport) as client:
+        return await client.request(method.upper(), timeout=timeout, **payload)
+
+
 initialize_session()
@@ -0,0 +1,171 @@
+import json
+import re
+from typing import Any, Iterable, Iterator
+
+_WHITESPACE = " \t\n\r"
+_decoder = json.JSONDecoder()
+
+# The most characters a single element may take up. Elements are kept in memory until they're
+# complete, so this is what bounds the memory used (and it keeps a malformed document from being
+# buffered all the way to the end before anything is reported).
+MAX_ELEMENT_SIZE = 64 * 1024 * 1024
+
+# what the parser expects to see next
+_START = "start"  # the opening '['
+_FIRST = "first"  # the first element or ']'
+_ELEMENT = "element"  # an element (after a ',')
+_DELIMITER = "delimiter"  # ',' or ']'
+_END = "end"
+
+# what matters when looking for the end of an element: whole strings, brackets, and the start of a
+# string that isn't complete yet (or the special characters of one that has been started)
+_CONTAINER_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{}"]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_SCALAR_END = re.compile(r"[ \t\n\r,\]]")
+_SCALAR_START = "-0123456789tfn"
+
+
+class _Element:
+    """The text of the element currently being read, along with enough of its structure (how deeply
+    nested it is, whether it's in a string) to tell where it ends. Every chunk is only scanned once,
+    the element is decoded once it's complete."""
+
+    __slots__ = ("pieces", "size", "max_size", "scalar", "depth", "in_string", "escaped")
+
+    def __init__(self, first_char: str, max_size: int):
+        self.pieces: list[str] = []
+        self.size = 0
+        self.max_size = max_size
+        # a number, true, false or null - which end at whatever comes after them
+        self.scalar = first_char not in '{["'
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, chunk: str, pos: int) -> int | None:
+        """Reads the element from chunk, starting at pos. Returns where in chunk the element ends,
+        or None if it continues in the next chunk."""
+        end = self._scan(chunk, pos)
+        self.size += (len(chunk) if end is None else end) - pos
+        if self.size > self.max_size:
+            raise ValueError(
+                "An element of the JSON array is larger than %d characters" % self.max_size
+            )
+        self.pieces.append(chunk[pos:end])
+        return end
+
+    def decode(self) -> Any:
+        return _decoder.decode("".join(self.pieces))
+
+    def _scan(self, chunk: str, pos: int) -> int | None:
+        if self.scalar:
+            match = _SCALAR_END.search(chunk, pos)
+            return match.start() if match else None
+
+        while pos < len(chunk):
+            if self.escaped:
+                self.escaped = False
+                pos += 1
+            elif self.in_string:
+                match = _STRING_SPECIAL.search(chunk, pos)
+                if match is None:
+                    return None
+                pos = match.end()
+                if match.group() == "\\":
+                    self.escaped = True
+                else:
+                    self.in_string = False
+                    if not self.depth:
+                        return pos
+            else:
+                for match in _CONTAINER_TOKEN.finditer(chunk, pos):
+                    token = match.group()
+                    if token in "[{":
+                        self.depth += 1
+                    elif token in "]}":
+                        self.depth -= 1
+                        if not self.depth:
+                            return match.end()
+                    elif token == '"':
+                        # a string that goes on past the end of the chunk
+                        self.in_string = True
+                        pos = match.end()
+                        break
+                    elif not self.depth:
+                        return match.end()  # the element is just a string
+                else:
+                    return None
+        return None
+
+
+def iter_json_array(
+    chunks: Iterable[str], max_element_size: int = MAX_ELEMENT_SIZE
+) -> Iterator[Any]:
+    """
+    Incrementally parses a JSON document consisting of a top-level array, yielding its elements one
+    at a time as soon as they have been read. Only the text of the element currently being parsed is
+    kept around, so memory stays bounded by the size of the largest element rather than the document.
+    Raises ValueError if the document isn't an array, isn't valid JSON or has an element larger than
+    max_element_size characters.
+    """
+    state = _START
+    element = None
+
+    for chunk in chunks:
+        pos = 0
+        while pos < len(chunk):
+            if element is not None:
+                end = element.feed(chunk, pos)
+                if end is None:
+                    break  # the element isn't complete yet, read more
+                yield element.decode()
+                element = None
+                pos = end
+                state = _DELIMITER
+                continue
+
+            while pos < len(chunk) and chunk[pos] in _WHITESPACE:
+                pos += 1
+            if pos == len(chunk):
+                break
+            char = chunk[pos]
+
+            if state == _END:
+                raise ValueError("Unexpected data after the end of the JSON array")
+            elif state == _START:
+                if char != "[":
+                    raise ValueError(
+                        "Expected a JSON array but found: %r" % chunk[pos : pos + 20]
+                    )
+                state = _FIRST
+                pos += 1
+            elif char == "]" and state in (_FIRST, _DELIMITER):
+                state = _END
+                pos += 1
+            elif state == _DELIMITER:
+                if char != ",":
+                    raise ValueError(
+                        "Expected ',' or ']' but found: %r" % chunk[pos : pos + 20]
+                    )
+                state = _ELEMENT
+                pos += 1
+            elif char in '{["' or char in _SCALAR_START:
+                # most elements are complete within the chunk they start in, so try decoding right
+                # away - only the ones that aren't (or aren't valid) have to be scanned for their end
+                try:
+                    value, end = _decoder.raw_decode(chunk, pos)
+                except json.JSONDecodeError:
+                    element = _Element(char, max_element_size)
+                else:
+                    # a number might continue in the next chunk, e.g. "-2" + ".5"
+                    if char not in _SCALAR_START or end < len(chunk):
+                        yield value
+                        pos = end
+                        state = _DELIMITER
+                    else:
+                        element = _Element(char, max_element_size)
+            else:
+                raise ValueError("Expecting value but found: %r" % chunk[pos : pos + 20])
+
+    if state != _END:
+        raise ValueError("Unexpected end of JSON array")
@@ -1,4 +1,8 @@
 import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from functools import partial
 
 from rich.console import Console
 from rich.logging import RichHandler
@@ -24,13 +28,38 @@ _logger.setLevel(logging.INFO)
 _logger.propagate = False
 _logger.addHandler(_handler)
 
+# The log level of the test being run. It's kept per worker thread (or asyncio task), so tests
+# running side by side each log at their own level without changing the default one.
+_bound_level: ContextVar[int | None] = ContextVar("skivvy_log_level", default=None)
+# what the current thread (or asyncio task) has output while grouping its output, see grouped()
+_group: ContextVar[list | None] = ContextVar("skivvy_log_group", default=None)
+_output_lock = threading.RLock()
+
+
+def _output(write):
+    group = _group.get()
+    if group is not None:
+        group.append(write)
+        return
+    with _output_lock:
+        write()
+
+
+def _is_enabled(level: int) -> bool:
+    bound = _bound_level.get()
+    if bound is None:
+        return _logger.isEnabledFor(level)
+    return level >= bound
+
 
 def _log(level, msg):
-    if msg is None:
+    if msg is None or not _is_enabled(level):
         return
     if not isinstance(msg, str):
         msg = str(msg)
-    _logger.log(level, msg)
+    # the level has already been checked, which may have been against the one of the test
+    record = _logger.makeRecord(_logger.name, level, "(unknown file)", 0, msg, None, None)
+    _output(partial(_logger.handle, record))
 
 
 def debug(msg):
@@ -76,12 +105,28 @@ def log_at(level: int | str | None, msg):
     _log(resolved, msg)
 
 
+def is_enabled_at(level: int | str | None) -> bool:
+    """Whether a message logged with log_at(level, ...) would be output."""
+    resolved = _resolve_level(level)
+    return resolved is not None and _is_enabled(resolved)
+
+
 def set_default_level(level):
     _logger.setLevel(level)
 
 
+def bind_level(level) -> Token:
+    """Sets the level of the current thread (or asyncio task) only, None goes back to using the
+    default level. Returns a token to restore the previous level with (see unbind_level)."""
+    return _bound_level.set(_resolve_level(level))
+
+
+def unbind_level(token: Token):
+    _bound_level.reset(token)
+
+
 def is_debug_enabled() -> bool:
-    return _logger.isEnabledFor(logging.DEBUG)
+    return _is_enabled(logging.DEBUG)
 
 
 def console_width() -> int:
@@ -89,4 +134,23 @@ def console_width() -> int:
 
 
 def render(renderable) -> None:
-    _handler.console.print(renderable)
+    _output(partial(_handler.console.print, renderable))
+
+
+@contextmanager
+def grouped():
+    """Holds back what the current thread (or asyncio task) outputs until the end of the block,
+    then outputs all of it at once, so it isn't interleaved with the output of tests running
+    alongside it."""
+    if _group.get() is not None:
+        yield  # already grouped by an enclosing block
+        return
+    group = []
+    token = _group.set(group)
+    try:
+        yield
+    finally:
+        _group.reset(token)
+        with _output_lock:
+            for write in group:
+                write()
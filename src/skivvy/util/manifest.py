@@ -0,0 +1,181 @@
+"""On-disk cache of the discovered testfiles and their parsed contents.
+
+Discovering and parsing a large suite means walking every directory and reading every
+testfile, which is slow on network mounted file systems. The manifest remembers the
+result of both between runs, together with enough stat information to tell if it's
+still valid: a listing is reused as long as none of the directories it was made from
+have changed (adding, removing or renaming a file changes the mtime of its directory)
+and a testfile is only re-parsed if its mtime or size has changed.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from skivvy.util import file_util, log
+
+MANIFEST_VERSION = 2
+# a file modified this recently might be modified again without its mtime changing
+# (file systems with coarse timestamps), so it's not trusted to still be the same next time
+RACY_WINDOW_NS = 2_000_000_000
+
+_manifest = None
+
+
+class Manifest:
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self._listings: dict[str, dict] = {}
+        self._testcases: dict[str, dict] = {}
+        # what's been parsed during this run (a testfile is read both when the suite is
+        # analysed up front and when it's run), whether or not it can be kept in the manifest
+        self._parsed: dict[str, dict] = {}
+        self._hashes: dict[str, str] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def _load(self):
+        try:
+            data = file_util.parse_json(self.path)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            log.debug(f"Ignoring unreadable manifest {self.path}: {e}")
+            return
+        if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+            log.debug(f"Ignoring manifest {self.path} of an unknown version")
+            return
+        self._listings = data.get("listings", {})
+        self._testcases = data.get("testcases", {})
+
+    def list_files(self, path, include_ext, file_order="lexical") -> list[str]:
+        """Same as file_util.list_files, but without walking the tree if it hasn't changed."""
+        key = json.dumps([os.path.abspath(path), include_ext, file_order])
+        cached = self._listings.get(key)
+        if cached is not None and _dirs_unchanged(cached["dirs"]):
+            return list(cached["files"])
+
+        started = time.time_ns()
+        dirs: list[str] = []
+        files = file_util.list_files(path, include_ext, file_order, visited_dirs=dirs)
+        signatures = _dir_signatures(dirs, started)
+        if self.path and signatures is not None:
+            with self._lock:
+                self._listings[key] = {"dirs": signatures, "files": files}
+                self._dirty = True
+        return files
+
+    def parse_testfile(self, filename: str):
+        """Same as file_util.parse_json, but only actually parses files that have changed."""
+        try:
+            signature = _file_signature(os.stat(filename))
+        except OSError:
+            signature = None
+        for cache in (self._parsed, self._testcases):
+            cached = cache.get(filename)
+            if (
+                cached is not None
+                and signature is not None
+                and cached["signature"] == signature
+            ):
+                self._hashes[filename] = cached["hash"]
+                return cached["testcase"]
+
+        started = time.time_ns()
+        content = file_util.read_file_contents(filename, binary=True)
+        testcase = json.loads(content)
+        digest = self._hashes[filename] = hashlib.sha1(content).hexdigest()
+        if signature is not None:
+            parsed = {"signature": signature, "hash": digest, "testcase": testcase}
+            with self._lock:
+                self._parsed[filename] = parsed
+                if self.path and not _is_racy(signature[0], started):
+                    self._testcases[filename] = parsed
+                    self._dirty = True
+        return testcase
+
+    def content_hash(self, filename: str) -> str | None:
+        """The hash of the content of a testfile that has been parsed, for caching things derived
+        from it (like the compiled plan of its expected response)."""
+        return self._hashes.get(filename)
+
+    def save(self):
+        """Writes the manifest back to disk, if anything has changed since it was loaded."""
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            listed = {
+                f for listing in self._listings.values() for f in listing["files"]
+            }
+            # forget about testfiles that have been removed since they were parsed
+            testcases = {f: tc for f, tc in self._testcases.items() if f in listed}
+            data = {
+                "version": MANIFEST_VERSION,
+                "listings": self._listings,
+                "testcases": testcases,
+            }
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf8") as fp:
+                    json.dump(data, fp, separators=(",", ":"))
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                log.warning(f"Could not write manifest {self.path}: {e}")
+                return
+            self._dirty = False
+
+
+def _file_signature(st: os.stat_result) -> list[int]:
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _is_racy(mtime_ns: int, started_ns: int) -> bool:
+    return mtime_ns >= started_ns - RACY_WINDOW_NS
+
+
+def _dir_signatures(dirs: list[str], started_ns: int) -> dict[str, int] | None:
+    signatures = {}
+    for d in dirs:
+        try:
+            mtime_ns = os.stat(d).st_mtime_ns
+        except OSError:
+            return None
+        if _is_racy(mtime_ns, started_ns):
+            return None
+        signatures[d] = mtime_ns
+    return signatures
+
+
+def _dirs_unchanged(signatures: dict[str, int]) -> bool:
+    try:
+        return all(
+            os.stat(d).st_mtime_ns == mtime_ns for d, mtime_ns in signatures.items()
+        )
+    except OSError:
+        return False
+
+
+def open_manifest(path: str | None) -> Manifest:
+    """Makes a manifest stored at path (or, if path is None, one that doesn't cache anything) the current one."""
+    global _manifest
+    _manifest = Manifest(path)
+    return _manifest
+
+
+def get_manifest() -> Manifest:
+    global _manifest
+    if _manifest is None:
+        _manifest = Manifest()
+    return _manifest
+
+
+def parse_testfile(filename: str):
+    return get_manifest().parse_testfile(filename)
+
+
+def content_hash(filename: str) -> str | None:
+    return get_manifest().content_hash(filename)
@@ -1,6 +1,7 @@
 import os
 import string
 from collections import defaultdict
+from contextvars import ContextVar, Token
 from typing import KeysView
 
 _store: dict[str, dict] = defaultdict(lambda: {})
@@ -8,6 +9,8 @@ _allowed_key_chars = set(string.ascii_lowercase + string.digits + "_-.,/\\")
 _allowed_key_chars_pretty = "".join(sorted(_allowed_key_chars))
 _allowed_initial_key_chars = set(string.ascii_lowercase)
 _validate_variable_names = True
+# bound to the thread (or asyncio task) running a test, takes precedence over SKIVVY_CURRENT_DIR
+_bound_namespace: ContextVar[str | None] = ContextVar("skivvy_namespace", default=None)
 
 
 def set_validate_variable_names(validate: bool):
@@ -16,9 +19,20 @@ def set_validate_variable_names(validate: bool):
 
 
 def get_current_namespace():
+    namespace = _bound_namespace.get()
+    if namespace is not None:
+        return namespace
     return os.environ.get("SKIVVY_CURRENT_DIR", os.getcwd())
 
 
+def bind_namespace(namespace: str) -> Token:
+    return _bound_namespace.set(namespace)
+
+
+def unbind_namespace(token: Token):
+    _bound_namespace.reset(token)
+
+
 # TODO: Unused, consider removing
 def get_all_namespaces() -> KeysView[str]:
     return _store.keys()
@@ -36,6 +50,16 @@ def _get_current_scope_storage() -> dict:
     return scope
 
 
+def forget(namespace: str, names=None):
+    """Removes the variables with the given names (or all of them) from a namespace."""
+    scope = _get_scope_storage(namespace)
+    if names is None:
+        scope.clear()
+        return
+    for name in names:
+        scope.pop(name.lower(), None)
+
+
 def dump(namespace):
     scope = _get_scope_storage(namespace)
     if scope is None:
@@ -1,55 +1,51 @@
+import threading
+
 from skivvy.config import Settings
 from skivvy.util import scope
-from . import matchers
+from . import matchers, plan
 from .errors import VerificationFailure
+from .list_index import LIST_INDEX_MIN_ENTRIES, ListIndex
 from .util import log
 from .util.str_util import tojsonstr
 
+# Matcher options, matcher state and the current path are module-level, so a
+# verification has to have them to itself while walking the expected and actual JSON.
+# Anything that waits on the network (reading a streamed response, $valid_url checks)
+# is done without holding the lock.
+_verify_lock = threading.RLock()
 
-# basically just looks at a string and the name of a matcher and determines if the string is invoking that matcher
-# returns true in that case, false otherwise
-def has_matcher_syntax(expected, matcher):
-    try:
-        first_word = expected.split()[0]
-        if isinstance(expected, str) and first_word == matcher:
-            return True
-        return False
-    except Exception:
-        return False
-
-
-def is_matcher(expected):
-    for matcher in matchers.matcher_dict.keys():
-        if has_matcher_syntax(expected, matcher):
-            return True
-    return False
 
-
-def verify_dict(expected, actual, **match_options):
+def verify_dict(expected: plan.DictNode, actual, **match_options):
     match_subsets = match_options.get("match_subsets", False)
     skip_empty_objects = match_options.get(Settings.SKIP_EMPTY_OBJECTS.key, False)
     if match_subsets and skip_empty_objects and not actual:
         return True
 
-    for key in expected.keys():
+    for key, node in expected.items:
         log.debug("Checking '%s'..." % key)
         matchers.push_path(key)
         try:
-            _verify(expected.get(key), actual.get(key), **match_options)
+            _verify_node(node, actual.get(key), **match_options)
         finally:
             matchers.pop_path()
         log.debug("Success.")
 
 
-def verify_list(expected, actual, **match_options):
+def verify_list(expected: plan.ListNode, actual, **match_options):
     match_subsets = match_options.get("match_subsets", False)
     match_every_entry = match_options.get(Settings.MATCH_EVERY_ENTRY.key, False)
     skip_empty_arrays = match_options.get(Settings.SKIP_EMPTY_ARRAYS.key, False)
     if match_subsets and skip_empty_arrays and not actual:
         return True
 
-    for expected_entry in expected:
-        log.debug("Checking '%s'..." % expected_entry)
+    index = None
+    indexable = isinstance(actual, list) and len(actual) >= LIST_INDEX_MIN_ENTRIES
+    if indexable and not match_every_entry:
+        skip_empty_objects = match_options.get(Settings.SKIP_EMPTY_OBJECTS.key, False)
+        index = ListIndex(actual, include_empty=match_subsets and skip_empty_objects)
+
+    for expected_entry, literals in zip(expected.entries, expected.literals):
+        log.debug("Checking '%s'..." % expected_entry.source)
 
         if match_every_entry:
             # Every actual entry must satisfy this expected template.
@@ -62,15 +58,22 @@ def verify_list(expected, actual, **match_options):
                         matchers.pop_path()
             continue
 
-        if expected_entry in actual:
-            continue  # fast path: exact Python equality
-
-        # Matcher-aware search: try each actual entry using _verify() semantics.
-        # When match_subsets is true and both sides are dicts, use partial matching:
-        # overlay expected keys onto actual so only expected keys are checked.
+        positions = index.candidates(literals) if index is not None else None
+        if positions is None:
+            if expected_entry.source in actual:
+                continue  # fast path: exact Python equality
+            candidates = enumerate(actual) if isinstance(actual, list) else ()
+        else:
+            # only the entries with the same values for the literal keys of expected_entry can match it
+            candidates = [(i, actual[i]) for i in positions]
+            if any(actual_entry == expected_entry.source for _, actual_entry in candidates):
+                continue
+
+        # Matcher-aware search: try each candidate entry using _verify() semantics.
+        # Checks can't be deferred here, since whether an entry matches decides which one is picked.
         found = False
-        if isinstance(actual, list):
-            for i, actual_entry in enumerate(actual):
+        with matchers.get_matcher_context().immediate():
+            for i, actual_entry in candidates:
                 matchers.push_path(i)
                 try:
                     _verify_entry(expected_entry, actual_entry, **match_options)
@@ -84,59 +87,142 @@ def verify_list(expected, actual, **match_options):
         if not found:
             raise VerificationFailure(
                 "Didn't find:\n%s\nin:\n%s"
-                % (tojsonstr(expected_entry), tojsonstr(actual))
+                % (tojsonstr(expected_entry.source), tojsonstr(actual))
             )
 
 
-def _verify_entry(expected_entry, actual_entry, **match_options):
+def _verify_entry(expected_entry: plan.Node, actual_entry, **match_options):
     """Verify a single expected entry against a single actual entry.
-    With match_subsets and both sides being dicts, only expected keys are checked."""
-    match_subsets = match_options.get("match_subsets", False)
-    if (
-        match_subsets
-        and isinstance(expected_entry, dict)
-        and isinstance(actual_entry, dict)
-    ):
-        merged = {**actual_entry, **expected_entry}
-        _verify(merged, actual_entry, **match_options)
-    else:
-        _verify(expected_entry, actual_entry, **match_options)
-
+    Only the keys of an expected dict are checked, with or without match_subsets
+    (the other keys of the actual entry would only be compared to themselves)."""
+    _verify_node(expected_entry, actual_entry, **match_options)
 
-def verify_matcher(expected, actual):
-    for matcher in matchers.matcher_dict.keys():
-        if has_matcher_syntax(expected, matcher):
-            expected = expected[len(matcher):]
-            matcher_func = matchers.matcher_dict.get(matcher)
-            result, msg = matcher_func(expected, actual)
-            if not result:
-                raise VerificationFailure(msg)
 
-    return matchers.default_matcher(expected, actual)
+def _apply_matcher(resolved, actual):
+    context = matchers.get_matcher_context()
+    context.name = resolved.name
+    try:
+        result, msg = resolved.func(resolved.argument, actual)
+    finally:
+        context.name = None
+    if not result:
+        raise VerificationFailure(msg)
+    return result, msg
 
 
 def _verify(expected, actual, **match_options):
-    if is_matcher(expected):
-        verify_matcher(expected, actual)
-    elif type(expected) != type(actual):
-        if not actual and not expected:
+    return _verify_node(plan.compile_plan(expected), actual, **match_options)
+
+
+def _verify_node(expected: plan.Node, actual, **match_options):
+    kind = type(expected)
+    if kind is plan.MatcherNode:
+        _apply_matcher(expected.matcher, actual)
+    elif type(expected.source) != type(actual):
+        if not actual and not expected.source:
             if match_options.get("match_falsiness"):
                 return True
-        raise VerificationFailure("%s is not the same type as %s" % (expected, actual))
-    elif isinstance(expected, dict):
+        raise VerificationFailure("%s is not the same type as %s" % (expected.source, actual))
+    elif kind is plan.DictNode:
         return verify_dict(expected, actual, **match_options)
-    elif isinstance(expected, list):
+    elif kind is plan.ListNode:
         return verify_list(expected, actual, **match_options)
-    elif expected != actual:
-        raise VerificationFailure("expected %s but was %s" % (expected, actual))
+    elif expected.source != actual:
+        raise VerificationFailure("expected %s but was %s" % (expected.source, actual))
     else:
         return True
 
 
-def verify(expected, actual, **match_options):
+def verify(expected, actual, plan_key=None, url_checks=None, **match_options):
+    """Verifies actual against expected. With a plan_key, which has to identify the content of
+    expected (e.g. the content hash of the testfile it's from), its compiled plan is reused.
+    Given a list as url_checks, the $valid_url checks are left to the caller: what's to be passed
+    to matchers.check_deferred_urls is added to it rather than the checks being made."""
     validate_variable_names = match_options.get(
         Settings.VALIDATE_VARIABLE_NAMES.key, True
     )
-    scope.set_validate_variable_names(validate_variable_names)
-    matchers.initialize_matchers(match_options.get(Settings.MATCHER_OPTIONS.key, {}))
-    return _verify(expected, actual, **match_options)
+    with _verify_lock:
+        scope.set_validate_variable_names(validate_variable_names)
+        matchers.initialize_matchers(match_options.get(Settings.MATCHER_OPTIONS.key, {}))
+        # checks like $valid_url are collected while walking the tree and then made all at once
+        matchers.get_matcher_context().deferred = []
+        result = _verify_node(plan.get_plan(expected, plan_key), actual, **match_options)
+        deferred = matchers.take_deferred_url_checks()
+    # the checks go over the network, there's no need to keep other verifications waiting for them
+    _check_urls(deferred, url_checks)
+    return result
+
+
+def _check_urls(deferred: tuple[list, int], url_checks: list | None):
+    if url_checks is None:
+        matchers.check_deferred_urls(*deferred)
+    elif deferred[0]:
+        url_checks.append(deferred)
+
+
+def verify_stream(expected, actual_entries, plan_key=None, url_checks=None, **match_options):
+    """Verifies a (possibly huge) list that's only available as an iterable of its entries, e.g. as
+    they're being parsed from a streamed response. Each entry is checked as soon as it's available
+    and then let go of, so only one entry at a time needs to be kept in memory.
+    Works like verifying a list, except that expected entries that aren't found can't be shown
+    alongside the entire actual list when reporting them. url_checks is like for verify."""
+    if not isinstance(expected, list):
+        raise VerificationFailure("Only an expected list can be verified against a streamed response")
+
+    match_subsets = match_options.get("match_subsets", False)
+    match_every_entry = match_options.get(Settings.MATCH_EVERY_ENTRY.key, False)
+    skip_empty_arrays = match_options.get(Settings.SKIP_EMPTY_ARRAYS.key, False)
+
+    validate_variable_names = match_options.get(
+        Settings.VALIDATE_VARIABLE_NAMES.key, True
+    )
+    with _verify_lock:
+        scope.set_validate_variable_names(validate_variable_names)
+        matchers.initialize_matchers(match_options.get(Settings.MATCHER_OPTIONS.key, {}))
+        matchers.get_matcher_context().deferred = [] if match_every_entry else None
+        verification = matchers.current_verification()
+        expected_entries = plan.get_plan(expected, plan_key).entries
+
+    not_found = list(expected_entries)
+    num_entries = 0
+    # reading an entry may mean waiting for more of the response to be downloaded, so the lock
+    # is only held while checking it (picking the verification up where the last entry left it)
+    for i, actual_entry in enumerate(actual_entries):
+        num_entries += 1
+        with _verify_lock:
+            scope.set_validate_variable_names(validate_variable_names)
+            matchers.resume_verification(verification)
+            matchers.push_path(i)
+            try:
+                if match_every_entry:
+                    for expected_entry in expected_entries:
+                        _verify_entry(expected_entry, actual_entry, **match_options)
+                else:
+                    not_found = [e for e in not_found if not _entry_matches(e, actual_entry, **match_options)]
+            finally:
+                matchers.pop_path()
+
+    with _verify_lock:
+        matchers.resume_verification(verification)
+        deferred = matchers.take_deferred_url_checks()
+
+    if match_subsets and skip_empty_arrays and num_entries == 0:
+        return True
+    if match_every_entry:
+        _check_urls(deferred, url_checks)
+    elif not_found:
+        raise VerificationFailure(
+            "Didn't find:\n%s\nin the %d entries of the streamed response"
+            % (tojsonstr(not_found[0].source), num_entries)
+        )
+    return True
+
+
+def _entry_matches(expected_entry: plan.Node, actual_entry, **match_options) -> bool:
+    if expected_entry.source == actual_entry:
+        return True
+    try:
+        _verify_entry(expected_entry, actual_entry, **match_options)
+        return True
+    except VerificationFailure:
+        return False
@@ -0,0 +1,216 @@
+"""Watch mode: keeps running a suite, rerunning what's affected whenever a file changes.
+
+Staying resident saves starting the interpreter, importing everything, loading custom
+matchers and listing the tests for every run. Files are polled for changes (by their mtime),
+as are their directories to notice files being added or removed. When a testfile changes it's rerun along with the tests later in its directory that use the
+variables it stores, when the config or a custom matcher changes the whole suite is rerun.
+Like the variables, the temporary files tests write are kept between runs (for the tests that
+are rerun to read) until it stops.
+"""
+
+import os
+import time
+from functools import partial
+from typing import Callable
+
+from . import dependencies, matchers
+from .config import Settings, conf_get
+from .util import file_util, log, scope
+
+# how often (in seconds) files are checked for changes
+WATCH_INTERVAL = 0.5
+
+
+def snapshot(paths) -> dict[str, int]:
+    mtimes = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            pass  # removed since it was listed
+    return mtimes
+
+
+def changed_paths(before: dict[str, int], after: dict[str, int]) -> set[str]:
+    """The paths that have been added, modified or removed."""
+    return {
+        path
+        for path in before.keys() | after.keys()
+        if before.get(path) != after.get(path)
+    }
+
+
+class _Listing:
+    """The files with a given extension under a directory, kept up to date without walking the
+    tree: like the manifest does, it relies on adding, removing or renaming a file changing the
+    mtime of its directory, so only the directories whose mtime has changed are listed again."""
+
+    def __init__(self, root: str, ext: str, files: list[str], file_order="lexical"):
+        self.root = root
+        self.ext = ext
+        self.files = list(files)
+        self._key = file_util.filename_sort_key(file_order)
+        self._dirs = snapshot(self._dirs_of(self.files))
+
+    def _dirs_of(self, files: list[str]) -> set[str]:
+        """The directories of the files and the ones those are in, up to the root."""
+        dirs = {self.root}
+        for filename in files:
+            directory = os.path.dirname(filename)
+            while directory not in dirs and len(directory) > len(self.root):
+                dirs.add(directory)
+                directory = os.path.dirname(directory)
+        return dirs
+
+    def refresh(self):
+        after = snapshot(self._dirs)
+        changed = changed_paths(self._dirs, after)
+        if not changed:
+            return
+        self._dirs = after
+        listed = set(self.files)
+        for directory in sorted(changed & after.keys()):
+            try:
+                entries = sorted(os.scandir(directory), key=lambda e: self._key(e.name))
+            except OSError:
+                continue  # removed since it was checked
+            for entry in entries:
+                if entry.path in listed:
+                    continue
+                if entry.is_dir():
+                    if entry.path not in self._dirs:
+                        visited = []
+                        for filename in file_util.list_files(
+                            entry.path, self.ext, visited_dirs=visited
+                        ):
+                            self._add(filename)
+                        self._dirs.update(snapshot(visited))
+                elif entry.name.endswith(self.ext):
+                    self._add(entry.path)
+        # removed files (and the files of removed directories)
+        self.files = [
+            f for f in self.files if os.path.dirname(f) not in changed or os.path.exists(f)
+        ]
+
+    def _add(self, filename: str):
+        """Adds a file after the ones of its directory that are listed before it."""
+        directory, key = os.path.dirname(filename), self._key(os.path.basename(filename))
+        position = len(self.files)
+        for i, listed in enumerate(self.files):
+            if os.path.dirname(listed) == directory:
+                if self._key(os.path.basename(listed)) > key:
+                    position = i
+                    break
+                position = i + 1
+        self.files.insert(position, filename)
+
+
+def _listings(arguments: dict, suite_run) -> tuple[_Listing, list[str], _Listing | None]:
+    """Returns (the listing of the testfiles, the config file, the listing of the custom
+    matchers), everything depends on the config file and the custom matchers."""
+    suite_conf = suite_run.suite_conf
+    tests = _Listing(
+        suite_conf["tests"],
+        conf_get(suite_conf, Settings.EXT),
+        suite_run.tests,
+        conf_get(suite_conf, Settings.FILE_ORDER),
+    )
+    config_files = []
+    target = arguments.get("<target>")
+    if target and os.path.isfile(target):
+        config_files.append(target)
+    custom_matchers = None
+    matchers_dir = conf_get(suite_conf, Settings.MATCHERS)
+    if matchers_dir and os.path.isdir(matchers_dir):
+        custom_matchers = _Listing(
+            matchers_dir, ".py", file_util.list_files(matchers_dir, ".py")
+        )
+    return tests, config_files, custom_matchers
+
+
+def _variables(suite_conf: dict):
+    # the same as the ones run_suite infers
+    return partial(
+        dependencies.variables_of_file,
+        brace_expansion=bool(conf_get(suite_conf, Settings.BRACE_EXPANSION)),
+    )
+
+
+def watch_suite(
+    arguments: dict,
+    suite_run,
+    run_suite: Callable,
+    interval: float = WATCH_INTERVAL,
+    sleep: Callable[[float], None] = time.sleep,
+) -> bool | None:
+    """Reruns (using run_suite) what's affected by every change until interrupted, returns the
+    result of the last run."""
+    result = suite_run.result
+    tests, config_files, custom_matchers = _listings(arguments, suite_run)
+
+    def watched_config_files() -> list[str]:
+        if custom_matchers is None:
+            return config_files
+        custom_matchers.refresh()
+        return [*config_files, *custom_matchers.files]
+
+    watched_config = watched_config_files()
+    before = snapshot([*tests.files, *watched_config])
+    log.info("[dim]Watching for changes, press Ctrl+C to stop.[/dim]")
+    try:
+        while True:
+            sleep(interval)
+            tests.refresh()
+            previous_config = set(watched_config)
+            watched_config = watched_config_files()
+            after = snapshot([*tests.files, *watched_config])
+            changed = changed_paths(before, after)
+            if not changed:
+                continue
+            before = after
+
+            try:
+                if changed & (previous_config | set(watched_config)):
+                    log.info(
+                        "[dim]Config or matchers changed, rerunning everything...[/dim]"
+                    )
+                    for namespace in {
+                        file_util.namespace_of(t) for t in suite_run.tests
+                    }:
+                        scope.forget(namespace)
+                    file_util.cleanup_tmp_files(throw=False)
+                    matchers.reset_matchers()
+                    suite_run = run_suite(arguments)
+                    # the config may list other tests (or in another order) now
+                    tests, config_files, custom_matchers = _listings(
+                        arguments, suite_run
+                    )
+                    watched_config = watched_config_files()
+                    before = snapshot([*tests.files, *watched_config])
+                else:
+                    variables = _variables(suite_run.suite_conf)
+                    affected = dependencies.affected_tests(
+                        tests.files, changed, variables
+                    )
+                    if not affected:
+                        continue
+                    for testfile in affected:
+                        # they're about to be stored (and written) again
+                        test_variables = variables(testfile)
+                        scope.forget(
+                            file_util.namespace_of(testfile), test_variables.stored
+                        )
+                        file_util.remove_tmp_files(test_variables.written)
+                    suite_run = run_suite(
+                        arguments, only=set(affected), load_matchers=False
+                    )
+                result = suite_run.result
+            except Exception as e:
+                # e.g. the config being invalid while it's being edited, keep watching
+                log.error(e)
+    except KeyboardInterrupt:
+        pass
+    if not arguments.get("-t"):
+        log.debug("Removing temporary files...")
+        file_util.cleanup_tmp_files(throw=False)
+    return result
@@ -1,7 +1,9 @@
 """Tests for matcher syntax used inside array elements."""
+import threading
+
 import pytest
 
-from skivvy.verify import verify
+from skivvy.verify import verify, verify_stream
 
 
 # --- Matchers on plain values inside arrays ---
@@ -214,3 +216,134 @@ def test_match_subsets_partial_dict_still_works():
         [{"postId": 1, "id": 1, "email": "a@b.com"}],
         match_subsets=True,
     )
+
+
+# --- Streamed lists ---
+
+def test_verify_stream_checks_every_entry_as_it_arrives():
+    seen = []
+
+    def entries():
+        for i in range(5):
+            seen.append(i)
+            yield {"id": i, "name": f"item-{i}"}
+
+    verify_stream([{"id": "$unique", "name": "$contains item"}], entries(), match_every_entry=True)
+    assert seen == [0, 1, 2, 3, 4]
+
+
+def test_verify_stream_stops_at_the_first_failing_entry():
+    seen = []
+
+    def entries():
+        for i in range(100):
+            seen.append(i)
+            yield {"id": i}
+
+    with pytest.raises(Exception, match="Expected 3<3"):
+        verify_stream([{"id": "$lt 3"}], entries(), match_every_entry=True)
+    assert seen == [0, 1, 2, 3]
+
+
+def test_verify_stream_finds_expected_entries_without_match_every_entry():
+    entries = ({"id": i, "extra": True} for i in range(10))
+    verify_stream([{"id": 7}, {"id": "$gt 8"}], entries, match_subsets=True)
+
+    with pytest.raises(Exception, match="Didn't find"):
+        verify_stream([{"id": 70}], ({"id": i} for i in range(10)))
+
+
+def test_verify_stream_lets_other_verifications_run_while_waiting_for_entries():
+    def entries():
+        for i in (0, 1, 0):
+            # another worker verifies its response while this one waits for the next entry
+            other = threading.Thread(
+                target=verify,
+                args=([{"id": "$unique"}], [{"id": 0}, {"id": 1}]),
+                kwargs={"match_every_entry": True},
+            )
+            other.start()
+            other.join(timeout=5)
+            assert not other.is_alive()
+            yield {"id": i}
+
+    # the values seen by $unique are those of the stream, not of the verification in between
+    with pytest.raises(Exception, match="Duplicate value 0"):
+        verify_stream([{"id": "$unique"}], entries(), match_every_entry=True)
+
+
+def test_verify_stream_requires_an_expected_list():
+    with pytest.raises(Exception, match="Only an expected list"):
+        verify_stream({"id": 1}, iter([]))
+
+
+# --- Searching long arrays (indexed by the literal keys of the expected entries) ---
+
+def rows(n):
+    return [{"id": i, "sku": f"SKU{i}", "qty": i % 7, "name": f"item {i}"} for i in range(n)]
+
+
+def test_long_array_search_finds_entries_by_literal_keys_and_matchers():
+    verify(
+        [{"id": 4321, "name": "$contains item"}, {"sku": "SKU9", "qty": "$gt 1"}],
+        rows(5000),
+    )
+
+
+def test_long_array_search_only_verifies_candidate_entries(monkeypatch):
+    import skivvy.verify as verify_module
+
+    tried = []
+    original = verify_module._verify_entry
+
+    def spy(expected_entry, actual_entry, **opts):
+        tried.append(actual_entry["id"])
+        return original(expected_entry, actual_entry, **opts)
+
+    monkeypatch.setattr(verify_module, "_verify_entry", spy)
+
+    verify([{"id": 4321, "name": "$contains item"}], rows(5000))
+
+    assert tried == [4321]
+
+
+def test_long_array_search_fails_when_literal_key_matches_but_matcher_does_not():
+    with pytest.raises(Exception, match="Didn't find"):
+        verify([{"id": 4321, "name": "$contains nope"}], rows(5000))
+
+
+def test_long_array_search_keeps_types_strict():
+    # 1 == True == 1.0 in Python, but not when verifying
+    actual = [{"flag": True, "n": 1.0}] + [{"flag": False, "n": 0}] * 100
+    with pytest.raises(Exception, match="Didn't find"):
+        verify([{"flag": 1, "name": "$!contains x"}], actual)
+    with pytest.raises(Exception, match="Didn't find"):
+        verify([{"n": 1}], actual)
+    verify([{"flag": True, "n": 1.0}], actual)
+
+
+def test_long_array_search_still_matches_falsy_values_of_other_types():
+    actual = [{"id": i, "note": None} for i in range(100)]
+    verify([{"id": 50, "note": ""}], actual, match_falsiness=True)
+
+
+def test_long_array_search_skips_empty_objects_when_configured():
+    actual = [{}] + rows(100)
+    verify(
+        [{"id": 12345}],
+        actual,
+        match_subsets=True,
+        skip_empty_objects=True,
+    )
+    with pytest.raises(Exception, match="Didn't find"):
+        verify([{"id": 12345}], actual, match_subsets=True)
+
+
+def test_long_array_search_stores_value_of_first_matching_entry(isolated_scope_namespace):
+    from skivvy.util import scope
+
+    actual = [{"kind": "a", "n": i} for i in range(100)] + [{"kind": "b", "n": 1000}]
+    verify([{"kind": "a", "n": "$store first_a"}, {"kind": "b", "n": "$store b"}], actual)
+
+    assert scope.fetch("first_a") == 0
+    assert scope.fetch("b") == 1000
@@ -0,0 +1,22 @@
+import json
+
+from benchmarks import run
+from benchmarks.scenarios import SCENARIOS
+
+
+def test_every_benchmark_scenario_runs(tmp_path):
+    results = run.run_benchmarks(SCENARIOS, repeat=1, scale=0.01)
+
+    assert set(results["results"]) == {scenario.name for scenario in SCENARIOS}
+    assert all(len(result["runs"]) == 1 for result in results["results"].values())
+    json.dumps(results)
+
+
+def test_compare_reports_scenarios_slower_than_threshold():
+    def results(**medians):
+        return {"scale": 1.0, "results": {k: {"median": v} for k, v in medians.items()}}
+
+    baseline = results(fast=1.0, slow=1.0, removed=1.0)
+    current = results(fast=0.9, slow=1.5, added=1.0)
+
+    assert run.compare(baseline, current, threshold=1.2) == ["slow"]
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import sys
+
+import pytest
+
+from skivvy.skivvy import run
+from skivvy.util import http_util
+from skivvy.util.cassette import Cassette, CassetteMiss, request_key
+from skivvy.util.http_util import HttpEnvelope
+
+FAKE_SERVER = "localhost"
+FAKE_PORT = 8888
+
+
+@pytest.fixture(scope="session")
+def httpserver_listen_address():
+    return (FAKE_SERVER, FAKE_PORT)
+
+
+@pytest.fixture(autouse=True)
+def no_cassette():
+    yield
+    http_util.use_cassette(None)
+
+
+def write_json_file(filename, data):
+    filename.write_text(json.dumps(data))
+    return filename
+
+
+def run_cli_with_args(cfg_file, *args):
+    old_argv = sys.argv
+    try:
+        sys.argv = ["skivvy", str(cfg_file), *args]
+        return run()
+    finally:
+        sys.argv = old_argv
+
+
+def _response(content: bytes, status_code=200) -> dict:
+    return {
+        "status_code": status_code,
+        "headers": {"Content-Type": "application/json"},
+        "content": content,
+        "encoding": "utf-8",
+        "url": "http://api/items",
+        "elapsed": 0.01,
+    }
+
+
+def test_request_key_ignores_headers_but_not_query_or_body():
+    base = {
+        "url": "http://api/items",
+        "params": {"page": 1},
+        "json": {"a": 1},
+        "files": {},
+    }
+
+    assert request_key("get", base) == request_key(
+        "GET", {**base, "headers": {"X-Token": "1"}}
+    )
+    assert request_key("get", base) != request_key("post", base)
+    assert request_key("get", base) != request_key(
+        "get", {**base, "params": {"page": 2}}
+    )
+    assert request_key("get", base) != request_key("get", {**base, "json": {"a": 2}})
+    first_upload = {**base, "files": {"f": ("a.txt", b"1")}}
+    second_upload = {**base, "files": {"f": ("a.txt", b"2")}}
+    assert request_key("post", first_upload) != request_key("post", second_upload)
+
+
+def test_repeated_requests_are_replayed_in_the_order_they_were_recorded(tmp_path):
+    payload = {"url": "http://api/items"}
+    recorder = Cassette(str(tmp_path), "record")
+    recorder.record("get", payload, _response(b"[]"))
+    recorder.record("get", payload, _response(b"\xff\x00", status_code=201))
+
+    player = Cassette(str(tmp_path), "replay")
+    assert player.replay("get", payload)["content"] == b"[]"
+    second = player.replay("get", payload)
+    assert (second["status_code"], second["content"]) == (201, b"\xff\x00")
+    # made more times than recorded, the last recording is repeated
+    assert player.replay("get", payload)["status_code"] == 201
+    with pytest.raises(CassetteMiss, match="POST http://api/items"):
+        player.replay("post", payload)
+
+
+def test_cassette_rejects_unknown_modes(tmp_path):
+    with pytest.raises(ValueError, match="cassette mode"):
+        Cassette(str(tmp_path), "rewind")
+
+
+def test_replay_serves_async_requests_without_a_client(tmp_path):
+    recorder = Cassette(str(tmp_path), "record")
+    recorder.record(
+        "get", {"url": "http://api/items", "params": None}, _response(b'{"ok": true}')
+    )
+    http_util.use_cassette(Cassette(str(tmp_path), "replay"))
+
+    envelope = asyncio.run(
+        http_util.execute_async({"url": "http://api/items", "method": "get"})
+    )
+
+    assert isinstance(envelope, HttpEnvelope)
+    assert envelope.json() == {"ok": True}
+
+
+def test_run_records_and_then_replays_without_the_server(httpserver, tmp_path):
+    httpserver.expect_request("/api/cassette", query_string="page=1").respond_with_json(
+        {"items": [1, 2, 3]}
+    )
+    tests_dir = tmp_path / "tests" / "cassette_ns"
+    tests_dir.mkdir(parents=True)
+    write_json_file(
+        tests_dir / "1.json",
+        {"url": "/api/cassette", "query": {"page": 1}, "response": {"items": "$len 3"}},
+    )
+    cassette_dir = tmp_path / "cassette"
+    conf = {
+        "tests": str(tmp_path / "tests"),
+        "base_url": f"http://{FAKE_SERVER}:{FAKE_PORT}",
+        "log_level": "ERROR",
+        "cassette": str(cassette_dir),
+    }
+
+    cfg_file = write_json_file(tmp_path / "cfg.json", conf)
+    assert run_cli_with_args(cfg_file, "--set=cassette_mode=record") is True
+    assert len(httpserver.log) == 1
+    assert len(list(cassette_dir.iterdir())) == 1
+
+    httpserver.clear()
+    assert run_cli_with_args(cfg_file) is True
+    assert httpserver.log == []
@@ -1,6 +1,6 @@
 from wsgiref import headers
 
-from skivvy.test_runner import create_request
+from skivvy.test_runner import brace_expand_fields, create_request
 from skivvy.util.scope import store
 
 
@@ -84,3 +84,42 @@ def test_create_request_allows_full_url_without_base_url():
         "url": "http://127.0.0.1:8080/fortunes/1",
     }
     assert complete_dict["url"] == "http://127.0.0.1:8080/fortunes/1"
+
+
+def test_brace_expand_fields_only_copies_what_it_expands():
+    store("order_id", "42")
+    response = {"data": {"orders": [{"id": "<not expanded>"}] * 100}}
+    body = {"query": "{ order }", "variables": {"id": "<order_id>"}, "static": {"a": "1"}}
+    test_config = {
+        "url": "https://api.example.com/graphql",
+        "body": body,
+        "headers": {"X-Static": "yes"},
+        "response": response,
+        "brace_expansion": True,
+        "auto_coerce": True,
+    }
+
+    result = brace_expand_fields(test_config, "url", "body", "headers")
+
+    assert result["body"] == {
+        "query": "{ order }",
+        "variables": {"id": 42},
+        "static": {"a": "1"},
+    }
+    # the input is left as is, everything that didn't change is shared rather than copied
+    assert body["variables"] == {"id": "<order_id>"}
+    assert result["response"] is response
+    assert result["headers"] is test_config["headers"]
+    assert result["body"]["static"] is body["static"]
+    # strings without a '<' aren't touched at all, not even coerced
+    assert result["body"]["static"]["a"] == "1"
+
+
+def test_brace_expand_fields_without_brace_expansion_returns_shallow_copy():
+    test_config = {"url": "/users/<user_id>", "body": {"id": "<user_id>"}}
+
+    result = brace_expand_fields(test_config, "url", "body")
+
+    assert result == test_config
+    assert result is not test_config
+    assert result["body"] is test_config["body"]
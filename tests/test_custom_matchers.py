@@ -3,6 +3,8 @@ import textwrap
 import pytest
 
 from skivvy import custom_matchers, matchers
+from skivvy.errors import VerificationFailure
+from skivvy.verify import verify
 
 
 def write_matcher_file(tmp_path, name, source):
@@ -113,8 +115,12 @@ def test_load_registers_custom_matchers_from_directory(tmp_path, isolated_matche
         """,
     )
 
+    # resolved (and cached) as a plain string before the matcher exists
+    assert matchers.resolve_matcher("$is_hello") is None
+
     custom_matchers.load({"matchers": str(plugins_dir)})
 
+    assert matchers.resolve_matcher("$is_hello") is not None
     assert "$is_hello" in matchers.matcher_dict
     assert matchers.matcher_dict["$is_hello"]("", "hello") == (True, "expected hello")
 
@@ -125,3 +131,24 @@ def test_load_without_matchers_dir_is_noop(isolated_matcher_state):
     custom_matchers.load({})
 
     assert matchers.matcher_dict == before
+
+
+def test_custom_matcher_with_options_parameter_receives_its_matcher_options(
+    tmp_path, isolated_matcher_state
+):
+    plugins_dir = tmp_path / "plugins"
+    plugins_dir.mkdir()
+    write_matcher_file(
+        plugins_dir,
+        "starts_with",
+        """
+        def match(expected, actual, options):
+            prefix = options.get("prefix", "")
+            return actual.startswith(prefix + expected), "expected prefix " + prefix + expected
+        """,
+    )
+    custom_matchers.load({"matchers": str(plugins_dir)})
+
+    verify({"id": "$starts_with 42"}, {"id": "sku-42-a"}, matcher_options={"$starts_with": {"prefix": "sku-"}})
+    with pytest.raises(VerificationFailure, match="expected prefix sku-42"):
+        verify({"id": "$starts_with 42"}, {"id": "42"}, matcher_options={"$starts_with": {"prefix": "sku-"}})
@@ -0,0 +1,140 @@
+import os
+
+from skivvy import dependencies
+
+
+def test_variables_of_finds_stored_fetched_and_expanded_variables():
+    testcase = {
+        "url": "/api/users/<User_Id>",
+        "headers": {"Authorization": "Bearer <token>", "X-Home": "<env.HOME>"},
+        "response": {"id": "$store item_id", "items": [{"owner": "$store Owner"}]},
+        "response_headers": {"x-group": "$fetch group_id"},
+    }
+
+    variables = dependencies.variables_of(testcase)
+
+    assert variables.stored == {"item_id", "owner"}
+    assert variables.used == {"user_id", "token", "group_id"}
+
+
+def test_matchers_are_only_looked_for_in_the_fields_that_are_verified():
+    testcase = {
+        "url": "/api/notes",
+        "method": "post",
+        "body": {"text": "$fetch is how a variable is used, $store how it's stored"},
+        "response": {"id": "$store note_id"},
+    }
+
+    variables = dependencies.variables_of(testcase)
+
+    assert variables.stored == {"note_id"}
+    assert variables.used == set()
+
+
+def test_affected_tests_follow_stored_variables_within_a_directory():
+    variables = {
+        "t/a/1.json": dependencies.Variables(frozenset({"id"}), frozenset()),
+        "t/a/2.json": dependencies.Variables(frozenset(), frozenset({"other"})),
+        "t/a/3.json": dependencies.Variables(frozenset({"name"}), frozenset({"id"})),
+        "t/a/4.json": dependencies.Variables(frozenset(), frozenset({"name"})),
+        "t/b/1.json": dependencies.Variables(frozenset(), frozenset({"id"})),
+    }
+    tests = list(variables)
+
+    affected = dependencies.affected_tests(tests, {"t/a/1.json"}, variables.get)
+
+    # 3 uses what 1 stores, 4 what 3 stores; b is another directory, so another scope
+    assert affected == ["t/a/1.json", "t/a/3.json", "t/a/4.json"]
+    assert dependencies.affected_tests(tests, {"t/a/4.json"}, variables.get) == [
+        "t/a/4.json"
+    ]
+
+
+def test_prerequisites_are_the_earlier_tests_storing_what_is_needed():
+    variables = {
+        "t/a/1.json": dependencies.Variables(frozenset({"token"}), frozenset()),
+        "t/a/2.json": dependencies.Variables(frozenset({"id"}), frozenset({"token"})),
+        "t/a/3.json": dependencies.Variables(frozenset({"unused"}), frozenset()),
+        "t/a/4.json": dependencies.Variables(frozenset(), frozenset({"id"})),
+        "t/b/1.json": dependencies.Variables(frozenset({"id"}), frozenset()),
+    }
+    tests = list(variables)
+
+    needed = dependencies.prerequisites(tests, {"t/a/4.json"}, variables.get)
+
+    assert needed == ["t/a/1.json", "t/a/2.json", "t/a/4.json"]
+
+
+def test_dependency_graph_links_tests_to_the_ones_storing_what_they_use():
+    variables = {
+        "t/a/1.json": dependencies.Variables(frozenset({"token"}), frozenset()),
+        "t/a/2.json": dependencies.Variables(frozenset({"id"}), frozenset()),
+        "t/a/3.json": dependencies.Variables(frozenset(), frozenset({"id", "token"})),
+        "t/a/4.json": dependencies.Variables(frozenset(), frozenset()),
+        "t/b/1.json": dependencies.Variables(frozenset(), frozenset({"token"})),
+    }
+
+    graph = dependencies.dependency_graph(list(variables), variables.get)
+
+    assert graph == {
+        "t/a/1.json": [],
+        "t/a/2.json": [],
+        "t/a/3.json": ["t/a/1.json", "t/a/2.json"],
+        "t/a/4.json": [],
+        "t/b/1.json": [],
+    }
+
+
+def test_undeclared_variables_are_the_ones_used_before_being_stored():
+    variables = {
+        "t/a/1.json": dependencies.Variables(frozenset(), frozenset({"id"})),
+        "t/a/2.json": dependencies.Variables(frozenset({"id"}), frozenset()),
+        "t/a/3.json": dependencies.Variables(
+            frozenset(), frozenset({"id"}), frozenset({"token"})
+        ),
+    }
+
+    undeclared = dependencies.undeclared_variables(
+        list(variables), variables.get, declared=lambda namespace: {"token"}
+    )
+
+    assert undeclared == {
+        "t/a/1.json": dependencies.Variables(frozenset(), frozenset({"id"}))
+    }
+
+
+def test_only_the_expanded_fields_of_the_request_are_scanned_for_braces():
+    testcase = {"url": "/api/<id>", "response": {"html": "<b>", "id": "<id2>"}}
+
+    assert dependencies.variables_of(testcase).used == {"id"}
+    assert dependencies.variables_of(testcase, brace_expansion=False).used == set()
+    assert (
+        dependencies.variables_of({**testcase, "brace_expansion": False}).used == set()
+    )
+
+
+def test_tests_depend_on_the_files_earlier_tests_write():
+    # as in examples/typicode/tests/success/yet_more_tests and .../more_advanced/http_headers
+    examples = os.path.join(
+        os.path.dirname(__file__), "..", "examples/typicode/tests/success"
+    )
+    write_file = f"{examples}/yet_more_tests/03_capture_user_id.json"
+    brace_file = f"{examples}/yet_more_tests/04_posts_by_captured_user.json"
+    write_headers = f"{examples}/more_advanced/http_headers/1_write_http_headers.json"
+    read_headers = f"{examples}/more_advanced/http_headers/2_read_http_headers.json"
+    tests = [write_file, brace_file, write_headers, read_headers]
+
+    graph = dependencies.dependency_graph(tests, dependencies.variables_of_file)
+
+    assert graph[brace_file] == [write_file]
+    assert graph[read_headers] == [write_headers]
+    assert dependencies.prerequisites(
+        tests, {brace_file}, dependencies.variables_of_file
+    ) == [
+        write_file,
+        brace_file,
+    ]
+    # <uid.txt> is the file written by the first test, not a variable
+    assert (
+        dependencies.undeclared_variables(tests, dependencies.variables_of_file) == {}
+    )
@@ -1,6 +1,12 @@
 import pytest
 
-from skivvy.util.dict_util import subset, remap_keys, map_nested_dicts_py, get_all
+from skivvy.util.dict_util import (
+    subset,
+    remap_keys,
+    map_nested_dicts_py,
+    map_nested_dicts_cow,
+    get_all,
+)
 
 
 def test_subset():
@@ -50,3 +56,16 @@ def test_get_many_raises_keyerror_if_key_not_found():
     d = {"a": 1}
     with pytest.raises(KeyError):
         _ = get_all(d, "dude!")
+
+
+def test_map_nested_dicts_cow_only_copies_changed_paths():
+    d = {"a": {"a1": 1, "a2": {"x": "keep"}}, "b": {"b1": "keep"}}
+
+    result = map_nested_dicts_cow(d, lambda v: v * 10 if isinstance(v, int) else v)
+
+    assert result == {"a": {"a1": 10, "a2": {"x": "keep"}}, "b": {"b1": "keep"}}
+    assert d["a"]["a1"] == 1
+    assert result["a"] is not d["a"]
+    assert result["a"]["a2"] is d["a"]["a2"]
+    assert result["b"] is d["b"]
+    assert map_nested_dicts_cow(d, lambda v: v) is d
@@ -0,0 +1,92 @@
+import asyncio
+
+from skivvy import scheduler
+from skivvy.util import durations
+
+
+def test_durations_are_recorded_relative_to_the_tests_directory(tmp_path):
+    path = str(tmp_path / "durations.jsonl")
+    durations.record(path, "/ci/one/tests", {"/ci/one/tests/a/1.json": 12})
+    durations.record(path, "/ci/two/tests", {"/ci/two/tests/b/1.json": 34})
+
+    assert durations.load(path, "tests") == {"tests/a/1.json": 12, "tests/b/1.json": 34}
+
+
+def test_usual_duration_is_the_median_of_the_last_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(durations, "HISTORY_SIZE", 3)
+    path = str(tmp_path / "durations.jsonl")
+    for ms in (1000, 10, 30, 20):
+        durations.record(path, "t", {"t/a.json": ms})
+
+    assert durations.load(path, "t") == {"t/a.json": 20}
+
+
+def test_history_is_compacted_and_survives_broken_lines(tmp_path, monkeypatch):
+    monkeypatch.setattr(durations, "HISTORY_SIZE", 2)
+    path = tmp_path / "durations.jsonl"
+    path.write_text('{"test": "a.json", "ms": 5}\n{"test": "a.js')
+    for ms in range(10):
+        durations.record(str(path), "t", {"t/a.json": ms, "t/b.json": 100 + ms})
+
+    assert len(path.read_text().splitlines()) <= 8
+    assert durations.load(str(path), "t") == {"t/a.json": 8.5, "t/b.json": 108.5}
+
+
+def test_durations_recorded_by_shards_are_merged_into_the_history(tmp_path):
+    path = str(tmp_path / "durations.jsonl")
+    durations.record(path, "t", {"t/a/1.json": 10})
+    durations.record(durations.shard_path(path, 1, 2), "t", {"t/a/1.json": 30})
+    durations.record(durations.shard_path(path, 2, 2), "t", {"t/b/1.json": 40})
+
+    # a shard reads the history as it was before any of them ran
+    assert durations.load(path, "t") == {"t/a/1.json": 10}
+    assert durations.merge(path) == 2
+    assert durations.load(path, "t") == {"t/a/1.json": 20, "t/b/1.json": 40}
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["durations.jsonl"]
+
+
+def test_a_test_is_the_same_however_its_path_is_spelled(tmp_path):
+    path = str(tmp_path / "durations.jsonl")
+    durations.record(path, "./tests", {"./tests/a.json": 10})
+    durations.record(path, "tests", {"tests/./a.json": 30})
+    durations.record(durations.shard_path(path, 1, 1), "tests/", {"tests//a.json": 50})
+    durations.merge(path)
+
+    assert durations.load(path, "tests") == {"tests/a.json": 30}
+    listed = ["./tests/a.json", "tests/b.json"]
+    assert durations.load(path, "tests", listed) == {"./tests/a.json": 30}
+    assert durations.load(path, "./tests", ["tests/a.json"]) == {"tests/a.json": 30}
+
+
+def test_regressions_are_reported_worst_first():
+    usual = {"a": 100, "b": 100, "c": 10, "d": 100}
+    current = {"a": 250, "b": 500, "c": 40, "d": 150, "new": 1000}
+
+    # c is four times slower, but only by 30ms
+    assert durations.regressions(usual, current, 2.0) == [
+        ("b", 500, 100),
+        ("a", 250, 100),
+    ]
+
+
+def test_longest_running_directories_are_started_first():
+    tests = ["t/a/1.json", "t/b/1.json", "t/b/2.json", "t/c/1.json"]
+    started = []
+
+    async def run_one(index, testfile):
+        started.append(testfile)
+        return True
+
+    usual = {"t/a/1.json": 10, "t/b/1.json": 30, "t/b/2.json": 30, "t/c/1.json": 50}
+    assert asyncio.run(scheduler.run_tests_async(tests, run_one, durations=usual)) == (
+        4,
+        0,
+    )
+    assert started == ["t/b/1.json", "t/b/2.json", "t/c/1.json", "t/a/1.json"]
+
+    groups = scheduler.longest_first(scheduler.group_by_namespace(tests), usual)
+    assert [group[0][1] for group in groups] == [
+        "t/b/1.json",
+        "t/c/1.json",
+        "t/a/1.json",
+    ]
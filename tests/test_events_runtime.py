@@ -1,10 +1,14 @@
+import io
 import json
 import sys
+import threading
 
 import pytest
+from rich.console import Console
 
 from skivvy import events, sinks
 from skivvy.skivvy import run, run_test, STATUS_FAILED, STATUS_OK
+from skivvy.util import log
 
 FAKE_SERVER = "localhost"
 FAKE_PORT = 8888
@@ -184,21 +188,60 @@ def test_install_runtime_sinks_installs_console_and_optional_timing(clean_event_
         install.close()
 
 
-def test_timing_sink_computes_from_ts_not_elapsed_ms(clean_event_context):
+def test_timing_sink_computes_from_monotonic_ns(clean_event_context):
     timing_sink = sinks.TimingSink(http_timing=True).install()
     try:
-        events.emit(events.TEST_STARTED, test_id="case-1", testfile="case-1", ts=1000)
-        events.emit(events.HTTP_TRANSPORT, ts=1010)
-        events.emit(events.VERIFY_STATUS, ts=1045)
-        events.emit(events.TEST_FINISHED, ts=1125, success=True)
+        events.emit(events.TEST_STARTED, test_id="case-1", testfile="case-1", mono_ns=1_000_000)
+        events.emit(events.CREATE_TESTCASE, mono_ns=1_000_000)
+        events.emit(events.CREATE_REQUEST, mono_ns=1_000_250)
+        events.emit(events.HTTP_TRANSPORT, mono_ns=10_000_000)
+        events.emit(events.VERIFY_STATUS, mono_ns=45_000_000)
+        # the wall clock jumping back doesn't matter
+        events.emit(events.TEST_FINISHED, ts=0, mono_ns=125_500_000, success=True)
     finally:
         timing_sink.close()
 
-    assert timing_sink.test_totals_ms["case-1"] == 125
+    assert timing_sink.test_totals_ms["case-1"] == 124.5
+    assert timing_sink.phase_durations_ms["case-1"][events.CREATE_TESTCASE] == 0.00025
     assert timing_sink.phase_durations_ms["case-1"][events.HTTP_TRANSPORT] == 35
+    assert timing_sink.phase_durations_ms["case-1"][events.VERIFY_STATUS] == 80.5
     assert timing_sink.http_phase_durations_ms["case-1"] == [35]
 
 
+def test_timing_sink_logs_step_breakdown(monkeypatch, clean_event_context):
+    logged = []
+    monkeypatch.setattr(sinks.log, "info", logged.append)
+    timing_sink = sinks.TimingSink(http_timing=True).install()
+    try:
+        events.emit(events.TEST_STARTED, test_id="case-1", testfile="case-1", mono_ns=0)
+        events.emit(events.CREATE_TESTCASE, mono_ns=0)
+        events.emit(events.HTTP_TRANSPORT, mono_ns=120_000)
+        events.emit(events.VERIFY_RESPONSE, mono_ns=3_120_000)
+        events.emit(events.TEST_FINISHED, mono_ns=3_420_000, success=True)
+    finally:
+        timing_sink.close()
+
+    assert logged == [
+        "[dim]•create_testcase\t 0.120ms[/dim]\n"
+        "[dim]•verify_response\t 0.300ms[/dim]\n"
+        "[dim]•http\t 3.000ms[/dim]\n"
+        "[dim]•total\t 3.420ms[/dim]"
+    ]
+
+
+def test_events_carry_a_monotonic_timestamp(clean_event_context):
+    captured = []
+    disconnect = _connect("test.custom", lambda _s, **kw: captured.append(kw["mono_ns"]))
+    try:
+        events.emit("test.custom")
+        events.emit("test.custom")
+    finally:
+        disconnect()
+
+    assert all(isinstance(ns, int) for ns in captured)
+    assert captured[0] < captured[1]
+
+
 def test_project_failure_payload_status_focuses_only_status():
     expected, actual = sinks._project_failure_payload(
         {
@@ -687,3 +730,226 @@ def test_console_sink_failed_summary_not_rendered_when_disabled(monkeypatch):
     sink._on_run_finished(None, failures=1, num_tests=1)
 
     assert len(rendered) == 0
+
+
+def test_console_sink_formats_the_already_parsed_response_body(monkeypatch):
+    emitted = []
+    monkeypatch.setattr(
+        sinks.log, "log_at", lambda level, msg, *a, **kw: emitted.append((level, msg))
+    )
+    monkeypatch.setattr(
+        sinks.json, "loads", lambda *_a, **_kw: pytest.fail("body was parsed again")
+    )
+    sink = sinks.ConsoleOutputSink({"http_response_level": "INFO"})
+
+    sink._on_http_response(
+        None,
+        http_status=200,
+        url="http://example.test/api",
+        response_body='{"ok":true}',
+        response_json={"ok": True},
+    )
+    sink._on_http_response(
+        None,
+        http_status=200,
+        url="http://example.test/api",
+        response_body="<html/>",
+        response_json=None,
+    )
+
+    bodies = [msg for _level, msg in emitted if "http response" not in msg]
+    assert bodies == [sinks.tojsonstr({"ok": True}), "<html/>"]
+
+
+def test_jsonl_event_sink_writes_compact_lines_and_truncates_bodies(tmp_path, clean_event_context):
+    path = tmp_path / "events.jsonl"
+    sink = sinks.JsonlEventSink(str(path), max_body=10).install()
+    try:
+        events.emit(events.TEST_STARTED, test_id="case-1", testfile="case-1")
+        events.emit(
+            events.HTTP_RESPONSE,
+            response_body='{"items": [1, 2, 3, 4, 5]}',
+            response_json={"items": [1, 2, 3, 4, 5]},
+            request_json={"a": 1},
+        )
+        events.emit(events.TEST_FAILED, exception=ValueError("boom"), raw=b"\xff")
+        # buffered until the run finishes (or the sink is closed)
+        assert path.read_text() == ""
+        events.emit(events.RUN_FINISHED)
+        lines = path.read_text().splitlines()
+    finally:
+        sink.close()
+
+    records = [json.loads(line) for line in lines]
+    assert [r["event"] for r in records] == [
+        events.TEST_STARTED, events.HTTP_RESPONSE, events.TEST_FAILED, events.RUN_FINISHED
+    ]
+    assert " " not in lines[0]
+    monotonic = [r["mono_ns"] for r in records]
+    assert monotonic == sorted(monotonic)
+    response = records[1]
+    assert response["test_id"] == "case-1"
+    assert response["response_body"] == '{"items": '
+    assert response["response_body_truncated"] == 26
+    assert response["request_json"] == '{"a":1}'
+    assert "response_json" not in response
+    assert records[2]["exception"] == "ValueError: boom"
+    assert records[2]["raw"] == "�"
+
+
+def test_jsonl_event_sink_truncates_what_a_failing_test_expected_and_got(
+    tmp_path, clean_event_context
+):
+    path = tmp_path / "events.jsonl"
+    actual = {"status": 200, "response": {"items": list(range(100))}}
+    expected = {"status": 200, "response": {"items": []}}
+    sink = sinks.JsonlEventSink(str(path), max_body=50).install()
+    try:
+        events.emit(
+            events.TEST_FAILED,
+            expected=expected,
+            actual=actual,
+            error_context={"exception": "boom", "expected": expected, "actual": actual},
+        )
+    finally:
+        sink.close()
+
+    record = json.loads(path.read_text())
+    full_length = len(json.dumps(actual, separators=(",", ":")))
+    assert len(record["actual"]) == 50
+    assert record["actual_truncated"] == full_length
+    # short enough to be kept as it is
+    assert record["expected"] == expected
+    assert "expected_truncated" not in record
+    assert record["error_context"]["exception"] == "boom"
+    assert record["error_context"]["actual"] == record["actual"]
+    assert record["error_context"]["actual_truncated"] == full_length
+    assert record["error_context"]["expected"] == expected
+
+
+def test_run_writes_events_file(httpserver, tmp_path, clean_event_context):
+    httpserver.expect_request("/api/events").respond_with_json({"ok": True})
+    tests_dir = tmp_path / "tests"
+    tests_dir.mkdir()
+    write_json_file(tests_dir / "01.json", {"url": "/api/events", "response": {"ok": True}})
+    events_file = tmp_path / "events.jsonl"
+    cfg_file = write_json_file(
+        tmp_path / "cfg.json",
+        {
+            "tests": str(tests_dir),
+            "base_url": _base_url(httpserver),
+            "log_level": "ERROR",
+            "events_file": str(events_file),
+        },
+    )
+
+    assert run_cli_with_args(cfg_file, "-t") is True
+
+    records = [json.loads(line) for line in events_file.read_text().splitlines()]
+    assert records[0]["event"] == events.RUN_STARTED
+    assert records[-1]["event"] == events.RUN_FINISHED
+    assert {r["event"] for r in records} >= {events.HTTP_TRANSPORT, events.TEST_PASSED}
+    assert len({r["run_id"] for r in records}) == 1
+
+
+def test_emit_skips_events_nobody_listens_to(clean_event_context):
+    built = []
+
+    def build_payload():
+        built.append(True)
+        return {"response_body": "x" * 1_000_000}
+
+    assert events.emit_lazy("test.nobody_listens", build_payload) == []
+    assert built == []
+
+    captured = []
+    disconnect = _connect("test.nobody_listens", lambda _s, **kw: captured.append(kw))
+    try:
+        events.emit_lazy("test.nobody_listens", build_payload)
+    finally:
+        disconnect()
+    assert built == [True]
+    assert len(captured[0]["response_body"]) == 1_000_000
+
+
+def test_test_context_is_tracked_without_listeners(clean_event_context):
+    events.emit(events.TEST_STARTED, testfile="t/1.json")
+    captured = []
+    disconnect = _connect(events.VERIFY_STATUS, lambda _s, **kw: captured.append(kw))
+    try:
+        events.emit(events.VERIFY_STATUS)
+    finally:
+        disconnect()
+        events.emit(events.TEST_FINISHED)
+
+    assert captured[0]["test_id"] == "t/1.json"
+
+
+def test_console_sink_only_wants_http_events_it_would_log(clean_event_context):
+    sink = sinks.ConsoleOutputSink(
+        {"http_request_level": "DEBUG", "http_response_level": None, "http_headers_level": None}
+    ).install()
+    old_level = sinks.log._logger.level
+    try:
+        sinks.log.set_default_level("INFO")
+        assert not events.is_wanted(events.HTTP_TRANSPORT)
+        assert not events.is_wanted(events.HTTP_RESPONSE)
+        sinks.log.set_default_level("DEBUG")
+        assert events.is_wanted(events.HTTP_TRANSPORT)
+        assert not events.is_wanted(events.HTTP_RESPONSE)
+    finally:
+        sinks.log.set_default_level(old_level)
+        sink.close()
+
+    assert not events.is_wanted(events.HTTP_TRANSPORT)
+
+
+def test_tests_running_side_by_side_keep_their_own_log_level(
+    httpserver, tmp_path, clean_event_context
+):
+    httpserver.expect_request("/api/ok").respond_with_json({"ok": True})
+    for namespace, log_level in (("debugging", "DEBUG"), ("quiet", "ERROR")):
+        (tmp_path / "tests" / namespace).mkdir(parents=True)
+        write_json_file(
+            tmp_path / "tests" / namespace / "1.json",
+            {"url": "/api/ok", "status": 200, "log_level": log_level},
+        )
+    cfg_file = write_json_file(
+        tmp_path / "cfg.json",
+        {"tests": str(tmp_path / "tests"), "base_url": _base_url(httpserver), "workers": 2},
+    )
+    both_running = threading.Barrier(2, timeout=5)
+    debug_enabled = {}
+
+    def receiver(_sender, **kw):
+        both_running.wait()
+        debug_enabled[kw["testfile"].split("/")[-2]] = log.is_debug_enabled()
+
+    disconnect = _connect(events.VERIFY_STATUS, receiver)
+    try:
+        assert run_cli_with_args(cfg_file)
+    finally:
+        disconnect()
+
+    assert debug_enabled == {"debugging": True, "quiet": False}
+
+
+def test_grouped_output_is_not_interleaved(monkeypatch):
+    output = io.StringIO()
+    monkeypatch.setattr(log._handler, "console", Console(file=output, width=40))
+    both_started = threading.Barrier(2, timeout=5)
+
+    def output_lines(name):
+        with log.grouped():
+            log.render(f"{name} 1")
+            both_started.wait()
+            log.render(f"{name} 2")
+
+    threads = [threading.Thread(target=output_lines, args=(name,)) for name in "ab"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    lines = output.getvalue().split()
+    assert lines in (["a", "1", "a", "2", "b", "1", "b", "2"], ["b", "1", "b", "2", "a", "1", "a", "2"])
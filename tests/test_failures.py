@@ -0,0 +1,146 @@
+import json
+import sys
+
+import pytest
+
+from skivvy import skivvy
+from skivvy.skivvy import run
+from skivvy.util import failures, scope
+
+FAKE_SERVER = "localhost"
+FAKE_PORT = 8888
+
+
+@pytest.fixture(scope="session")
+def httpserver_listen_address():
+    return (FAKE_SERVER, FAKE_PORT)
+
+
+def write_json_file(filename, data):
+    filename.write_text(json.dumps(data))
+    return filename
+
+
+def run_cli_with_args(cfg_file, *args):
+    old_argv = sys.argv
+    try:
+        sys.argv = ["skivvy", str(cfg_file), *args]
+        return run()
+    finally:
+        sys.argv = old_argv
+
+
+def test_ledger_keeps_failures_until_they_pass(tmp_path):
+    path = str(tmp_path / "failures.json")
+    failures.record(path, "/ci/tests", [], ["/ci/tests/a/1.json", "/ci/tests/b/1.json"])
+    failures.record(path, "/ci/tests", ["/ci/tests/a/1.json"], ["/ci/tests/c/1.json"])
+
+    assert failures.load(path, "tests") == {"tests/b/1.json", "tests/c/1.json"}
+
+
+def test_unreadable_ledger_is_ignored(tmp_path):
+    path = tmp_path / "failures.json"
+    path.write_text('{"failed": ["a.js')
+
+    assert failures.load(str(path), "t") == set()
+
+
+def test_last_failed_reruns_failures_with_their_prerequisites(httpserver, tmp_path):
+    httpserver.expect_request("/api/login").respond_with_json({"token": "abc"})
+    httpserver.expect_request("/api/other").respond_with_json({"ok": True})
+    httpserver.expect_request("/api/me").respond_with_json({"name": "me"})
+    tests_dir = tmp_path / "tests" / "ledger"
+    tests_dir.mkdir(parents=True)
+    write_json_file(
+        tests_dir / "1_login.json",
+        {"url": "/api/login", "response": {"token": "$store token"}},
+    )
+    write_json_file(
+        tests_dir / "2_other.json", {"url": "/api/other", "response": {"ok": True}}
+    )
+    write_json_file(
+        tests_dir / "3_me.json",
+        {
+            "url": "/api/me",
+            "headers": {"X-Token": "<token>"},
+            "response": {"name": "you"},
+        },
+    )
+    failures_file = tmp_path / "failures.json"
+    cfg_file = write_json_file(
+        tmp_path / "cfg.json",
+        {
+            "tests": str(tmp_path / "tests"),
+            "base_url": f"http://{FAKE_SERVER}:{FAKE_PORT}",
+            "log_level": "ERROR",
+            "brace_expansion": True,
+            "failures_file": str(failures_file),
+        },
+    )
+
+    assert run_cli_with_args(cfg_file) is False
+    assert json.loads(failures_file.read_text()) == {"failed": ["ledger/3_me.json"]}
+
+    httpserver.clear_log()
+    scope.forget("ledger")  # as if run by another process
+    write_json_file(
+        tests_dir / "3_me.json",
+        {
+            "url": "/api/me",
+            "headers": {"X-Token": "<token>"},
+            "response": {"name": "me"},
+        },
+    )
+    assert run_cli_with_args(cfg_file, "--last-failed") is True
+
+    assert [request.path for request, _ in httpserver.log] == ["/api/login", "/api/me"]
+    assert httpserver.log[-1][0].headers.get("X-Token") == "abc"
+    assert json.loads(failures_file.read_text()) == {"failed": []}
+
+
+def test_last_failed_needs_a_failures_file(tmp_path):
+    tests_dir = tmp_path / "tests"
+    tests_dir.mkdir()
+    cfg_file = write_json_file(
+        tmp_path / "cfg.json", {"tests": str(tests_dir), "log_level": "ERROR"}
+    )
+
+    with pytest.raises(ValueError, match="failures_file"):
+        run_cli_with_args(cfg_file, "--last-failed")
+
+
+def test_failed_first_still_reports_slowdowns_against_the_durations_history(
+    httpserver, tmp_path, monkeypatch
+):
+    httpserver.expect_request("/api/ok").respond_with_json({"ok": True})
+    tests_dir = tmp_path / "tests"
+    for ns in ("passing", "failing"):
+        (tests_dir / ns).mkdir(parents=True)
+        write_json_file(
+            tests_dir / ns / "1.json",
+            {"url": "/api/ok", "response": {"ok": ns == "passing"}},
+        )
+    durations_file = tmp_path / "durations.jsonl"
+    durations_file.write_text(json.dumps({"test": "passing/1.json", "ms": 1}) + "\n")
+    failures_file = tmp_path / "failures.json"
+    failures_file.write_text(json.dumps({"failed": ["failing/1.json"]}))
+    cfg_file = write_json_file(
+        tmp_path / "cfg.json",
+        {
+            "tests": str(tests_dir),
+            "base_url": f"http://{FAKE_SERVER}:{FAKE_PORT}",
+            "log_level": "ERROR",
+            "durations_file": str(durations_file),
+            "failures_file": str(failures_file),
+        },
+    )
+    reported = []
+    monkeypatch.setattr(
+        skivvy,
+        "report_duration_regressions",
+        lambda usual, current, ratio: reported.append(usual),
+    )
+
+    assert run_cli_with_args(cfg_file, "--failed-first") is False
+
+    assert reported == [{str(tests_dir / "passing" / "1.json"): 1}]
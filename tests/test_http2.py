@@ -0,0 +1,151 @@
+import json
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("httpx")
+h2_config = pytest.importorskip("h2.config")
+h2_connection = pytest.importorskip("h2.connection")
+h2_events = pytest.importorskip("h2.events")
+
+from skivvy.skivvy import run  # noqa: E402
+
+
+class H2StandIn:
+    """A local HTTP/2 (prior knowledge, no TLS) server that answers every request with the
+    path it was made to. It holds back its responses until `hold_for` requests are in flight
+    on a connection (or a second has passed), so it can tell whether they were multiplexed.
+    """
+
+    def __init__(self, hold_for: int = 1):
+        self.hold_for = hold_for
+        self.connections = 0
+        self.max_concurrent_streams = 0
+        self._server = socket.create_server(("127.0.0.1", 0))
+        self.port = self._server.getsockname()[1]
+        self._closed = threading.Event()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def close(self):
+        self._closed.set()
+        self._server.close()
+
+    def _accept(self):
+        while not self._closed.is_set():
+            try:
+                sock, _ = self._server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(sock,), daemon=True).start()
+
+    def _serve(self, sock: socket.socket):
+        conn = h2_connection.H2Connection(
+            config=h2_config.H2Configuration(client_side=False, header_encoding="utf-8")
+        )
+        conn.initiate_connection()
+        sock.sendall(conn.data_to_send())
+        sock.settimeout(0.05)
+        paths: dict[int, str] = {}
+        pending: list[int] = []
+        held_since = None
+        with sock:
+            while not self._closed.is_set():
+                try:
+                    data = sock.recv(65535)
+                    if not data:
+                        return
+                except socket.timeout:
+                    data = b""
+                for event in conn.receive_data(data) if data else ():
+                    if isinstance(event, h2_events.RequestReceived):
+                        paths[event.stream_id] = dict(event.headers)[":path"]
+                    elif isinstance(event, h2_events.StreamEnded):
+                        pending.append(event.stream_id)
+                        held_since = held_since or time.monotonic()
+                    elif isinstance(event, h2_events.ConnectionTerminated):
+                        return
+                self.max_concurrent_streams = max(
+                    self.max_concurrent_streams, len(pending)
+                )
+                if pending and (
+                    len(pending) >= self.hold_for or time.monotonic() - held_since > 1
+                ):
+                    for stream_id in pending:
+                        body = json.dumps({"path": paths.pop(stream_id)}).encode()
+                        conn.send_headers(
+                            stream_id,
+                            [(":status", "200"), ("content-type", "application/json")],
+                        )
+                        conn.send_data(stream_id, body, end_stream=True)
+                    pending.clear()
+                    held_since = None
+                sock.sendall(conn.data_to_send())
+
+
+def write_json_file(filename, data):
+    filename.write_text(json.dumps(data))
+    return filename
+
+
+def run_cli_with_args(cfg_file, *args):
+    old_argv = sys.argv
+    try:
+        sys.argv = ["skivvy", str(cfg_file), *args]
+        return run()
+    finally:
+        sys.argv = old_argv
+
+
+def test_h2c_transport_multiplexes_concurrent_requests_over_one_connection(tmp_path):
+    namespaces = ("h2_a", "h2_b", "h2_c")
+    server = H2StandIn(hold_for=len(namespaces))
+    for ns in namespaces:
+        (tmp_path / "tests" / ns).mkdir(parents=True)
+        write_json_file(
+            tmp_path / "tests" / ns / "1.json",
+            {"url": f"/api/{ns}", "status": 200, "response": {"path": f"/api/{ns}"}},
+        )
+    cfg_file = write_json_file(
+        tmp_path / "cfg.json",
+        {
+            "tests": str(tmp_path / "tests"),
+            "base_url": f"http://127.0.0.1:{server.port}",
+            "log_level": "ERROR",
+            "transport": "h2c",
+            "workers": len(namespaces),
+        },
+    )
+
+    try:
+        assert run_cli_with_args(cfg_file) is True
+    finally:
+        server.close()
+
+    assert server.connections == 1
+    assert server.max_concurrent_streams == len(namespaces)
+
+
+def test_http2_transport_falls_back_to_http1_for_servers_that_only_speak_it(
+    httpserver, tmp_path
+):
+    httpserver.expect_request("/api/ok").respond_with_json({"ok": True})
+    (tmp_path / "tests" / "h1").mkdir(parents=True)
+    write_json_file(
+        tmp_path / "tests" / "h1" / "1.json",
+        {"url": "/api/ok", "status": 200, "response": {"ok": True}},
+    )
+    cfg_file = write_json_file(
+        tmp_path / "cfg.json",
+        {
+            "tests": str(tmp_path / "tests"),
+            "base_url": httpserver.url_for("/").rstrip("/"),
+            "log_level": "ERROR",
+            "transport": "http2",
+        },
+    )
+
+    assert run_cli_with_args(cfg_file) is True
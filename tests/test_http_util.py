@@ -1,12 +1,26 @@
+import asyncio
+import json
 import os
+import socket
 
 import pytest
+import requests
 
+from skivvy import events
+from skivvy.util import http_util
 from skivvy.util.http_util import (
+    ConnectionSettings,
+    HttpEnvelope,
+    async_session,
+    create_session,
+    execute,
     initialize_session,
     do_request,
+    execute_async,
     prepare_request_data,
     prepare_upload_files,
+    split_timeout,
+    validate_transport,
 )
 
 
@@ -136,3 +150,220 @@ def test_prepare_upload_files_reads_bytes_and_preserves_filename(tmp_path):
     prepared = prepare_upload_files(payload)
 
     assert prepared["files"]["file"] == (os.path.basename(str(upload_file)), b"hello")
+
+
+def test_execute_async_returns_envelope_and_emits_events():
+    httpx = pytest.importorskip("httpx")
+    seen = []
+
+    def handler(request):
+        seen.append((request.method, str(request.url), json.loads(request.content)))
+        return httpx.Response(201, json={"id": 1}, headers={"X-Trace": "abc"})
+
+    captured = []
+    receivers = {
+        name: (lambda _s, name=name, **kw: captured.append((name, kw)))
+        for name in (events.HTTP_TRANSPORT, events.HTTP_RESPONSE)
+    }
+    for name, receiver in receivers.items():
+        events.signal(name).connect(receiver)
+
+    async def go():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        async with async_session(client):
+            return await execute_async(
+                {"method": "POST", "url": "http://example.test/items", "body": {"a": 1}}
+            )
+
+    try:
+        envelope = asyncio.run(go())
+    finally:
+        for name, receiver in receivers.items():
+            events.signal(name).disconnect(receiver)
+
+    assert seen == [("POST", "http://example.test/items", {"a": 1})]
+    assert envelope.status_code == 201
+    assert envelope.json() == {"id": 1}
+    assert envelope.header("x-trace") == "abc"
+    assert [name for name, _ in captured] == [
+        events.HTTP_TRANSPORT,
+        events.HTTP_RESPONSE,
+    ]
+    assert captured[1][1]["http_status"] == 201
+    assert captured[1][1]["url"] == "http://example.test/items"
+
+
+def test_execute_async_can_delegate_to_the_requests_transport(
+    dummy_session, monkeypatch
+):
+    monkeypatch.setattr(
+        "skivvy.util.http_util.execute",
+        lambda request, timeout=None: ("sync", request["url"], timeout),
+    )
+
+    result = asyncio.run(
+        execute_async({"url": "http://example.test"}, timeout=5, transport="requests")
+    )
+
+    assert result == ("sync", "http://example.test", 5)
+
+
+def test_validate_transport_rejects_unknown_transports():
+    with pytest.raises(ValueError, match="Unknown transport"):
+        validate_transport("carrier-pigeon")
+
+
+def test_envelope_parses_json_once_and_indexes_headers_once(monkeypatch):
+    envelope = HttpEnvelope(
+        status_code=200,
+        headers={"Content-Type": "application/json", "X-Trace": "abc"},
+        content='{"name": "ö"}'.encode("utf-8"),
+        encoding="utf-8",
+        url="http://example.test",
+        elapsed=0,
+    )
+    calls = []
+    real_loads = json.loads
+    monkeypatch.setattr(
+        "skivvy.util.http_util.json.loads", lambda s: calls.append(s) or real_loads(s)
+    )
+
+    assert envelope.json() == {"name": "ö"}
+    assert envelope.json() is envelope.json()
+    assert len(calls) == 1
+    assert envelope.text == '{"name": "ö"}'
+    assert envelope.header("x-trace") == envelope.header("X-TRACE") == "abc"
+    assert envelope.content_type() == "application/json"
+    assert envelope.header("missing", "default") == "default"
+
+
+def test_envelope_json_is_none_for_empty_or_invalid_bodies():
+    def envelope(content):
+        return HttpEnvelope(200, {}, content, "utf-8", "http://example.test", 0)
+
+    assert envelope(b"").json() is None
+    assert envelope(b"  \n").json() is None
+    assert envelope(b"<html/>").json() is None
+    assert envelope(b"<html/>").text == "<html/>"
+
+
+def test_envelope_json_is_decoded_with_the_declared_charset():
+    response = requests.models.Response()
+    response.status_code = 200
+    response.headers["Content-Type"] = "application/json; charset=iso-8859-1"
+    response._content = '{"name": "Björk"}'.encode("latin-1")
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+
+    envelope = HttpEnvelope.from_requests(response)
+
+    assert envelope.json() == {"name": "Björk"}
+    assert envelope.text == '{"name": "Björk"}'
+
+
+def test_execute_emits_the_parsed_response_body():
+    class Response:
+        status_code = 200
+        headers = {"Content-Type": "application/json"}
+        content = b'{"ok": true}'
+        encoding = "utf-8"
+        url = "http://example.test"
+        elapsed = 0
+
+    class Session:
+        def get(self, **_kw):
+            return Response()
+
+    initialize_session(Session())
+    captured = []
+    receiver = lambda _s, **kw: captured.append(kw)
+    events.signal(events.HTTP_RESPONSE).connect(receiver)
+    try:
+        envelope = execute({"method": "get", "url": "http://example.test"})
+    finally:
+        events.signal(events.HTTP_RESPONSE).disconnect(receiver)
+        initialize_session(None)
+
+    assert captured[0]["response_body"] == '{"ok": true}'
+    assert captured[0]["response_json"] == {"ok": True}
+    # the event and the envelope share the same parsed object
+    assert captured[0]["response_json"] is envelope.json()
+
+
+def test_split_timeout():
+    assert split_timeout(30) == 30
+    assert split_timeout(30, connect_timeout=2) == (2, 30)
+    assert split_timeout(None, read_timeout=60) == (None, 60)
+
+
+def test_session_is_created_with_the_connection_settings():
+    settings = ConnectionSettings(
+        pool_connections=2,
+        pool_maxsize=32,
+        pool_block=True,
+        keep_alive=False,
+        tcp_nodelay=False,
+    )
+
+    session = create_session(settings)
+
+    pool_manager = session.get_adapter("https://example.test").poolmanager
+    assert pool_manager.connection_pool_kw["maxsize"] == 32
+    assert pool_manager.connection_pool_kw["block"] is True
+    assert pool_manager.connection_pool_kw["socket_options"] == []
+    assert session.headers["Connection"] == "close"
+    assert create_session(ConnectionSettings()).headers["Connection"] == "keep-alive"
+
+
+def test_session_only_retries_failing_to_connect():
+    session = create_session(ConnectionSettings(connect_retries=3))
+
+    retries = session.get_adapter("https://example.test").max_retries
+    assert retries.connect == 3
+    assert retries.read is False
+    assert retries.status is False
+    assert retries.other is False
+
+
+@pytest.mark.parametrize("method", ["get", "post"])
+def test_session_reports_a_server_that_never_responds_as_a_read_timeout(method):
+    session = create_session(ConnectionSettings(connect_retries=3))
+    with socket.create_server(("localhost", 0)) as server:
+        # connections are accepted (by the OS), but nothing is ever read or answered
+        url = f"http://localhost:{server.getsockname()[1]}/"
+        with pytest.raises(requests.ReadTimeout):
+            session.request(method, url, timeout=(1, 0.1))
+
+
+def test_configure_connections_keeps_the_session_while_the_settings_are_the_same(
+    monkeypatch,
+):
+    monkeypatch.setattr(http_util, "_session", None)
+    monkeypatch.setattr(http_util, "_connection_settings", ConnectionSettings())
+
+    http_util.configure_connections(ConnectionSettings(pool_maxsize=20))
+    session = http_util._session
+    http_util.configure_connections(ConnectionSettings(pool_maxsize=20))
+    assert http_util._session is session
+
+    http_util.configure_connections(ConnectionSettings(pool_maxsize=30))
+    assert http_util._session is not session
+
+
+def test_execute_async_passes_connect_and_read_timeouts_to_httpx():
+    httpx = pytest.importorskip("httpx")
+    timeouts = []
+
+    def handler(request):
+        timeouts.append(request.extensions["timeout"])
+        return httpx.Response(200)
+
+    async def go():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        async with async_session(client):
+            await execute_async(
+                {"method": "GET", "url": "http://example.test"}, timeout=(2, 60)
+            )
+
+    asyncio.run(go())
+
+    assert timeouts == [{"connect": 2, "read": 60, "write": 60, "pool": 60}]
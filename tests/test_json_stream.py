@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from skivvy.util.json_stream import iter_json_array
+
+DOCUMENT = json.dumps(
+    [
+        1,
+        -2.5e3,
+        {"a": [1, 2, "x]"], "b": {"c": None}},
+        's,"]',
+        'quote " and backslash \\ [{',
+        123456,
+        None,
+        True,
+        [],
+        {},
+    ],
+    indent=1,
+)
+
+
+def chunked(s, size):
+    return [s[i : i + size] for i in range(0, len(s), size)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 10_000])
+def test_yields_every_element_regardless_of_chunking(chunk_size):
+    assert list(iter_json_array(chunked(DOCUMENT, chunk_size))) == json.loads(DOCUMENT)
+
+
+def test_numbers_split_across_chunks_are_not_cut_short():
+    assert list(iter_json_array(["[12", "34", ", 5", "6]"])) == [1234, 56]
+
+
+@pytest.mark.parametrize("document", ["[]", " [ ] ", "\n[\n]\n"])
+def test_empty_arrays(document):
+    assert list(iter_json_array(chunked(document, 1))) == []
+
+
+def test_elements_are_yielded_before_the_document_has_been_read():
+    def chunks():
+        yield '[{"id": 1}, '
+        yield '{"id": 2}'
+        raise AssertionError("read too far")
+
+    elements = iter_json_array(chunks())
+
+    assert next(elements) == {"id": 1}
+
+
+@pytest.mark.parametrize(
+    "document, message",
+    [
+        ('{"a": 1}', "Expected a JSON array"),
+        ("[1,]", "Expecting value"),
+        ("[1 2]", "Expected ',' or ']'"),
+        ("[1, 2", "Unexpected end"),
+        ("", "Unexpected end"),
+        ("[1] [2]", "Unexpected data after"),
+    ],
+)
+def test_invalid_documents_raise_value_error(document, message):
+    with pytest.raises(ValueError, match=message):
+        list(iter_json_array(chunked(document, 2)))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 100])
+def test_elements_larger_than_the_limit_are_rejected_without_reading_further(chunk_size):
+    def chunks():
+        yield from chunked('[1, {"a": "' + "x" * 200, chunk_size)
+        raise AssertionError("read too far")
+
+    elements = iter_json_array(chunks(), max_element_size=100)
+
+    assert next(elements) == 1
+    with pytest.raises(ValueError, match="larger than 100 characters"):
+        next(elements)
+
+
+def test_malformed_elements_are_rejected_as_soon_as_they_end():
+    def chunks():
+        yield '[{"a": 1]'
+        yield ', {"b": 2}'
+        raise AssertionError("read too far")
+
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunks()))
@@ -0,0 +1,151 @@
+import json
+import os
+import sys
+import time
+
+import pytest
+
+from skivvy.skivvy import run
+from skivvy.util import file_util, manifest
+from skivvy.util.manifest import Manifest
+
+FAKE_SERVER = "localhost"
+FAKE_PORT = 8888
+
+
+@pytest.fixture(scope="session")
+def httpserver_listen_address():
+    return (FAKE_SERVER, FAKE_PORT)
+
+
+def age(*paths):
+    # anything modified within the racy window isn't cached, so pretend it was written a while ago
+    past = time.time() - 60
+    for path in paths:
+        os.utime(path, (past, past))
+
+
+def make_suite(tmp_path):
+    tests_dir = tmp_path / "tests"
+    (tests_dir / "users").mkdir(parents=True)
+    (tests_dir / "users" / "1_list.json").write_text(json.dumps({"url": "/users"}))
+    (tests_dir / "users" / "2_get.json").write_text(json.dumps({"url": "/users/1"}))
+    age(tests_dir / "users" / "1_list.json", tests_dir / "users" / "2_get.json")
+    age(tests_dir / "users", tests_dir)
+    return tests_dir
+
+
+def forbid(monkeypatch, name):
+    def fail(*_args, **_kwargs):
+        raise AssertionError(f"file_util.{name} should not have been called")
+
+    monkeypatch.setattr(file_util, name, fail)
+
+
+def test_manifest_reuses_listing_and_parsed_testcases_of_unchanged_suite(
+    tmp_path, monkeypatch
+):
+    tests_dir = make_suite(tmp_path)
+    path = str(tmp_path / "manifest.json")
+    first = Manifest(path)
+    files = first.list_files(str(tests_dir), ".json")
+    parsed = [first.parse_testfile(f) for f in files]
+    first.save()
+
+    second = Manifest(path)
+    forbid(monkeypatch, "list_files")
+    forbid(monkeypatch, "read_file_contents")
+
+    assert second.list_files(str(tests_dir), ".json") == files
+    assert (
+        [second.parse_testfile(f) for f in files]
+        == parsed
+        == [
+            {"url": "/users"},
+            {"url": "/users/1"},
+        ]
+    )
+    assert second.content_hash(files[0]) == first.content_hash(files[0]) is not None
+
+
+def test_manifest_rereads_what_has_changed(tmp_path):
+    tests_dir = make_suite(tmp_path)
+    path = str(tmp_path / "manifest.json")
+    first = Manifest(path)
+    first.list_files(str(tests_dir), ".json")
+    first.parse_testfile(str(tests_dir / "users" / "2_get.json"))
+    first.save()
+
+    (tests_dir / "users" / "3_new.json").write_text("{}")
+    (tests_dir / "users" / "2_get.json").write_text(json.dumps({"url": "/users/2"}))
+    second = Manifest(path)
+
+    assert [
+        os.path.basename(f) for f in second.list_files(str(tests_dir), ".json")
+    ] == [
+        "1_list.json",
+        "2_get.json",
+        "3_new.json",
+    ]
+    assert second.parse_testfile(str(tests_dir / "users" / "2_get.json")) == {
+        "url": "/users/2"
+    }
+
+
+def test_manifest_does_not_cache_recently_modified_files(tmp_path):
+    testfile = tmp_path / "recent.json"
+    testfile.write_text("{}")
+    cache = Manifest(str(tmp_path / "manifest.json"))
+
+    cache.parse_testfile(str(testfile))
+    cache.save()
+
+    assert not (tmp_path / "manifest.json").exists()
+
+
+def test_manifest_ignores_unreadable_cache_file(tmp_path):
+    tests_dir = make_suite(tmp_path)
+    path = tmp_path / "manifest.json"
+    path.write_text("{not json")
+
+    cache = Manifest(str(path))
+
+    assert len(cache.list_files(str(tests_dir), ".json")) == 2
+    cache.save()
+    assert json.loads(path.read_text())["version"] == manifest.MANIFEST_VERSION
+
+
+def test_run_with_manifest_cache_setting_writes_and_reuses_the_manifest(
+    httpserver, tmp_path, monkeypatch
+):
+    httpserver.expect_request("/users").respond_with_json([])
+    httpserver.expect_request("/users/1").respond_with_json({})
+    tests_dir = make_suite(tmp_path)
+    cfg_file = tmp_path / "cfg.json"
+    cfg_file.write_text(
+        json.dumps(
+            {
+                "tests": str(tests_dir),
+                "base_url": f"http://{FAKE_SERVER}:{FAKE_PORT}",
+                "log_level": "ERROR",
+                "manifest_cache": str(tmp_path / "manifest.json"),
+            }
+        )
+    )
+
+    def run_cli():
+        old_argv = sys.argv
+        try:
+            sys.argv = ["skivvy", str(cfg_file)]
+            return run()
+        finally:
+            sys.argv = old_argv
+
+    try:
+        assert run_cli() is True
+        assert (tmp_path / "manifest.json").exists()
+
+        forbid(monkeypatch, "list_files")
+        assert run_cli() is True
+    finally:
+        manifest.open_manifest(None)
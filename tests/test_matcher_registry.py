@@ -1,6 +1,7 @@
 import pytest
 
 from skivvy import matchers
+from skivvy.verify import verify
 
 
 @pytest.fixture
@@ -76,3 +77,67 @@ def test_get_matcher_options_self_returns_options_for_calling_matcher(isolated_m
 
     assert result is True
     assert seen["opts"] == {"replace": {"a": "b"}}
+
+
+def test_resolve_matcher_returns_matcher_and_argument(minimal_registry):
+    assert matchers.resolve_matcher("$pass some argument") == (
+        "$pass",
+        minimal_registry["$pass"],
+        " some argument",
+    )
+    assert matchers.resolve_matcher("  $fail") == ("$fail", minimal_registry["$fail"], "")
+
+
+@pytest.mark.parametrize("expected", ["$passing", "pass", "", "   ", 42, None, ["$pass"]])
+def test_resolve_matcher_ignores_non_matchers(minimal_registry, expected):
+    assert matchers.resolve_matcher(expected) is None
+
+
+def test_resolve_matcher_parses_each_distinct_string_once(minimal_registry):
+    matchers.invalidate_matcher_dispatch()
+
+    for _ in range(100):
+        matchers.resolve_matcher("$pass 1")
+        matchers.resolve_matcher("$fail 2")
+
+    info = matchers._parse_matcher.cache_info()
+    assert info.misses == 2
+    assert info.hits == 198
+
+
+def test_resolve_matcher_sees_matchers_added_later(minimal_registry):
+    assert matchers.resolve_matcher("$late") is None
+
+    matchers.add_matcher("late", lambda expected, actual: (True, "OK"))
+
+    assert matchers.resolve_matcher("$late") is not None
+
+
+def test_resolve_matcher_follows_a_replaced_registry(minimal_registry, monkeypatch):
+    assert matchers.resolve_matcher("$pass") is not None
+
+    monkeypatch.setattr(matchers, "matcher_dict", {"$other": minimal_registry["$pass"]})
+
+    assert matchers.resolve_matcher("$pass") is None
+    assert matchers.resolve_matcher("$other") is not None
+
+
+def test_verify_binds_matcher_options_for_the_applied_matcher(isolated_matcher_state):
+    seen = []
+
+    def custom(expected, actual):
+        seen.append((matchers.get_matcher_context().name, matchers.get_matcher_options_self()))
+        return actual == 1, "OK"
+
+    matchers.add_matcher("bound_demo", custom)
+    matchers.add_negating_matchers()
+    custom.__name__ = "renamed"  # not found by name, so this only works when the context is bound
+
+    verify(
+        {"a": "$bound_demo", "b": "$!bound_demo"},
+        {"a": 1, "b": 2},
+        matcher_options={"$bound_demo": {"x": 1}},
+    )
+
+    assert seen == [("$bound_demo", {"x": 1}), ("$!bound_demo", {"x": 1})]
+    assert matchers.get_matcher_context().name is None
@@ -3,6 +3,7 @@ from datetime import datetime as real_datetime
 import pytest
 
 from skivvy import matchers
+from skivvy.errors import InvalidExpectation
 from skivvy.verify import verify
 
 
@@ -13,6 +14,29 @@ def test_regexp_invalid_pattern_returns_parse_error_message():
     assert "Invalid regular expression pattern" in msg
 
 
+def test_regexp_patterns_are_compiled_once(monkeypatch):
+    compiled = []
+    compile_pattern = matchers.re.compile
+    monkeypatch.setattr(matchers.re, "compile", lambda p: compiled.append(p) or compile_pattern(p))
+    matchers.compile_regexp.cache_clear()
+
+    actual = [{"sku": f"sku-{i}"} for i in range(100)]
+    verify([{"sku": "$regexp ^sku-[0-9]+$"}], actual, match_every_entry=True)
+
+    assert compiled == ["^sku-[0-9]+$"]
+
+
+def test_invalid_regexp_is_reported_before_matching_any_entry(isolated_matcher_state):
+    applied = []
+    matchers.add_matcher("counted", lambda _e, a: (applied.append(a) or True, "ok"))
+    actual = [{"id": i, "sku": f"sku-{i}"} for i in range(100)]
+
+    with pytest.raises(InvalidExpectation, match="Invalid regular expression pattern"):
+        verify([{"id": "$counted", "sku": "$regexp ["}], actual, match_every_entry=True)
+
+    assert applied == []
+
+
 def test_store_and_fetch_matchers_round_trip(isolated_scope_namespace):
     verify("$store token", "abc123")
     verify("$fetch token", "abc123")
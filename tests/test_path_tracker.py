@@ -81,3 +81,57 @@ def test_pop_path_removes_last():
     matchers.push_path("b")
     matchers.pop_path()
     assert matchers.get_path() == ["a"]
+
+
+# --- Structural keys ---
+
+def test_structural_key_collapses_list_indices():
+    tracker = PathTracker()
+    for segment in ["response", "items", 3, "tags", 0]:
+        tracker.push(segment)
+    assert tracker.structural_key == "response.items[].tags[]"
+    tracker.pop()
+    tracker.pop()
+    assert tracker.structural_key == "response.items[]"
+
+
+def test_structural_key_drops_indices_of_top_level_list():
+    tracker = PathTracker()
+    tracker.push(0)
+    assert tracker.structural_key == ""
+    tracker.push("id")
+    assert tracker.structural_key == "id"
+
+
+def test_structural_nodes_are_shared_between_list_entries():
+    tracker = PathTracker()
+    tracker.push("items")
+    nodes = []
+    for i in range(3):
+        tracker.push(i)
+        tracker.push("id")
+        nodes.append(tracker._structure[-1])
+        tracker.pop()
+        tracker.pop()
+    assert nodes[0] is nodes[1] is nodes[2]
+    assert nodes[0].key == "items[].id"
+
+
+def test_snapshot_is_unaffected_by_later_pushes():
+    tracker = PathTracker()
+    tracker.push("a")
+    snapshot = tracker.snapshot()
+    tracker.push(1)
+    assert snapshot == ("a",)
+    assert matchers.format_path(tracker.snapshot()) == "a[1]"
+
+
+def test_forget_structure_only_when_path_is_empty():
+    tracker = PathTracker()
+    tracker.push("a")
+    tracker.forget_structure()
+    assert tracker.structural_key == "a"
+    tracker.pop()
+    tracker.forget_structure()
+    tracker.push("a")
+    assert tracker.structural_key == "a"
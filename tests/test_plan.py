@@ -0,0 +1,85 @@
+import pytest
+
+from skivvy import matchers, plan
+from skivvy.errors import VerificationFailure
+from skivvy.verify import verify
+
+
+@pytest.fixture(autouse=True)
+def empty_plan_cache():
+    plan.clear_cache()
+    yield
+    plan.clear_cache()
+
+
+def test_compile_plan_resolves_matchers_once_into_a_tree():
+    compiled = plan.compile_plan(
+        {"id": 1, "name": "$contains bob", "tags": ["a", {"x": "$gt 1"}]}
+    )
+
+    assert isinstance(compiled, plan.DictNode)
+    nodes = dict(compiled.items)
+    assert nodes["id"] == plan.LiteralNode(1)
+    assert nodes["name"].matcher.name == "$contains"
+    assert nodes["name"].matcher.argument == " bob"
+    assert isinstance(nodes["tags"], plan.ListNode)
+    assert nodes["tags"].entries[0] == plan.LiteralNode("a")
+    assert nodes["tags"].literals == ([], [])
+
+
+def test_list_plan_keeps_literal_keys_of_its_entries():
+    compiled = plan.compile_plan([{"id": 7, "sku": "A1", "qty": "$gt 0", "note": ""}])
+
+    assert compiled.literals == ([("id", 7), ("sku", "A1")],)
+
+
+def test_get_plan_caches_by_key():
+    expected = {"id": "$gt 0"}
+
+    first = plan.get_plan(expected, key="testfile-hash")
+
+    assert plan.get_plan({"completely": "different"}, key="testfile-hash") is first
+    assert plan.get_plan(expected) is not first
+
+
+def test_get_plan_recompiles_after_matchers_are_added(isolated_matcher_state):
+    expected = {"value": "$always_true"}
+    before = plan.get_plan(expected, key="k")
+    assert isinstance(dict(before.items)["value"], plan.LiteralNode)
+
+    matchers.add_matcher("always_true", lambda _e, _a: (True, "ok"))
+
+    after = plan.get_plan(expected, key="k")
+    assert isinstance(dict(after.items)["value"], plan.MatcherNode)
+
+
+def test_match_every_entry_resolves_each_matcher_only_once(monkeypatch):
+    calls = []
+    resolve = matchers.resolve_matcher
+    monkeypatch.setattr(
+        matchers, "resolve_matcher", lambda e: calls.append(e) or resolve(e)
+    )
+
+    template = {"id": "$gt -1", "name": "$contains user"}
+    actual = [{"id": i, "name": f"user{i}"} for i in range(500)]
+
+    verify([template], actual, match_every_entry=True)
+
+    assert calls == [[template], template, "$gt -1", "$contains user"]
+
+
+def test_verify_with_plan_key_reuses_compiled_plan(monkeypatch):
+    compiled = []
+    compile_plan = plan.compile_plan
+    monkeypatch.setattr(
+        plan, "compile_plan", lambda e: compiled.append(e) or compile_plan(e)
+    )
+    expected = {"id": "$gt 0"}
+
+    verify(expected, {"id": 1}, plan_key="hash")
+    verify(expected, {"id": 2}, plan_key="hash")
+    with pytest.raises(VerificationFailure):
+        verify(expected, {"id": 0}, plan_key="hash")
+
+    # once for the dict and once for its value, but only for the first verification
+    assert compiled == [expected, "$gt 0"]
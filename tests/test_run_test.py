@@ -1,13 +1,16 @@
+import asyncio
 import logging
 import os
 import pprint
 import json
 import pytest
+import requests
 import sys
+import threading
 from werkzeug.wrappers import Response
 
-from skivvy import events
-from skivvy.skivvy import run_test, run, STATUS_OK, STATUS_FAILED
+from skivvy import events, matchers
+from skivvy.skivvy import run_test, run_test_async, run, STATUS_OK, STATUS_FAILED
 from skivvy.config import Option, Settings, create_test_config
 from skivvy.test_runner import create_request
 from skivvy.util import file_util, log, str_util
@@ -222,17 +225,25 @@ def test_cli_overrides_take_precedence_over_test_file(httpserver, tmp_path):
 
     logger = logging.getLogger("skivvy.util.log")
     original_level = logger.level
+    warnings_enabled = []
+
+    def receiver(_sender, **_kw):
+        warnings_enabled.append(log.is_enabled_at("WARNING"))
+
+    disconnect = events.connect(events.VERIFY_STATUS, receiver)
     try:
         status, error_context = run_test(
             str(testcase_file),
             default_cfg,
             cli_overrides={"log_level": "ERROR"},
         )
-        assert status is STATUS_OK
-        assert error_context is None
-        assert logger.level == logging.ERROR
     finally:
-        logger.setLevel(original_level)
+        disconnect()
+    assert status is STATUS_OK
+    assert error_context is None
+    assert warnings_enabled == [False]
+    # the level is only the test's own, the default one is left alone
+    assert logger.level == original_level
 
 
 def test_run_without_include_filters_does_not_crash(tmp_path):
@@ -1007,3 +1018,106 @@ def test_run_test_step_events_include_transport_details(httpserver):
     assert len(transport_events) == 1
     assert "http_method" in transport_events[0]
     assert "url" in transport_events[0]
+
+
+def test_run_test_streams_array_response_when_enabled(httpserver, tmp_path):
+    httpserver.expect_request("/api/export").respond_with_json(
+        [{"id": i, "sku": f"sku-{i}"} for i in range(500)]
+    )
+    testcase_file = write_json_file(
+        tmp_path / "export.json",
+        {
+            "url": "/api/export",
+            "status": 200,
+            "stream_response": True,
+            "match_every_entry": True,
+            "response": [{"id": "$unique", "sku": "$regexp ^sku-[0-9]+$"}],
+        },
+    )
+
+    bodies = []
+    receiver = lambda _s, **kw: bodies.append(kw.get("response_body"))
+    events.signal(events.HTTP_RESPONSE).connect(receiver)
+    try:
+        status, error_context = run_test(
+            str(testcase_file), {**default_cfg, "log_level": "ERROR"}
+        )
+    finally:
+        events.signal(events.HTTP_RESPONSE).disconnect(receiver)
+
+    assert status is STATUS_OK, error_context
+    assert bodies == [None]
+
+
+def test_run_test_streamed_response_failure_reports_entry_path(httpserver, tmp_path):
+    httpserver.expect_request("/api/export").respond_with_json(
+        [{"id": 1}, {"id": 2}, {"id": -3}]
+    )
+    testcase_file = write_json_file(
+        tmp_path / "export.json",
+        {
+            "url": "/api/export",
+            "stream_response": True,
+            "match_every_entry": True,
+            "response": [{"id": "$gt 0"}],
+        },
+    )
+
+    status, error_context = run_test(str(testcase_file), default_cfg)
+
+    assert status is STATUS_FAILED
+    assert error_context["failed_step"] == events.VERIFY_RESPONSE
+    assert "Expected -3>0" in error_context["exception"]
+    assert error_context["actual"]["response"] == "<streamed response, not retained>"
+
+
+def test_run_test_closes_a_streamed_response_that_is_never_read(
+    httpserver, tmp_path, monkeypatch
+):
+    httpserver.expect_request("/api/export").respond_with_json([{"id": 1}], status=500)
+    testcase_file = write_json_file(
+        tmp_path / "export.json",
+        {
+            "url": "/api/export",
+            "status": 200,
+            "stream_response": True,
+            "response": [{"id": 1}],
+        },
+    )
+    closed = []
+    close = requests.Response.close
+    monkeypatch.setattr(
+        requests.Response, "close", lambda self: closed.append(self.url) or close(self)
+    )
+
+    status, error_context = run_test(str(testcase_file), default_cfg)
+
+    assert status is STATUS_FAILED
+    assert error_context["failed_step"] == events.VERIFY_STATUS
+    assert closed == [httpserver.url_for("/api/export")]
+
+
+def test_run_test_async_checks_urls_off_the_event_loop(httpserver, tmp_path, monkeypatch):
+    httpserver.expect_request("/api/image").respond_with_json({"url": "http://cdn.test/a.png"})
+    testcase_file = write_json_file(
+        tmp_path / "image.json",
+        {"url": "/api/image", "response": {"url": "$valid_url"}},
+    )
+    checked_from = []
+
+    class BrokenLinks:
+        def get(self, url, **kwargs):
+            checked_from.append(threading.current_thread())
+            return requests.Response()  # status_code None, so not a valid url
+
+    monkeypatch.setattr(matchers, "_url_checker", matchers.UrlChecker(session=BrokenLinks()))
+
+    async def run_on_the_event_loop():
+        return threading.current_thread(), await run_test_async(str(testcase_file), default_cfg)
+
+    loop_thread, (status, error_context) = asyncio.run(run_on_the_event_loop())
+
+    assert status is STATUS_FAILED
+    assert error_context["failed_step"] == events.VERIFY_RESPONSE
+    assert "$valid_url failed at url" in error_context["exception"]
+    assert len(checked_from) == 1 and checked_from[0] is not loop_thread
@@ -0,0 +1,326 @@
+import asyncio
+import json
+import sys
+import threading
+
+import pytest
+
+from skivvy import events, scheduler
+from skivvy.skivvy import run
+from skivvy.util import log, scope
+
+FAKE_SERVER = "localhost"
+FAKE_PORT = 8888
+
+
+@pytest.fixture(scope="session")
+def httpserver_listen_address():
+    return (FAKE_SERVER, FAKE_PORT)
+
+
+def write_json_file(filename, data):
+    filename.write_text(json.dumps(data))
+    return filename
+
+
+def run_cli_with_args(cfg_file, *args):
+    old_argv = sys.argv
+    try:
+        sys.argv = ["skivvy", str(cfg_file), *args]
+        return run()
+    finally:
+        sys.argv = old_argv
+
+
+def test_group_by_namespace_keeps_order_within_each_directory():
+    tests = ["t/a/1.json", "t/b/1.json", "t/a/2.json", "t/b/2.json", "t/c/1.json"]
+
+    groups = scheduler.group_by_namespace(tests)
+
+    assert groups == [
+        [(1, "t/a/1.json"), (3, "t/a/2.json")],
+        [(2, "t/b/1.json"), (4, "t/b/2.json")],
+        [(5, "t/c/1.json")],
+    ]
+
+
+def test_run_tests_serial_stops_on_first_failure_with_fail_fast():
+    seen = []
+
+    def run_one(index, testfile):
+        seen.append(index)
+        return testfile != "b"
+
+    assert scheduler.run_tests(["a", "b", "c"], run_one, fail_fast=True) == (2, 1)
+    assert seen == [1, 2]
+
+
+def test_run_tests_rejects_invalid_worker_count():
+    with pytest.raises(ValueError, match="workers"):
+        scheduler.run_tests(["a"], lambda *_: True, workers=0)
+
+
+def test_run_tests_parallel_runs_directories_concurrently_and_in_order():
+    tests = [f"t/{ns}/{n}.json" for ns in ("a", "b", "c") for n in range(3)]
+    lock = threading.Lock()
+    order: dict[str, list[str]] = {}
+    namespaces = []
+    barrier = threading.Barrier(3, timeout=5)
+
+    def run_one(index, testfile):
+        if testfile.endswith("/0.json"):
+            # every directory must have started before any of them can continue
+            barrier.wait()
+        with lock:
+            order.setdefault(testfile.split("/")[1], []).append(testfile)
+            namespaces.append((testfile.split("/")[1], scope.get_current_namespace()))
+        return not testfile.endswith("c/1.json")
+
+    num_tests, failures = scheduler.run_tests(tests, run_one, workers=3)
+
+    assert (num_tests, failures) == (9, 1)
+    for ns in ("a", "b", "c"):
+        assert order[ns] == [f"t/{ns}/{n}.json" for n in range(3)]
+    assert all(expected == actual for expected, actual in namespaces)
+
+
+def test_run_tests_async_runs_directories_concurrently_and_in_order():
+    tests = [f"t/{ns}/{n}.json" for ns in ("a", "b") for n in range(3)]
+    order = []
+
+    async def run_one(index, testfile):
+        await asyncio.sleep(0)
+        order.append((testfile, scope.get_current_namespace()))
+        return True
+
+    assert asyncio.run(scheduler.run_tests_async(tests, run_one, workers=2)) == (6, 0)
+    # the directories interleave, but each one runs in order and in its own namespace
+    assert [t for t, _ in order][:2] == ["t/a/0.json", "t/b/0.json"]
+    for ns in ("a", "b"):
+        assert [t for t, n in order if n == ns] == [
+            f"t/{ns}/{i}.json" for i in range(3)
+        ]
+
+
+def test_run_tests_async_stops_scheduling_after_failure_with_fail_fast():
+    tests = ["t/a/1.json", "t/a/2.json", "t/b/1.json"]
+    seen = []
+
+    async def run_one(index, testfile):
+        seen.append(testfile)
+        return False
+
+    assert asyncio.run(scheduler.run_tests_async(tests, run_one, fail_fast=True)) == (
+        1,
+        1,
+    )
+    assert seen == ["t/a/1.json"]
+
+
+def test_run_tests_parallel_propagates_exceptions():
+    def run_one(index, testfile):
+        raise RuntimeError("sink boom")
+
+    with pytest.raises(RuntimeError, match="sink boom"):
+        scheduler.run_tests(["t/a/1.json", "t/b/1.json"], run_one, workers=2)
+
+
+@pytest.mark.parametrize("transport", ["requests", "httpx"])
+def test_run_with_workers_keeps_store_fetch_chains_and_test_attribution(
+    transport, httpserver, tmp_path
+):
+    if transport == "httpx":
+        pytest.importorskip("httpx")
+    # stored variables outlive a run, so don't share namespaces between the parametrized runs
+    namespaces = (f"first_{transport}", f"second_{transport}")
+    for ns in namespaces:
+        httpserver.expect_request(f"/api/{ns}/login").respond_with_json(
+            {"token": f"token-{ns}"}
+        )
+        httpserver.expect_request(f"/api/{ns}/me").respond_with_json(
+            {"token": f"token-{ns}"}
+        )
+
+    tests_dir = tmp_path / "tests"
+    for ns in namespaces:
+        ns_dir = tests_dir / ns
+        ns_dir.mkdir(parents=True)
+        write_json_file(
+            ns_dir / "1_login.json",
+            {"url": f"/api/{ns}/login", "response": {"token": "$store token"}},
+        )
+        write_json_file(
+            ns_dir / "2_me.json",
+            {"url": f"/api/{ns}/me", "response": {"token": "$fetch token"}},
+        )
+    cfg_file = write_json_file(
+        tmp_path / "cfg.json",
+        {
+            "tests": str(tests_dir),
+            "base_url": f"http://{FAKE_SERVER}:{FAKE_PORT}",
+            "log_level": "ERROR",
+            "workers": 2,
+            "transport": transport,
+        },
+    )
+
+    captured = []
+    receiver = lambda _s, **kw: captured.append(kw)
+    signal = events.signal(events.HTTP_TRANSPORT)
+    signal.connect(receiver)
+    try:
+        assert run_cli_with_args(cfg_file, "-t") is True
+    finally:
+        signal.disconnect(receiver)
+
+    attributed = {kw["url"].split("/api/")[1]: kw["test_id"] for kw in captured}
+    assert attributed == {
+        f"{ns}/{endpoint}": str(tests_dir / ns / filename)
+        for ns in namespaces
+        for endpoint, filename in (("login", "1_login.json"), ("me", "2_me.json"))
+    }
+
+
+def test_run_tests_with_a_graph_runs_independent_tests_of_a_directory_concurrently():
+    tests = [
+        "t/a/1_login.json",
+        "t/a/2_list.json",
+        "t/a/3_search.json",
+        "t/a/4_me.json",
+    ]
+    # 4 uses what 1 stores, 2 and 3 don't depend on anything
+    graph = {tests[0]: [], tests[1]: [], tests[2]: [], tests[3]: [tests[0]]}
+    lock = threading.Lock()
+    finished = []
+    barrier = threading.Barrier(3, timeout=5)
+
+    def run_one(index, testfile):
+        if testfile != tests[3]:
+            barrier.wait()  # the first three must all be running at once
+        with lock:
+            finished.append((testfile, scope.get_current_namespace()))
+        return True
+
+    assert scheduler.run_tests(tests, run_one, workers=3, graph=graph) == (4, 0)
+    # 4 only had to wait for 1, so it may well finish before 2 or 3
+    finished_tests = [testfile for testfile, _ in finished]
+    assert finished_tests.index(tests[3]) > finished_tests.index(tests[0])
+    assert {namespace for _, namespace in finished} == {"a"}
+
+
+def test_run_tests_with_a_graph_stops_starting_tests_after_failure_with_fail_fast():
+    tests = [f"t/{ns}/1.json" for ns in "abcdefgh"]
+    graph = {testfile: [] for testfile in tests}
+    lock = threading.Lock()
+    seen = []
+
+    def run_one(index, testfile):
+        with lock:
+            seen.append(testfile)
+        return False
+
+    num_tests, failures = scheduler.run_tests(
+        tests, run_one, workers=2, fail_fast=True, graph=graph
+    )
+
+    # only the tests that were already running when the first one failed get to finish
+    assert num_tests == failures == len(seen)
+    assert num_tests <= 2
+
+
+def test_run_tests_async_with_a_graph_waits_for_prerequisites():
+    tests = ["t/a/1.json", "t/a/2.json", "t/a/3.json"]
+    graph = {tests[0]: [], tests[1]: [tests[0]], tests[2]: []}
+    events_seen = []
+
+    async def run_one(index, testfile):
+        events_seen.append(("start", testfile))
+        await asyncio.sleep(0.01 if testfile == tests[0] else 0)
+        events_seen.append(("end", testfile))
+        return testfile != tests[2]
+
+    result = asyncio.run(
+        scheduler.run_tests_async(tests, run_one, workers=2, graph=graph)
+    )
+
+    assert result == (3, 1)
+    # 3 didn't have to wait for 1, but 2 did
+    assert events_seen.index(("start", tests[2])) < events_seen.index(("end", tests[0]))
+    assert events_seen.index(("start", tests[1])) > events_seen.index(("end", tests[0]))
+
+
+def test_include_runs_the_tests_the_included_ones_depend_on(httpserver, tmp_path):
+    httpserver.expect_request("/api/login").respond_with_json({"token": "abc"})
+    httpserver.expect_request("/api/other").respond_with_json({"ok": True})
+    httpserver.expect_request("/api/me", headers={"X-Token": "abc"}).respond_with_json(
+        {}
+    )
+    tests_dir = tmp_path / "tests" / "include_prerequisites"
+    tests_dir.mkdir(parents=True)
+    login = {"url": "/api/login", "response": {"token": "$store token"}}
+    write_json_file(tests_dir / "1_login.json", login)
+    write_json_file(tests_dir / "2_other.json", {"url": "/api/other"})
+    write_json_file(
+        tests_dir / "3_me.json", {"url": "/api/me", "headers": {"X-Token": "<token>"}}
+    )
+    cfg_file = write_json_file(
+        tmp_path / "cfg.json",
+        {
+            "tests": str(tmp_path / "tests"),
+            "base_url": f"http://{FAKE_SERVER}:{FAKE_PORT}",
+            "log_level": "ERROR",
+            "brace_expansion": True,
+        },
+    )
+
+    assert run_cli_with_args(cfg_file, "-i", "3_me") is True
+    assert [request.path for request, _ in httpserver.log] == ["/api/login", "/api/me"]
+
+
+def test_tests_using_undeclared_variables_fail_without_making_their_request(
+    httpserver, tmp_path, monkeypatch
+):
+    httpserver.expect_request("/api/other").respond_with_json({"ok": True})
+    for ns in ("declared", "undeclared"):
+        (tmp_path / "tests" / ns).mkdir(parents=True)
+    write_json_file(
+        tmp_path / "tests" / "undeclared" / "1_get.json",
+        {"url": "/api/items", "response": "$fetch item"},
+    )
+    # in the request it's not a matcher, just a string
+    write_json_file(
+        tmp_path / "tests" / "declared" / "1_other.json",
+        {"url": "/api/other", "method": "post", "body": {"text": "$fetch item"}},
+    )
+    reported = []
+    monkeypatch.setattr(
+        log, "error", lambda msg: reported.append((msg, len(httpserver.log)))
+    )
+    cfg_file = write_json_file(
+        tmp_path / "cfg.json",
+        {
+            "tests": str(tmp_path / "tests"),
+            "base_url": f"http://{FAKE_SERVER}:{FAKE_PORT}",
+            "log_level": "ERROR",
+        },
+    )
+    failed = []
+
+    def on_failed(_sender, **kw):
+        failed.append((kw["testfile"], kw["exception"]))
+
+    events.signal(events.TEST_FAILED).connect(on_failed)
+    try:
+        assert run_cli_with_args(cfg_file) is False
+    finally:
+        events.signal(events.TEST_FAILED).disconnect(on_failed)
+
+    assert [request.path for request, _ in httpserver.log] == ["/api/other"]
+    assert len(failed) == 1
+    assert failed[0][0].endswith("undeclared/1_get.json")
+    assert "$fetch item" in failed[0][1]
+    # all together, before any request is made (even the ones listed first)
+    [(report, requests_made)] = [r for r in reported if "use variables" in str(r[0])]
+    assert requests_made == 0
+    assert report.startswith("1 tests use variables before")
+    assert report.endswith("undeclared/1_get.json: $fetch item")
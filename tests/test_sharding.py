@@ -0,0 +1,137 @@
+import json
+import sys
+
+import pytest
+
+from skivvy import sharding
+from skivvy.skivvy import run
+from skivvy.util import durations
+
+FAKE_SERVER = "localhost"
+FAKE_PORT = 8888
+
+
+@pytest.fixture(scope="session")
+def httpserver_listen_address():
+    return (FAKE_SERVER, FAKE_PORT)
+
+
+def write_json_file(filename, data):
+    filename.write_text(json.dumps(data))
+    return filename
+
+
+def run_cli_with_args(cfg_file, *args):
+    old_argv = sys.argv
+    try:
+        sys.argv = ["skivvy", str(cfg_file), *args]
+        return run()
+    finally:
+        sys.argv = old_argv
+
+
+def test_parse_shard():
+    assert sharding.parse_shard("2/5") == (2, 5)
+    for spec in ("0/3", "4/3", "1", "a/b", "1/2/3"):
+        with pytest.raises(ValueError, match="shard"):
+            sharding.parse_shard(spec)
+
+
+def test_shards_cover_every_test_once_and_keep_directories_together():
+    tests = [f"t/{ns}/{n}.json" for ns in "abcdefg" for n in range(3)]
+
+    shards = [sharding.shard_tests(tests, k, 3) for k in (1, 2, 3)]
+
+    assert sorted(t for shard in shards for t in shard) == sorted(tests)
+    for shard in shards:
+        assert shard == [t for t in tests if t in shard]  # in listing order
+        for ns in {t.split("/")[1] for t in shard}:
+            in_shard = [t for t in shard if t.split("/")[1] == ns]
+            assert in_shard == [f"t/{ns}/{n}.json" for n in range(3)]
+
+
+def test_shards_are_balanced_by_recorded_durations():
+    tests = ["t/slow/1.json", "t/a/1.json", "t/b/1.json", "t/c/1.json", "t/d/1.json"]
+    known = {
+        "t/slow/1.json": 400,
+        "t/a/1.json": 100,
+        "t/b/1.json": 100,
+        "t/c/1.json": 100,
+    }
+
+    # d hasn't been timed, so it counts as a typical (median) test
+    assert sharding.shard_tests(tests, 1, 2, known) == ["t/slow/1.json"]
+    assert sharding.shard_tests(tests, 2, 2, known) == tests[1:]
+
+
+def test_run_only_runs_its_shard_and_records_durations_apart(httpserver, tmp_path):
+    tests_dir = tmp_path / "tests"
+    for ns in ("shard_a", "shard_b"):
+        httpserver.expect_request(f"/api/{ns}").respond_with_json({"ok": True})
+        (tests_dir / ns).mkdir(parents=True)
+        write_json_file(
+            tests_dir / ns / "1.json", {"url": f"/api/{ns}", "response": {"ok": True}}
+        )
+    durations_file = tmp_path / "durations.jsonl"
+    durations_file.write_text(json.dumps({"test": "shard_a/1.json", "ms": 500}) + "\n")
+    cfg_file = write_json_file(
+        tmp_path / "cfg.json",
+        {
+            "tests": str(tests_dir),
+            "base_url": f"http://{FAKE_SERVER}:{FAKE_PORT}",
+            "log_level": "ERROR",
+            "durations_file": str(durations_file),
+        },
+    )
+
+    assert run_cli_with_args(cfg_file, "--shard=2/2") is True
+
+    assert [req.path for req, _ in httpserver.log] == ["/api/shard_b"]
+    # only read, so that the other shard is split the same way
+    recorded = durations.load(str(durations_file), str(tests_dir))
+    assert recorded == {str(tests_dir / "shard_a" / "1.json"): 500}
+    shard_file = durations.shard_path(str(durations_file), 2, 2)
+    assert list(durations.load(shard_file, str(tests_dir))) == [
+        str(tests_dir / "shard_b" / "1.json")
+    ]
+
+    assert run_cli_with_args(cfg_file, "--merge-durations") is True
+    recorded = durations.load(str(durations_file), str(tests_dir))
+    assert sorted(recorded) == [
+        str(tests_dir / ns / "1.json") for ns in ("shard_a", "shard_b")
+    ]
+
+
+def test_shards_run_one_after_another_cover_every_test_once(httpserver, tmp_path):
+    tests_dir = tmp_path / "tests"
+    history = {"shard_w": 500, "shard_x": 200, "shard_y": 200, "shard_z": 200}
+    for ns in history:
+        httpserver.expect_request(f"/api/{ns}").respond_with_json({"ok": True})
+        (tests_dir / ns).mkdir(parents=True)
+        write_json_file(
+            tests_dir / ns / "1.json", {"url": f"/api/{ns}", "response": {"ok": True}}
+        )
+    durations_file = tmp_path / "durations.jsonl"
+    durations_file.write_text(
+        "".join(
+            json.dumps({"test": f"{ns}/1.json", "ms": ms}) + "\n"
+            for ns, ms in history.items()
+        )
+    )
+    cfg_file = write_json_file(
+        tmp_path / "cfg.json",
+        {
+            "tests": str(tests_dir),
+            "base_url": f"http://{FAKE_SERVER}:{FAKE_PORT}",
+            "log_level": "ERROR",
+            "durations_file": str(durations_file),
+        },
+    )
+
+    # had the first shard recorded how long shard_w took this time (far less than usual),
+    # the second one would be split differently and shard_z would never be run
+    assert run_cli_with_args(cfg_file, "--shard=1/2") is True
+    assert run_cli_with_args(cfg_file, "--shard=2/2") is True
+
+    paths = sorted(req.path for req, _ in httpserver.log)
+    assert paths == [f"/api/{ns}" for ns in history]
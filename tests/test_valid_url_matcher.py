@@ -1,6 +1,11 @@
+import threading
+
 import pytest
 
 from skivvy import matchers
+from skivvy.errors import VerificationFailure
+from skivvy import verify as verify_module
+from skivvy.verify import verify
 
 
 class DummyResponse:
@@ -8,7 +13,18 @@ class DummyResponse:
         self.status_code = status_code
 
 
-def test_valid_url_success_uses_tls_verification_by_default(isolated_matcher_state):
+class FakeSession:
+    def __init__(self, **methods):
+        self.__dict__.update(methods)
+
+
+def install_fake_session(monkeypatch, **methods):
+    checker = matchers.UrlChecker(session=FakeSession(**methods))
+    monkeypatch.setattr(matchers, "_url_checker", checker)
+    return checker
+
+
+def test_valid_url_success_uses_tls_verification_by_default(isolated_matcher_state, monkeypatch):
     calls = {}
 
     def fake_get(url, verify, **kwargs):
@@ -17,12 +33,8 @@ def test_valid_url_success_uses_tls_verification_by_default(isolated_matcher_sta
         return DummyResponse(200)
 
     matchers.initialize_matchers({})
-    original_get = matchers.requests.get
-    matchers.requests.get = fake_get
-    try:
-        result, msg = matchers.match_valid_url("", "http://example.test/ping")
-    finally:
-        matchers.requests.get = original_get
+    install_fake_session(monkeypatch, get=fake_get)
+    result, msg = matchers.match_valid_url("", "http://example.test/ping")
 
     assert (result, msg) == (True, matchers.SUCCESS_MSG)
     assert calls == {"url": "http://example.test/ping", "verify": True}
@@ -36,7 +48,7 @@ def test_valid_url_success_uses_tls_verification_by_default(isolated_matcher_sta
     ],
 )
 def test_valid_url_parses_prefix_and_unsafe_modifiers_order_independently(
-    expected, isolated_matcher_state
+    expected, isolated_matcher_state, monkeypatch
 ):
     calls = {}
 
@@ -45,18 +57,14 @@ def test_valid_url_parses_prefix_and_unsafe_modifiers_order_independently(
         calls["verify"] = verify
         return DummyResponse(202)
 
-    original_get = matchers.requests.get
-    matchers.requests.get = fake_get
-    try:
-        result, _ = matchers.match_valid_url(expected, "/health")
-    finally:
-        matchers.requests.get = original_get
+    install_fake_session(monkeypatch, get=fake_get)
+    result, _ = matchers.match_valid_url(expected, "/health")
 
     assert result is True
     assert calls == {"url": "http://api.example.test/health", "verify": False}
 
 
-def test_valid_url_applies_matcher_options_replace_before_request(isolated_matcher_state):
+def test_valid_url_applies_matcher_options_replace_before_request(isolated_matcher_state, monkeypatch):
     calls = {}
 
     def fake_get(url, verify, **kwargs):
@@ -65,59 +73,174 @@ def test_valid_url_applies_matcher_options_replace_before_request(isolated_match
         return DummyResponse(200)
 
     matchers.initialize_matchers({"$valid_url": {"replace": {"^//": "http://"}}})
-    original_get = matchers.requests.get
-    matchers.requests.get = fake_get
-    try:
-        result, _ = matchers.match_valid_url("", "//example.test/image.png")
-    finally:
-        matchers.requests.get = original_get
+    install_fake_session(monkeypatch, get=fake_get)
+    result, _ = matchers.match_valid_url("", "//example.test/image.png")
 
     assert result is True
     assert calls["url"] == "http://example.test/image.png"
 
 
-def test_valid_url_reports_unexpected_status_code(isolated_matcher_state):
+def test_valid_url_reports_unexpected_status_code(isolated_matcher_state, monkeypatch):
     def fake_get(url, verify, **kwargs):
         return DummyResponse(404)
 
-    original_get = matchers.requests.get
-    matchers.requests.get = fake_get
-    try:
-        result, msg = matchers.match_valid_url("", "http://example.test/missing")
-    finally:
-        matchers.requests.get = original_get
+    install_fake_session(monkeypatch, get=fake_get)
+    result, msg = matchers.match_valid_url("", "http://example.test/missing")
 
     assert result is False
     assert "Expected [200, 201, 202] but got 404" in msg
 
 
-def test_valid_url_ssl_error_includes_unsafe_hint(isolated_matcher_state):
+def test_valid_url_ssl_error_includes_unsafe_hint(isolated_matcher_state, monkeypatch):
     def fake_get(url, verify, **kwargs):
         raise matchers.requests.exceptions.SSLError("certificate verify failed")
 
-    original_get = matchers.requests.get
-    matchers.requests.get = fake_get
-    try:
-        result, msg = matchers.match_valid_url("", "https://self-signed.example.test")
-    finally:
-        matchers.requests.get = original_get
+    install_fake_session(monkeypatch, get=fake_get)
+    result, msg = matchers.match_valid_url("", "https://self-signed.example.test")
 
     assert result is False
     assert "TLS certificate verification failed" in msg
     assert "add 'unsafe'" in msg
 
 
-def test_valid_url_generic_request_error_has_no_tls_hint(isolated_matcher_state):
+def test_valid_url_generic_request_error_has_no_tls_hint(isolated_matcher_state, monkeypatch):
     def fake_get(url, verify, **kwargs):
         raise RuntimeError("connection refused")
 
-    original_get = matchers.requests.get
-    matchers.requests.get = fake_get
-    try:
-        result, msg = matchers.match_valid_url("", "http://example.test/down")
-    finally:
-        matchers.requests.get = original_get
+    install_fake_session(monkeypatch, get=fake_get)
+    result, msg = matchers.match_valid_url("", "http://example.test/down")
 
     assert result is False
     assert "Failed to make request to http://example.test/down" in msg
     assert "add 'unsafe'" not in msg
+
+
+def test_verify_checks_each_distinct_url_once_and_reports_failures_by_path(
+    isolated_matcher_state, monkeypatch
+):
+    calls = []
+
+    def fake_get(url, verify, **kwargs):
+        calls.append(url)
+        return DummyResponse(404 if url.endswith("broken.png") else 200)
+
+    install_fake_session(monkeypatch, get=fake_get)
+    actual = {
+        "images": [
+            {"thumbnail": "http://cdn.test/a.png"},
+            {"thumbnail": "http://cdn.test/broken.png"},
+            {"thumbnail": "http://cdn.test/a.png"},
+            {"thumbnail": "http://cdn.test/b.png"},
+        ]
+    }
+
+    with pytest.raises(VerificationFailure) as failure:
+        verify({"images": [{"thumbnail": "$valid_url"}]}, actual, match_every_entry=True)
+
+    assert sorted(calls) == ["http://cdn.test/a.png", "http://cdn.test/b.png", "http://cdn.test/broken.png"]
+    assert str(failure.value) == "$valid_url failed at images[1].thumbnail: Expected [200, 201, 202] but got 404"
+
+    # results are remembered, so verifying again doesn't make any new requests
+    verify({"thumbnail": "$valid_url"}, {"thumbnail": "http://cdn.test/b.png"})
+    assert len(calls) == 3
+
+
+def test_verify_can_check_urls_with_head_requests(isolated_matcher_state, monkeypatch):
+    calls = []
+
+    def fake_head(url, verify, **kwargs):
+        calls.append(url)
+        return DummyResponse(200)
+
+    install_fake_session(monkeypatch, head=fake_head)
+
+    verify(
+        ["$valid_url"],
+        [f"http://cdn.test/{i}.png" for i in range(20)],
+        match_every_entry=True,
+        matcher_options={"$valid_url": {"method": "HEAD", "concurrency": 4}},
+    )
+
+    assert sorted(calls) == sorted(f"http://cdn.test/{i}.png" for i in range(20))
+
+
+def test_negated_and_searched_valid_url_checks_are_made_immediately(
+    isolated_matcher_state, monkeypatch
+):
+    def fake_get(url, verify, **kwargs):
+        return DummyResponse(200 if "up" in url else 500)
+
+    install_fake_session(monkeypatch, get=fake_get)
+    matchers.add_negating_matchers()
+
+    verify({"url": "$!valid_url"}, {"url": "http://down.test"})
+    # only the second entry is valid, so the search has to know the result of the first one
+    verify(
+        [{"url": "$valid_url", "id": 2}],
+        [{"url": "http://down.test", "id": 2}, {"url": "http://up.test", "id": 2}],
+    )
+
+
+def test_head_checks_follow_redirects_and_use_the_timeout_option(isolated_matcher_state, monkeypatch):
+    calls = []
+
+    def fake_head(url, verify, timeout, allow_redirects=False):
+        calls.append((timeout, allow_redirects))
+        return DummyResponse(200 if allow_redirects else 301)
+
+    install_fake_session(monkeypatch, head=fake_head)
+
+    verify(
+        {"url": "$valid_url"},
+        {"url": "http://cdn.test/moved.png"},
+        matcher_options={"$valid_url": {"method": "HEAD", "timeout": 2}},
+    )
+
+    assert calls == [(2.0, True)]
+
+
+def test_checks_without_a_timeout_option_use_the_timeout_of_the_checker(isolated_matcher_state, monkeypatch):
+    timeouts = []
+
+    def fake_get(url, verify, timeout, **kwargs):
+        timeouts.append(timeout)
+        return DummyResponse(200)
+
+    checker = install_fake_session(monkeypatch, get=fake_get)
+    checker.timeout = 5
+
+    verify({"url": "$valid_url"}, {"url": "http://cdn.test/a.png"})
+
+    assert timeouts == [5]
+
+
+def test_deferred_checks_are_made_without_holding_up_other_verifications(isolated_matcher_state, monkeypatch):
+    acquired = []
+
+    def try_to_verify_meanwhile():
+        if verify_module._verify_lock.acquire(timeout=1):
+            acquired.append(True)
+            verify_module._verify_lock.release()
+
+    def fake_get(url, verify, **kwargs):
+        other = threading.Thread(target=try_to_verify_meanwhile)
+        other.start()
+        other.join()
+        return DummyResponse(200)
+
+    install_fake_session(monkeypatch, get=fake_get)
+
+    verify({"url": "$valid_url"}, {"url": "http://cdn.test/a.png"})
+
+    assert acquired == [True]
+
+
+def test_the_pool_of_the_checker_grows_to_the_concurrency_of_the_checks(monkeypatch):
+    checker = matchers.UrlChecker(pool_size=2)
+    monkeypatch.setattr(checker, "_request", lambda check: (True, matchers.SUCCESS_MSG))
+
+    checker.check_all([matchers.UrlCheck(f"http://cdn.test/{i}.png") for i in range(5)], concurrency=4)
+
+    pool_manager = checker.session.get_adapter("http://cdn.test").poolmanager
+    assert pool_manager.connection_pool_kw["maxsize"] == 4
+    assert checker.pool_size == 4
@@ -0,0 +1,221 @@
+import json
+import os
+
+import pytest
+
+from skivvy import watch
+from skivvy.skivvy import run_suite
+from skivvy.util import file_util
+
+FAKE_SERVER = "localhost"
+FAKE_PORT = 8888
+
+
+@pytest.fixture(scope="session")
+def httpserver_listen_address():
+    return (FAKE_SERVER, FAKE_PORT)
+
+
+def write_json_file(filename, data):
+    filename.write_text(json.dumps(data))
+    return filename
+
+
+def touch(filename, data):
+    write_json_file(filename, data)
+    # make sure the change is noticed even on filesystems with coarse mtimes
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_changed_paths():
+    before = {"a": 1, "b": 1, "c": 1}
+    after = {"a": 1, "b": 2, "d": 1}
+    assert watch.changed_paths(before, after) == {"b", "c", "d"}
+
+
+def test_watch_reruns_changed_tests_and_the_ones_using_what_they_store(
+    httpserver, tmp_path
+):
+    httpserver.expect_request("/api/items").respond_with_json({"id": 7})
+    httpserver.expect_request("/api/items/7").respond_with_json({"name": "seven"})
+    httpserver.expect_request("/api/other").respond_with_json({"ok": True})
+    tests_dir = tmp_path / "tests" / "watched"
+    tests_dir.mkdir(parents=True)
+    create = {"url": "/api/items", "response": {"id": "$store item_id"}}
+    write_json_file(tests_dir / "1_create.json", create)
+    write_json_file(
+        tests_dir / "2_other.json", {"url": "/api/other", "response": {"ok": True}}
+    )
+    write_json_file(
+        tests_dir / "3_get.json",
+        {"url": "/api/items/<item_id>", "response": {"name": "seven"}},
+    )
+    cfg_file = write_json_file(
+        tmp_path / "cfg.json",
+        {
+            "tests": str(tmp_path / "tests"),
+            "base_url": f"http://{FAKE_SERVER}:{FAKE_PORT}",
+            "log_level": "ERROR",
+            "brace_expansion": True,
+        },
+    )
+    arguments = {"<target>": str(cfg_file)}
+    rerun = []
+
+    def recording_run_suite(arguments, only=None, load_matchers=True):
+        rerun.append(
+            sorted(os.path.basename(t) for t in only) if only is not None else None
+        )
+        return run_suite(arguments, only=only, load_matchers=load_matchers)
+
+    changes = [
+        lambda: touch(tests_dir / "1_create.json", create),
+        lambda: None,
+        lambda: touch(cfg_file, json.loads(cfg_file.read_text())),
+    ]
+
+    def sleep(_):
+        if not changes:
+            raise KeyboardInterrupt
+        changes.pop(0)()
+
+    result = watch.watch_suite(
+        arguments, run_suite(arguments), recording_run_suite, sleep=sleep
+    )
+
+    assert result is True
+    assert rerun == [["1_create.json", "3_get.json"], None]
+
+
+def test_watch_picks_up_new_tests_without_walking_the_tree_on_every_poll(
+    httpserver, tmp_path, monkeypatch
+):
+    httpserver.expect_request("/api/ok").respond_with_json({"ok": True})
+    tests_dir = tmp_path / "tests" / "growing"
+    tests_dir.mkdir(parents=True)
+    write_json_file(tests_dir / "1_first.json", {"url": "/api/ok"})
+    cfg_file = write_json_file(
+        tmp_path / "cfg.json",
+        {
+            "tests": str(tmp_path / "tests"),
+            "base_url": f"http://{FAKE_SERVER}:{FAKE_PORT}",
+            "log_level": "ERROR",
+        },
+    )
+    arguments = {"<target>": str(cfg_file)}
+    rerun = []
+
+    def recording_run_suite(arguments, only=None, load_matchers=True):
+        rerun.append(sorted(os.path.basename(t) for t in only))
+        return run_suite(arguments, only=only, load_matchers=load_matchers)
+
+    def add_test():
+        write_json_file(tests_dir / "2_second.json", {"url": "/api/ok"})
+        # make sure the change is noticed even on filesystems with coarse mtimes
+        stat = os.stat(tests_dir)
+        os.utime(tests_dir, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    changes = [lambda: None, add_test, lambda: None]
+
+    def sleep(_):
+        if not changes:
+            raise KeyboardInterrupt
+        changes.pop(0)()
+
+    suite_run = run_suite(arguments)
+    listed = []
+    list_files = file_util.list_files
+    monkeypatch.setattr(
+        file_util,
+        "list_files",
+        lambda *args, **kwargs: listed.append(args[0]) or list_files(*args, **kwargs),
+    )
+
+    assert watch.watch_suite(arguments, suite_run, recording_run_suite, sleep=sleep)
+
+    assert rerun == [["2_second.json"]]
+    # only listed (by the rerun itself), never by the polls
+    assert listed == [str(tmp_path / "tests")]
+
+
+def test_watch_infers_dependencies_like_the_run_does(httpserver, tmp_path):
+    httpserver.expect_request("/api/items").respond_with_json({"id": 7})
+    httpserver.expect_request("/api/items/<item_id>").respond_with_json({})
+    tests_dir = tmp_path / "tests" / "no_braces"
+    tests_dir.mkdir(parents=True)
+    create = {"url": "/api/items", "response": {"id": "$store item_id"}}
+    write_json_file(tests_dir / "1_create.json", create)
+    # without brace expansion, <item_id> is just part of the url
+    write_json_file(tests_dir / "2_get.json", {"url": "/api/items/<item_id>"})
+    cfg_file = write_json_file(
+        tmp_path / "cfg.json",
+        {
+            "tests": str(tmp_path / "tests"),
+            "base_url": f"http://{FAKE_SERVER}:{FAKE_PORT}",
+            "log_level": "ERROR",
+        },
+    )
+    arguments = {"<target>": str(cfg_file)}
+    rerun = []
+
+    def recording_run_suite(arguments, only=None, load_matchers=True):
+        rerun.append(sorted(os.path.basename(t) for t in only))
+        return run_suite(arguments, only=only, load_matchers=load_matchers)
+
+    changes = [lambda: touch(tests_dir / "1_create.json", create)]
+
+    def sleep(_):
+        if not changes:
+            raise KeyboardInterrupt
+        changes.pop(0)()
+
+    watch.watch_suite(arguments, run_suite(arguments), recording_run_suite, sleep=sleep)
+
+    assert rerun == [["1_create.json"]]
+
+
+def test_watch_keeps_the_files_earlier_tests_wrote_for_the_tests_it_reruns(
+    httpserver, tmp_path, monkeypatch, clean_tmp_files
+):
+    monkeypatch.chdir(tmp_path)
+    httpserver.expect_request("/api/token").respond_with_json({"token": "abc"})
+    httpserver.expect_request("/api/check").respond_with_json({"token": "abc"})
+    tests_dir = tmp_path / "tests" / "files"
+    tests_dir.mkdir(parents=True)
+    write = {"url": "/api/token", "response": {"token": "$write_file token.txt"}}
+    write_json_file(tests_dir / "1_write.json", write)
+    check = {"url": "/api/check", "response": {"token": "$read_file token.txt"}}
+    write_json_file(tests_dir / "2_read.json", check)
+    cfg_file = write_json_file(
+        tmp_path / "cfg.json",
+        {
+            "tests": str(tmp_path / "tests"),
+            "base_url": f"http://{FAKE_SERVER}:{FAKE_PORT}",
+            "log_level": "ERROR",
+        },
+    )
+    arguments = {"<target>": str(cfg_file), "--watch": True}
+    reruns = []
+
+    def recording_run_suite(arguments, only=None, load_matchers=True):
+        suite_run = run_suite(arguments, only=only, load_matchers=load_matchers)
+        reruns.append((sorted(os.path.basename(t) for t in only), suite_run.result))
+        return suite_run
+
+    changes = [
+        lambda: touch(tests_dir / "2_read.json", check),
+        # it's written anew for the tests after it
+        lambda: touch(tests_dir / "1_write.json", write),
+    ]
+
+    def sleep(_):
+        if not changes:
+            raise KeyboardInterrupt
+        changes.pop(0)()
+
+    assert watch.watch_suite(arguments, run_suite(arguments), recording_run_suite, sleep=sleep)
+
+    assert reruns == [(["2_read.json"], True), (["1_write.json", "2_read.json"], True)]
+    # until it stops watching
+    assert not (tmp_path / "token.txt").exists()